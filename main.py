@@ -1,12 +1,20 @@
-import logging
-import argparse
+import time
 
-from src.config import MAX_POSTS_PER_SUBREDDIT, DRIVER_OPTIONS, SENTIMENT_ANALYSIS, SENTIMENT_FEATURES, SUBREDDIT_FILE, \
-    SUBREDDIT_LIST
-from src.database import MongoDBClient
-from src.scraper import SubredditScraper
-from src.sentiment_controller import SentimentController
-from src.utils import get_subreddits_from_file
+_import_start = time.perf_counter()
+
+import logging  # noqa: E402
+import argparse  # noqa: E402
+import signal  # noqa: E402
+import sys  # noqa: E402
+
+from src.config import MAX_POSTS_PER_SUBREDDIT, DRIVER_PROFILE, DRIVER_PROFILES, SENTIMENT_ANALYSIS, \
+    SENTIMENT_FEATURES, SUBREDDIT_FILE, SUBREDDIT_LIST, SCRAPER_WORKERS, DRIVER_PERSISTENT_SESSIONS, ARCHIVE_DIR, \
+    SCRAPER_BACKEND, THROTTLE_ENABLED, FRONTIER_FILE, get_driver_options  # noqa: E402
+from src.database import DB_STATS, BatchWriter, MongoDBClient  # noqa: E402
+from src.metrics import STARTUP_TIMINGS  # noqa: E402
+
+# the modules of the stages (selenium, aiohttp, torch, transformers) are imported by the stage that needs them
+STARTUP_TIMINGS.record('main imports', time.perf_counter() - _import_start)
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -17,55 +25,270 @@ logger = logging.getLogger(__name__)
 
 def main():
     args = get_args()
+    timing = args.timing
+    if args.command == 'enqueue':
+        enqueue_subreddits(reset=args.reset)
+        return
+    if args.command == 'worker':
+        run_worker(worker_id=args.worker_id, exit_when_empty=args.exit_when_empty,
+                   driver_profile=args.driver_profile, timing=timing)
+        return
+    if args.command == 'sentiment-daemon':
+        run_sentiment_daemon(timing=timing)
+        return
+
     if args.sentiment_only:
         logger.info("Running sentiment analysis only")
-        sentiment_analysis()
+        sentiment_analysis(timing=timing)
         return
 
-    scrape_subreddits()
+    if args.parse_archive:
+        logger.info(f"Parsing archive {args.parse_archive}")
+        with STARTUP_TIMINGS.measure('parser imports'):
+            from src.page_parser import parse_archive
+        log_startup(timing)
+        with MongoDBClient() as db_client:
+            db_client.ensure_indexes()
+        with BatchWriter(MongoDBClient()) as writer:
+            parse_archive(args.parse_archive, MongoDBClient(), writer=writer)
+        logger.info(f"Database writes: {writer.summary()}")
+    else:
+        archive = None
+        if args.archive:
+            from src.archive import PageArchive
+            archive = PageArchive(args.archive)
+        scrape_subreddits(workers=args.workers, archive=archive, incremental=args.incremental, backend=args.backend,
+                          driver_profile=args.driver_profile, resume=args.resume, timing=timing)
+        if archive is not None:
+            logger.info(f"Pages archived to {archive.root}, run with --parse-archive to extract the data")
+            return
 
     if SENTIMENT_ANALYSIS:
-        sentiment_analysis()
+        sentiment_analysis(timing=timing)
+
+
+def log_startup(timing):
+    """
+    Logs the import and load time per component of the startup so far, if requested with --timing.
+
+    :param timing: Whether the startup report was requested.
+    """
+    if timing:
+        logger.info(f"Startup: {STARTUP_TIMINGS.summary()}")
 
 
-def scrape_subreddits():
+def scrape_subreddits(workers=SCRAPER_WORKERS, archive=None, incremental=False, backend=SCRAPER_BACKEND,
+                      driver_profile=DRIVER_PROFILE, resume=False, timing=False):
     logger.info("Scraper starting")
+    with STARTUP_TIMINGS.measure('scraper imports'):
+        from src.frontier import Frontier
+        from src.incremental import KnownItems
+        from src.throttle import HostScheduler
+        if backend == 'json':
+            from src.json_scraper import JsonSubredditScraper
+        else:
+            from src.driver_manager import DriverManager
+            from src.scraper import SubredditScraper
+            from src.worker_pool import ScraperPool
+    with STARTUP_TIMINGS.measure('driver options'):
+        driver_options = get_driver_options(driver_profile)
+    log_startup(timing)
 
     db_client = MongoDBClient()
     with db_client as db_client:
         db_client.db.list_collection_names()
         logger.info(f"DB connection established")
+        db_client.ensure_indexes()
+
+    subreddit_list = get_subreddit_list()
+    logger.info(f"Subreddits to scrape: {subreddit_list}")
+
+    known_items = KnownItems().load(db_client) if incremental else None
+    # one scheduler for all browser workers, so they share the per-host rate and concurrency limits
+    scheduler = HostScheduler() if THROTTLE_ENABLED else None
+
+    frontier = Frontier(FRONTIER_FILE)
+    if resume:
+        logger.info(f"Resuming from the frontier: {frontier.summary()}")
+    else:
+        frontier.reset()
+
+    # documents are written in the background, SIGTERM exits through the finally block so the writer is flushed
+    # after the scraping workers stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    writer = BatchWriter(db_client)
+    try:
+        if backend == 'json':
+            logger.info("Scraping with the JSON backend")
+            JsonSubredditScraper(db_client, known_items=known_items, writer=writer).scrape_subreddits(
+                subreddit_list, max_posts=MAX_POSTS_PER_SUBREDDIT)
+        elif workers > 1:
+            logger.info(f"Scraping with {workers} concurrent workers")
+            pool = ScraperPool(driver_options, workers=workers, archive=archive, known_items=known_items,
+                               scheduler=scheduler, frontier=frontier, writer=writer)
+            stats = pool.scrape(subreddit_list, max_posts=MAX_POSTS_PER_SUBREDDIT)
+            logger.info(f"Page timings ({driver_profile} profile): {stats.timings.summary()}")
+        else:
+            driver_manager = DriverManager(driver_options) if DRIVER_PERSISTENT_SESSIONS else None
+            scraper = SubredditScraper(driver_options, db_client, driver_manager=driver_manager, archive=archive,
+                                       known_items=known_items, scheduler=scheduler, frontier=frontier,
+                                       writer=writer)
+            try:
+                for subreddit in subreddit_list:
+                    logger.info(f"Scraping subreddit: {subreddit}")
+                    scraper.scrape_subreddit(subreddit, max_posts=MAX_POSTS_PER_SUBREDDIT)
+            finally:
+                if driver_manager is not None:
+                    driver_manager.close()
+            logger.info(f"Scraping throughput: {scraper.stats.summary()}")
+            logger.info(f"Page timings ({driver_profile} profile): {scraper.stats.timings.summary()}")
+    finally:
+        writer.close()
+        logger.info(f"Database writes: {writer.summary()}")
+
+    if known_items is not None:
+        logger.info(f"Incremental scraping: {known_items.summary()}")
+
+    logger.info(f"Frontier: {frontier.summary()}")
+    frontier.close()
+    logger.info(f"Database: {DB_STATS.summary()}")
+
+    logger.info("Scraping complete")
+
+
+def get_subreddit_list():
+    from src.utils import get_subreddits_from_file
 
     subreddit_list = get_subreddits_from_file(SUBREDDIT_FILE)
     if not subreddit_list:
         logger.warning(f"File '{SUBREDDIT_FILE}' does not exist. Using config list instead.")
         subreddit_list = SUBREDDIT_LIST
-    logger.info(f"Subreddits to scrape: {subreddit_list}")
+    return subreddit_list
 
-    scraper = SubredditScraper(DRIVER_OPTIONS, db_client)
-    for subreddit in subreddit_list:
-        logger.info(f"Scraping subreddit: {subreddit}")
-        scraper.scrape_subreddit(subreddit, max_posts=MAX_POSTS_PER_SUBREDDIT)
 
-    logger.info("Scraping complete")
+def enqueue_subreddits(reset=False):
+    from src.work_queue import WorkQueue
+
+    subreddit_list = get_subreddit_list()
+    with MongoDBClient() as db_client:
+        queue = WorkQueue(db_client)
+        if reset:
+            logger.info("Removing all items from the work queue")
+            queue.reset()
+        queue.create_indexes()
+        db_client.ensure_indexes()
+        added = queue.enqueue_subreddits(subreddit_list)
+        logger.info(f"Enqueued {added} of {len(subreddit_list)} subreddits, work queue: {queue.counts()}")
+
+
+def run_worker(worker_id=None, exit_when_empty=False, driver_profile=DRIVER_PROFILE, timing=False):
+    with STARTUP_TIMINGS.measure('scraper imports'):
+        from src.driver_manager import DriverManager
+        from src.scraper import SubredditScraper
+        from src.throttle import HostScheduler
+        from src.work_queue import QueueWorker, WorkQueue
+    with STARTUP_TIMINGS.measure('driver options'):
+        driver_options = get_driver_options(driver_profile)
+    scheduler = HostScheduler() if THROTTLE_ENABLED else None
+    log_startup(timing)
+
+    with MongoDBClient() as queue_client, DriverManager(driver_options) as driver_manager, \
+            BatchWriter(queue_client) as writer:
+        queue = WorkQueue(queue_client)
+        queue.create_indexes()
+        queue_client.ensure_indexes()
+        scraper = SubredditScraper(driver_options, queue_client, driver_manager=driver_manager, scheduler=scheduler,
+                                   writer=writer)
+        worker = QueueWorker(queue, scraper, worker_id=worker_id, max_posts=MAX_POSTS_PER_SUBREDDIT)
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+
+        worker.run(exit_when_empty=exit_when_empty)
+        logger.info(f"Work queue: {queue.counts()}")
+
+    logger.info(f"Worker throughput: {scraper.stats.summary()}")
+    logger.info(f"Database: {DB_STATS.summary()}")
 
 
-def sentiment_analysis():
+def sentiment_analysis(timing=False):
     logger.info("Performing sentiment analysis")
+    with STARTUP_TIMINGS.measure('sentiment imports'):
+        from src.sentiment_controller import SentimentController
 
     db_client = MongoDBClient()
+    with db_client:
+        db_client.ensure_indexes()
 
     sentiment_controller = SentimentController(db_client)
-    for collection, field in SENTIMENT_FEATURES:
-        logger.info(f"Sentiment analysis for {collection} - {field}")
-        sentiment_controller.write_sentiments_to_documents(collection=collection, field_to_analyze=field)
+    log_startup(timing)
+    try:
+        for collection, field in SENTIMENT_FEATURES:
+            logger.info(f"Sentiment analysis for {collection} - {field}")
+            sentiment_controller.write_sentiments_to_documents(collection=collection, field_to_analyze=field)
+    finally:
+        sentiment_controller.close()
+    logger.info(f"Sentiments: {sentiment_controller.summary()}")
+    logger.info(f"Sentiment cache: {sentiment_controller.cache_summary()}")
+    logger.info(f"Database: {DB_STATS.summary()}")
     logger.info("Sentiment analysis complete")
 
 
+def run_sentiment_daemon(timing=False):
+    with STARTUP_TIMINGS.measure('sentiment imports'):
+        from src.sentiment_controller import SentimentController
+        from src.sentiment_daemon import SentimentDaemon
+
+    db_client = MongoDBClient()
+    with db_client:
+        db_client.ensure_indexes()
+
+    sentiment_controller = SentimentController(db_client)
+    daemon = SentimentDaemon(sentiment_controller)
+    log_startup(timing)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+
+    logger.info("Sentiment daemon started")
+    try:
+        daemon.run()
+    finally:
+        sentiment_controller.close()
+    logger.info(f"Sentiment daemon stopped: {daemon.summary()}")
+    logger.info(f"Sentiment cache: {sentiment_controller.cache_summary()}")
+    logger.info(f"Database: {DB_STATS.summary()}")
+
+
 def get_args():
     try:
         parser = argparse.ArgumentParser()
         parser.add_argument('--sentiment-only', action='store_true')
+        parser.add_argument('--workers', type=int, default=SCRAPER_WORKERS,
+                            help='number of concurrent browser workers used for scraping')
+        parser.add_argument('--backend', choices=['selenium', 'json'], default=SCRAPER_BACKEND,
+                            help='fetch pages with a browser or the JSON endpoints')
+        parser.add_argument('--driver-profile', choices=DRIVER_PROFILES, default=DRIVER_PROFILE,
+                            help='browser profile, "lean" blocks media, ads and trackers and loads pages eagerly')
+        parser.add_argument('--archive', nargs='?', const=ARCHIVE_DIR, default=None, metavar='DIR',
+                            help='only capture the raw pages into an archive instead of extracting the data live')
+        parser.add_argument('--incremental', action='store_true',
+                            help='skip posts whose comment count did not change and only store new comments')
+        parser.add_argument('--resume', action='store_true',
+                            help='continue a crashed run from the frontier instead of starting over')
+        parser.add_argument('--parse-archive', metavar='DIR',
+                            help='parse a page archive offline and store the data in the database')
+        parser.add_argument('--timing', action='store_true',
+                            help='log the import and load time per component once the stage has started')
+
+        subparsers = parser.add_subparsers(dest='command')
+        enqueue_parser = subparsers.add_parser('enqueue', help='add the subreddits to the distributed work queue')
+        enqueue_parser.add_argument('--reset', action='store_true',
+                                    help='remove all items from the work queue before adding the subreddits')
+        worker_parser = subparsers.add_parser('worker', help='scrape subreddits and posts from the work queue')
+        worker_parser.add_argument('--worker-id', default=None,
+                                   help='id of the worker in the work queue, defaults to host name and process id')
+        worker_parser.add_argument('--exit-when-empty', action='store_true',
+                                   help='stop once no item is pending or leased instead of waiting for new items')
+        subparsers.add_parser('sentiment-daemon', help='score new posts and comments continuously as they are stored')
         return parser.parse_args()
     except Exception as e:
         return None
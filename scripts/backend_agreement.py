@@ -0,0 +1,87 @@
+"""
+Agreement report of the sentiment backends against the fp32 torch model.
+
+Scores the comments of data/comments_sentiment.csv with every backend of `config.SENTIMENT_BACKENDS` and prints, per
+backend, the share of labels that agree with fp32 torch, the mean absolute score difference, the label changes and
+the throughput. Loads the configured sentiment model, no database is needed. The sentiment cache is disabled, so
+every text is scored by every backend. The ONNX graph is exported on the first run and cached in
+`config.SENTIMENT_ONNX_DIR`.
+
+Usage:
+    python scripts/backend_agreement.py [--limit N] [--backends torch-int8 onnx]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.config import SENTIMENT_BACKENDS  # noqa: E402
+from src.sentiment_pipeline import SentimentPipeline  # noqa: E402
+
+COMMENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "comments_sentiment.csv")
+REFERENCE_BACKEND = "torch"
+
+
+def score(backend, texts):
+    """
+    Score the texts with a backend.
+
+    :param backend: One of SENTIMENT_BACKENDS.
+    :param texts: The texts to score.
+    :return: The sentiments and the throughput in texts per second.
+    """
+    pipeline = SentimentPipeline(backend=backend, cache_size=0)
+    start = time.perf_counter()
+    sentiments = pipeline.get_sentiments(texts)
+    return sentiments, len(texts) / (time.perf_counter() - start)
+
+
+def agreement(reference, sentiments):
+    """
+    Compare the sentiments of a backend with the reference sentiments.
+
+    :param reference: The sentiments of the reference backend.
+    :param sentiments: The sentiments of the compared backend, in the same order.
+    :return: A dict with the share of agreeing labels, the mean absolute score difference and a Counter of the
+        (reference label, label) pairs that disagree.
+    """
+    changes = Counter((expected['label'], actual['label']) for expected, actual in zip(reference, sentiments)
+                      if expected['label'] != actual['label'])
+    return {
+        'agreement': 1 - sum(changes.values()) / len(reference),
+        'score_difference': sum(abs(expected['score'] - actual['score'])
+                                for expected, actual in zip(reference, sentiments)) / len(reference),
+        'changes': changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', type=int, default=None, help='number of comments to score, all by default')
+    parser.add_argument('--backends', nargs='+', default=[b for b in SENTIMENT_BACKENDS if b != REFERENCE_BACKEND],
+                        choices=SENTIMENT_BACKENDS, help='backends compared with fp32 torch')
+    args = parser.parse_args()
+
+    texts = pl.read_csv(COMMENTS_FILE)['text'].drop_nulls().to_list()[:args.limit]
+    reference, reference_rate = score(REFERENCE_BACKEND, texts)
+    print(f"{len(texts)} comments, {REFERENCE_BACKEND}: {reference_rate:,.1f} texts/s")
+
+    print(f"{'backend':>12} {'agreement':>10} {'score diff':>11} {'texts/s':>9} {'speedup':>8}  label changes")
+    for backend in args.backends:
+        sentiments, rate = score(backend, texts)
+        result = agreement(reference, sentiments)
+        changes = ", ".join(f"{expected}->{actual}: {count}" for (expected, actual), count
+                            in result['changes'].most_common()) or "none"
+        print(f"{backend:>12} {result['agreement']:>10.2%} {result['score_difference']:>11.4f} {rate:>9,.1f} "
+              f"{rate / reference_rate:>7.1f}x  {changes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the comment record path of the scraper.
+
+Compares the former approach of concatenating a one-row DataFrame per comment with the CommentColumns builder that
+materializes a single DataFrame per post. No browser or database is needed, the comments are synthetic.
+
+Usage:
+    python scripts/benchmark_comment_builder.py
+"""
+
+import os
+import sys
+import timeit
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.extraction import COMMENT_SCHEMA, CommentColumns  # noqa: E402
+
+COMMENTS_PER_POST = [10, 100, 1000]
+REPEAT = 5
+
+
+def make_comments(count):
+    """
+    Create synthetic comment records.
+
+    :param count: The number of comments.
+    :return: A list of comment dictionaries.
+    """
+    return [{'post_id': 'abc', 'text': f'comment number {i}', 'subreddit': 'aww', 'author': f'user{i}',
+             'upvotes': i, 'thing_id': f't1_{i}', 'parent_id': ''} for i in range(count)]
+
+
+def build_with_concat(comments):
+    """
+    The former record path: one pl.concat with a one-row DataFrame per comment.
+    """
+    df_comments = pl.DataFrame(schema=COMMENT_SCHEMA)
+    for comment in comments:
+        df_comments = pl.concat([df_comments, pl.DataFrame([comment])])
+    return df_comments
+
+
+def build_with_columns(comments):
+    """
+    The columnar record path: append to column buffers and materialize once.
+    """
+    columns = CommentColumns(capacity=len(comments))
+    for comment in comments:
+        columns.append(**comment)
+    return columns.to_frame()
+
+
+def comments_per_second(builder, comments):
+    """
+    Measure the throughput of a builder.
+
+    :param builder: The function building the DataFrame.
+    :param comments: The comments to build the DataFrame from.
+    :return: Comments per second of the fastest run.
+    """
+    best = min(timeit.repeat(lambda: builder(comments), number=1, repeat=REPEAT))
+    return len(comments) / best
+
+
+if __name__ == "__main__":
+    print(f"{'comments/post':>14} {'concat c/s':>14} {'columns c/s':>14} {'speedup':>9}")
+    for count in COMMENTS_PER_POST:
+        comments = make_comments(count)
+        concat_rate = comments_per_second(build_with_concat, comments)
+        columns_rate = comments_per_second(build_with_columns, comments)
+        print(f"{count:>14} {concat_rate:>14,.0f} {columns_rate:>14,.0f} {columns_rate / concat_rate:>8.1f}x")
@@ -0,0 +1,47 @@
+"""
+Benchmark of the sentiment inference on the stored comments.
+
+Compares scoring the comments of data/comments_sentiment.csv one at a time with the batched, length-bucketed
+`SentimentPipeline.get_sentiments`. Loads the configured sentiment model, no database is needed. The sentiment cache is
+disabled, so every text is scored.
+
+Usage:
+    python scripts/benchmark_sentiment.py [number of comments]
+"""
+
+import os
+import sys
+import time
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.sentiment_pipeline import SentimentPipeline  # noqa: E402
+
+COMMENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "comments_sentiment.csv")
+DEFAULT_COMMENTS = 1000
+
+
+def texts_per_second(score, texts):
+    """
+    Measure the throughput of a scoring function.
+
+    :param score: The function scoring a list of texts.
+    :param texts: The texts to score.
+    :return: Texts per second.
+    """
+    start = time.perf_counter()
+    score(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COMMENTS
+    texts = pl.read_csv(COMMENTS_FILE)['text'].drop_nulls().head(count).to_list()
+    pipeline = SentimentPipeline(cache_size=0)
+
+    single_rate = texts_per_second(lambda batch: [pipeline.get_tokenized_sentiment(text) for text in batch], texts)
+    batched_rate = texts_per_second(pipeline.get_sentiments, texts)
+    print(f"{len(texts)} comments: {single_rate:,.1f} texts/s one at a time, {batched_rate:,.1f} texts/s batched "
+          f"({batched_rate / single_rate:.1f}x)")
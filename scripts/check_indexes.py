@@ -0,0 +1,32 @@
+"""
+Checks that the queries of the sentiment controller and the analysis are answered from an index.
+
+Ensures the indexes of the posts and comments collections, explains every query of `database.INDEXED_QUERIES` and
+prints the index it uses. Exits with status 1 if a query scans the whole collection.
+
+Usage:
+    python scripts/check_indexes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.database import INDEXED_QUERIES, MongoDBClient  # noqa: E402
+
+
+def main():
+    with MongoDBClient() as db_client:
+        db_client.ensure_indexes()
+        usage = db_client.check_index_usage()
+
+    width = max(len(name) for name in INDEXED_QUERIES)
+    for name, index in usage.items():
+        print(f"{name:<{width}}  {index or 'COLLSCAN'}")
+
+    return 1 if None in usage.values() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
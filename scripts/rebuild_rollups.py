@@ -0,0 +1,31 @@
+"""
+Recomputes the sentiment rollups per subreddit, post, author and day from the stored sentiments.
+
+The rollups are updated incrementally while sentiments are written. Rebuilding them is only needed to include
+sentiments stored before the rollups existed, or to repair the totals after a failed write. Stop the sentiment
+analysis and the sentiment daemon while the rollups are rebuilt.
+
+Usage:
+    python scripts/rebuild_rollups.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.database import MongoDBClient  # noqa: E402
+from src.rollups import SentimentRollups  # noqa: E402
+
+
+def main():
+    with MongoDBClient() as db_client:
+        db_client.ensure_indexes()
+        added = SentimentRollups().rebuild(db_client)
+
+    print(f"Rolled up {added} scored documents")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
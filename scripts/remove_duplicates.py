@@ -0,0 +1,35 @@
+"""
+Removes posts and comments stored more than once by earlier versions, keeping the first stored document of every id.
+
+Startup fails while the posts or comments collection contains duplicates, because their unique indexes cannot be
+built. This script deletes the duplicates and builds the indexes. Stop the scrapers and the sentiment analysis while
+it runs.
+
+Usage:
+    python scripts/remove_duplicates.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.config import COMMENTS_COLLECTION, POSTS_COLLECTION  # noqa: E402
+from src.database import MongoDBClient  # noqa: E402
+
+# The id field of every collection whose duplicates are removed
+ID_FIELDS = {POSTS_COLLECTION: 'post_id', COMMENTS_COLLECTION: 'thing_id'}
+
+
+def main():
+    with MongoDBClient() as db_client:
+        for collection, key in ID_FIELDS.items():
+            removed = db_client.remove_duplicates(collection, key)
+            print(f"Removed {removed} duplicate documents from {collection}")
+        db_client.ensure_indexes()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
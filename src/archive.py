@@ -0,0 +1,124 @@
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LISTING_PAGE = "listing"
+POST_PAGE = "post"
+
+INDEX_FILE = "index.jsonl"
+
+
+class PageArchive:
+    """
+    A compressed on-disk archive of raw page sources.
+
+    Every page is stored as a gzip-compressed HTML file, the metadata of all pages is appended to a JSON lines index
+    in the archive root. Archives can be parsed again at any time, e.g. after a selector fix, without touching Reddit.
+    Adding pages is thread-safe, so several scraping workers can share one archive.
+    """
+
+    def __init__(self, root, compress_level=6):
+        """
+        Initialize the PageArchive.
+
+        :param root: The directory of the archive, it is created if it does not exist.
+        :param compress_level: The gzip compression level of the stored pages.
+        """
+        self.root = root
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def add_page(self, kind, url, subreddit, html, post_id=None):
+        """
+        Store the source of a page in the archive.
+
+        :param kind: The kind of the page, LISTING_PAGE or POST_PAGE.
+        :param url: The URL of the page.
+        :param subreddit: The subreddit the page belongs to.
+        :param html: The page source.
+        :param post_id: The post id for post pages.
+        :return: The index entry of the stored page.
+        """
+        fetched_at = time.time()
+        name = f"{kind}-{post_id or int(fetched_at * 1000)}.html.gz"
+        relative_path = os.path.join(_safe_name(subreddit), _safe_name(name))
+
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=self.compress_level) as file:
+            file.write(html)
+
+        entry = {'kind': kind, 'url': url, 'subreddit': subreddit, 'post_id': post_id, 'path': relative_path,
+                 'fetched_at': fetched_at}
+        with self._lock:
+            with open(self.index_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+
+        logger.debug(f"Archived {kind} page {url}")
+        return entry
+
+    def entries(self, kind=None):
+        """
+        Iterate over the index entries of the archive.
+
+        :param kind: Only return entries of this kind, all entries if None.
+        :return: Generator of index entries.
+        """
+        if not os.path.isfile(self.index_path):
+            return
+
+        with open(self.index_path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a crash while appending can leave a truncated last line
+                    logger.warning(f"Skipping corrupt archive index line: {line[:80]}")
+                    continue
+                if kind is None or entry['kind'] == kind:
+                    yield entry
+
+    def read_page(self, entry):
+        """
+        Read the source of an archived page.
+
+        :param entry: The index entry of the page.
+        :return: The page source.
+        """
+        return read_archived_page(self.root, entry)
+
+
+def read_archived_page(root, entry):
+    """
+    Read the source of an archived page. Module level so it can be used from worker processes.
+
+    :param root: The directory of the archive.
+    :param entry: The index entry of the page.
+    :return: The page source.
+    """
+    with gzip.open(os.path.join(root, entry['path']), "rt", encoding="utf-8") as file:
+        return file.read()
+
+
+def _safe_name(name):
+    """
+    Replace characters that are not safe in file names.
+
+    :param name: The name to sanitize.
+    :return: The sanitized name.
+    """
+    return re.sub(r'[^\w.\-]', '_', name)
@@ -1,40 +1,147 @@
-from src.utils import is_running_in_docker
+import os
 
 
-def get_driver_options():
+def get_driver_options(profile=None):
     from selenium.webdriver.firefox.options import Options
+    from src.browser_profiles import apply_lean_profile
 
     """
     Returns the Firefox webdriver options.
 
+    :param profile: The browser profile, "default" or "lean". Defaults to DRIVER_PROFILE.
     :return: Firefox webdriver options.
     """
+    profile = profile or DRIVER_PROFILE
+    if profile not in DRIVER_PROFILES:
+        raise ValueError(f"Unknown driver profile '{profile}', expected one of {DRIVER_PROFILES}")
+
     options = Options()
     options.add_argument('-headless')
     options.add_argument('-no-sandbox')
-    options.set_preference("profile.managed_default_content_settings.images", 2)
+    options.set_preference("permissions.default.image", 2)
     options.set_preference("intl.accept_languages", "en-us")
+
+    if profile == "lean":
+        apply_lean_profile(options, LEAN_BLOCKED_HOSTS)
     return options
 
 
 # Selenium Driver
-DRIVER_OPTIONS = get_driver_options()
+DRIVER_PROFILES = ("default", "lean")
+DRIVER_PROFILE = "default"  # can be overridden with --driver-profile
+LEAN_BLOCKED_HOSTS = [
+    # media
+    "v.redd.it", "i.redd.it", "preview.redd.it", "external-preview.redd.it", "thumbs.redditmedia.com",
+    "styles.redditmedia.com", "emoji.redditmedia.com", "i.imgur.com", "media.giphy.com", "gfycat.com",
+    # ads and trackers
+    "alb.reddit.com", "pixel.redditmedia.com", "events.redditmedia.com", "www.google-analytics.com",
+    "www.googletagmanager.com", "securepubads.g.doubleclick.net", "www.googletagservices.com",
+    "accounts.google.com",
+]
+
+
+def __getattr__(name):
+    # DRIVER_OPTIONS is built on access, so importing the config does not load selenium
+    if name == 'DRIVER_OPTIONS':
+        return get_driver_options()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+DRIVER_PERSISTENT_SESSIONS = True  # keep the browser alive across subreddits
+DRIVER_MAX_PAGE_LOADS = 300  # recycle a browser after this many page loads, None for no limit
+DRIVER_MAX_RSS_MB = 2048  # recycle a local browser above this resident memory, None for no limit
 
 # Scraping
-SCROLL_TIME = 2  # see README.md for more information
+SCROLL_TIME = 2  # maximum time to scroll a listing, see README.md for more information
+COMMENT_SCROLL_TIME = 1  # maximum time to scroll a post page for more comments
+SCROLL_SETTLE_TIME = 0.5  # stop scrolling once the page did not grow for this many seconds
+SCROLL_POLL_INTERVAL = 0.2  # pause between two scrolls
 
 SUBREDDIT_LIST = ['aww']
 SUBREDDIT_FILE = "./data/subreddits.json"
 
 MAX_POSTS_PER_SUBREDDIT = None  # None for no limit
+BULK_COMMENT_EXTRACTION = True  # extract all comments of a post with one injected script, per element otherwise
+ARCHIVE_DIR = "./data/archive"  # raw page archive used by --archive and --parse-archive
+PARSER_PROCESSES = None  # processes parsing an archive, None for one per core
+INCREMENTAL_BLOOM_THRESHOLD = 5_000_000  # known comments from which on a Bloom filter replaces the in-memory set
+INCREMENTAL_BLOOM_ERROR_RATE = 0.001
+SCRAPER_WORKERS = 1  # number of concurrent browser workers, can be overridden with --workers
+
+# Frontier
+FRONTIER_FILE = "./data/frontier.sqlite3"  # discovered posts and their state, used by --resume after a crash
+FRONTIER_MAX_ATTEMPTS = 3  # runs in which a failed post is visited again before it is given up
+
+# Throttling, shared by all browser workers
+THROTTLE_ENABLED = True
+THROTTLE_REQUESTS_PER_SECOND = 2.0  # page loads per second per host
+THROTTLE_BURST = 4
+THROTTLE_INITIAL_CONCURRENCY = 2  # concurrent page loads per host, adapted between 1 and the maximum
+THROTTLE_MAX_CONCURRENCY = 16
+THROTTLE_TARGET_LATENCY = 8.0  # seconds per post above which the concurrency is reduced
+THROTTLE_RATE_LIMIT_PAUSE = 30  # seconds without requests to a host after a rate limit page
+POST_RETRIES = 2  # retries of a failed post, with jittered exponential backoff
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# JSON backend, selected with --backend json
+SCRAPER_BACKEND = "selenium"  # "selenium" or "json"
+JSON_BASE_URL = "https://www.reddit.com"
+JSON_USER_AGENT = "python:reddit-sentiment:1.0"
+JSON_CONCURRENCY = 16  # maximum number of requests in flight
+JSON_COMMENT_LIMIT = 500  # comments requested per post
+JSON_REQUEST_TIMEOUT = 30
+JSON_MAX_RETRIES = 3
 
 # DB
-MONGODB_URI = "mongodb://localhost:27017/" if not is_running_in_docker() else "mongodb://mongodb:27017/"
+# the check of utils.is_running_in_docker, the config does not import utils so it does not load selenium
+MONGODB_URI = "mongodb://localhost:27017/" if os.environ.get('DOCKER_CONTAINER') is None else "mongodb://mongodb:27017/"
 DATABASE_NAME = "reddit_sentiment"
 POSTS_COLLECTION = "posts"
 COMMENTS_COLLECTION = "comments"
+MONGODB_MAX_POOL_SIZE = 100  # connections per server shared by all threads of a process
+MONGODB_MIN_POOL_SIZE = 0  # connections kept open while idle
+MONGODB_MAX_IDLE_TIME_MS = None  # close pooled connections idle for longer, None to keep them
+READ_BATCH_SIZE = 1000  # documents per round trip of streamed reads
+WRITE_BATCH_SIZE = 1000  # scraped documents per bulk write
+WRITE_FLUSH_INTERVAL = 2.0  # maximum seconds a scraped document waits before it is written
+WRITE_QUEUE_SIZE = 1000  # queued write requests before the scrapers wait for the database
+WRITE_CLOSE_TIMEOUT = 60  # maximum seconds the pending documents are written for when a run ends
+
+# Work queue for distributed scraping, see the enqueue and worker commands of main.py
+WORK_QUEUE_COLLECTION = "work_queue"
+WORK_QUEUE_LEASE_SECONDS = 300  # a claimed item can be claimed by another worker if its lease is not renewed
+WORK_QUEUE_HEARTBEAT_INTERVAL = 60  # renewal interval of the lease while an item is processed
+WORK_QUEUE_MAX_ATTEMPTS = 3  # claims after which a failing item is given up
+WORK_QUEUE_POLL_INTERVAL = 5  # wait in seconds when no item is available
 
 # Sentiment Analysis
 SENTIMENT_ANALYSIS = True
 SENTIMENT_FEATURES = [(POSTS_COLLECTION, 'title'), (COMMENTS_COLLECTION, 'text')]
 SENTIMENT_MODEL = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+SENTIMENT_MODEL_REVISION = None  # branch, tag or commit hash of the model, None for the latest revision
+SENTIMENT_BACKENDS = ("torch", "torch-int8", "onnx")
+SENTIMENT_BACKEND = "torch"  # fp32 torch, dynamically quantized int8 torch or ONNX Runtime
+SENTIMENT_ONNX_DIR = "./data/onnx"  # exported ONNX graphs, one per model revision
+SENTIMENT_MAX_LENGTH = 512  # tokens of a text, longer texts are truncated
+SENTIMENT_MAX_BATCH_TOKENS = 8192  # tokens of a padded inference batch, batches of short texts hold more texts
+SENTIMENT_MAX_BATCH_SIZE = 256  # texts per inference batch
+SENTIMENT_CACHE_SIZE = 100000  # sentiments kept in memory by the content-addressed cache, 0 disables the cache
+SENTIMENT_CACHE_FILE = "./data/sentiment_cache.sqlite3"  # persistent layer of the cache, None to cache in memory only
+SENTIMENT_WORKERS = 0  # inference worker processes sharing the model weights, 0 to score in the main process
+SENTIMENT_WORKER_CHUNK_SIZE = 64  # texts per task of an inference worker
+SENTIMENT_WORKER_QUEUE_SIZE = 16  # tasks waiting for an inference worker
+SENTIMENT_WRITE_BATCH_SIZE = 1000  # sentiment updates per bulk write
+SENTIMENT_WRITE_RETRIES = 3  # retries of a bulk write that failed with a transient error
+SENTIMENT_RAW_BSON = True  # decode only the analyzed field of the streamed documents
+SENTIMENT_ROLLUPS = True  # update the rollups per subreddit, post, author and day as sentiments are written
+SENTIMENT_ROLLUP_COLLECTIONS = {'subreddit': "rollups_subreddit", 'post': "rollups_post", 'author': "rollups_author",
+                                'day': "rollups_day"}
+
+# Sentiment daemon scoring new documents as they are inserted, see the sentiment-daemon command of main.py
+SENTIMENT_DAEMON_COLLECTION = "sentiment_watermarks"  # resume tokens and watermarks of the tailed collections
+SENTIMENT_DAEMON_BATCH_SIZE = 64  # documents scored together
+SENTIMENT_DAEMON_MAX_WAIT = 2.0  # maximum seconds a new document waits for its batch to fill up
+SENTIMENT_DAEMON_POLL_INTERVAL = 5.0  # wait in seconds after a poll found no new documents
+SENTIMENT_DAEMON_POLL_LAG = 10  # seconds a document is left unpolled, so ids of concurrent writers are not skipped
+SENTIMENT_DAEMON_CHANGE_STREAMS = True  # watch with change streams on replica sets, poll otherwise
@@ -1,11 +1,250 @@
-from pymongo import MongoClient
+import atexit
+import bisect
+import itertools
+import logging
+import queue
+import threading
+import time
+import weakref
 
-from src.config import DATABASE_NAME, MONGODB_URI
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING, InsertOne, MongoClient, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from src.config import DATABASE_NAME, MONGODB_URI, MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, \
+    MONGODB_MAX_IDLE_TIME_MS, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_QUEUE_SIZE, WRITE_CLOSE_TIMEOUT, \
+    POSTS_COLLECTION, COMMENTS_COLLECTION, READ_BATCH_SIZE, SENTIMENT_ROLLUP_COLLECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Indexes ensured at startup, per collection a list of (name, keys, options). Posts and comments are unique by their
+# Reddit ids, documents without an id (e.g. comments whose id could not be extracted) are left out of the index.
+INDEXES = {
+    POSTS_COLLECTION: [
+        ('post_id_unique', [('post_id', ASCENDING)],
+         {'unique': True, 'partialFilterExpression': {'post_id': {'$gt': ''}}}),
+        ('subreddit_sentiment', [('subreddit', ASCENDING), ('sentiment.label', ASCENDING)], {}),
+        ('sentiment_version', [('sentiment.version', ASCENDING)], {}),
+    ],
+    COMMENTS_COLLECTION: [
+        ('thing_id_unique', [('thing_id', ASCENDING)],
+         {'unique': True, 'partialFilterExpression': {'thing_id': {'$gt': ''}}}),
+        ('post_id', [('post_id', ASCENDING)], {}),
+        ('parent_id', [('parent_id', ASCENDING)], {}),
+        ('subreddit_sentiment', [('subreddit', ASCENDING), ('sentiment.label', ASCENDING)], {}),
+        ('sentiment_version', [('sentiment.version', ASCENDING)], {}),
+    ],
+    **{collection: [('version_key', [('version', ASCENDING), ('key', ASCENDING)], {'unique': True})]
+       for collection in SENTIMENT_ROLLUP_COLLECTIONS.values()},
+}
+
+
+def unscored_query(version):
+    """
+    :param version: The version of the sentiment pipeline, see SentimentPipeline.version.
+    :return: The filter of the documents that have no sentiment yet or were scored by another version.
+    """
+    return {'sentiment.version': {'$ne': version}}
+
+
+# Queries of the sentiment controller and the analysis that must be answered from an index
+INDEXED_QUERIES = {
+    'unscored posts': (POSTS_COLLECTION, unscored_query('model@revision/preprocessing-1')),
+    'unscored comments': (COMMENTS_COLLECTION, unscored_query('model@revision/preprocessing-1')),
+    'post by id': (POSTS_COLLECTION, {'post_id': 'abc123'}),
+    'comment by id': (COMMENTS_COLLECTION, {'thing_id': 't1_abc123'}),
+    'comments of a post': (COMMENTS_COLLECTION, {'post_id': 'abc123'}),
+    'replies to a comment': (COMMENTS_COLLECTION, {'parent_id': 't1_abc123'}),
+    'posts of a subreddit': (POSTS_COLLECTION, {'subreddit': 'aww'}),
+    'comments of a subreddit by label': (COMMENTS_COLLECTION, {'subreddit': 'aww', 'sentiment.label': 'positive'}),
+}
+
+# Server error codes of an index that conflicts with an existing one, and of duplicate keys
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY_CODES = (11000, 11001)
+
+
+def upsert_operations(rows, key):
+    """
+    Builds the bulk write operations that upsert documents keyed on an id field.
+
+    :param rows: The documents.
+    :param key: The id field, e.g. "thing_id". Documents without a value are inserted.
+    :return: A list of UpdateOne and InsertOne operations.
+    """
+    return [UpdateOne({key: row[key]}, {'$set': row}, upsert=True) if row.get(key) else InsertOne(row)
+            for row in rows]
+
+
+def iter_chunks(iterable, size):
+    """
+    Splits an iterable into lists of up to `size` items without materializing it.
+
+    :param iterable: The items, e.g. a cursor.
+    :param size: The maximum number of items per chunk.
+    :return: A generator of lists.
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def plan_stages(plan):
+    """
+    Collects the stages of a query plan returned by explain.
+
+    :param plan: A plan document, e.g. explain()['queryPlanner']['winningPlan'].
+    :return: A list of (stage, index name) tuples, outermost stage first, the index name is None for stages
+        without an index.
+    """
+    stages = []
+    while plan:
+        stages.append((plan.get('stage'), plan.get('indexName')))
+        if 'inputStages' in plan:
+            for input_stage in plan['inputStages']:
+                stages.extend(plan_stages(input_stage))
+            break
+        plan = plan.get('queryPlan', plan.get('inputStage'))
+    return stages
+
+
+class DatabaseStats(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """
+    Thread-safe connection and per-operation latency statistics, collected with pymongo's monitoring listeners.
+    """
+
+    def __init__(self):
+        """
+        Initialize the counters.
+        """
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.failed_operations = 0
+        # command name -> [count, total seconds, max seconds]
+        self._operations = {}
+
+    @property
+    def open_connections(self):
+        return self.connections_created - self.connections_closed
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        with self._lock:
+            operation = self._operations.setdefault(event.command_name, [0, 0.0, 0.0])
+            operation[0] += 1
+            operation[1] += seconds
+            operation[2] = max(operation[2], seconds)
+
+    def failed(self, event):
+        with self._lock:
+            self.failed_operations += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def operations(self):
+        """
+        :return: A dict of command name to (count, mean seconds, max seconds).
+        """
+        with self._lock:
+            return {name: (count, total / count, maximum) for name, (count, total, maximum) in self._operations.items()}
+
+    def summary(self):
+        """
+        :return: A human readable summary of the connections and the operation latencies.
+        """
+        parts = [f"{count} {name} mean={mean * 1000:.1f}ms max={maximum * 1000:.1f}ms"
+                 for name, (count, mean, maximum) in sorted(self.operations().items())]
+        return (f"{self.connections_created} connections opened, {self.open_connections} open, "
+                f"peak {self.peak_checked_out} in use, {self.failed_operations} failed operations; "
+                + ("; ".join(parts) if parts else "no operations"))
+
+
+# Statistics of all shared clients of this process
+DB_STATS = DatabaseStats()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri=MONGODB_URI):
+    """
+    Return the shared MongoClient of this process for the given URI, creating it on first use.
+
+    MongoClient is thread-safe and keeps a pool of connections, so one long-lived client is shared by all database
+    clients, scraping workers and the sentiment controller instead of connecting for every operation.
+
+    :param uri: The MongoDB connection URI.
+    :return: The shared MongoClient.
+    """
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = MongoClient(uri, maxPoolSize=MONGODB_MAX_POOL_SIZE, minPoolSize=MONGODB_MIN_POOL_SIZE,
+                                 maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS, event_listeners=[DB_STATS])
+            _clients[uri] = client
+        return client
+
+
+@atexit.register
+def close_clients():
+    """
+    Close the shared clients of this process and their connection pools.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
 
 class MongoDBClient:
     """
     A MongoDB client class that provides methods to interact with the MongoDB database.
+
+    Instances are cheap handles on the shared, pooled MongoClient of the process. Using an instance as a context
+    manager only scopes the work on the database, the connections stay open in the pool.
     """
 
     def __init__(self, database_name=DATABASE_NAME):
@@ -32,6 +271,39 @@ class MongoDBClient:
         result = col.insert_many(data_list)
         return result.inserted_ids
 
+    def insert_frame(self, collection, df):
+        """
+        Insert all rows of a polars DataFrame into the specified collection.
+
+        The rows are streamed to the driver one document at a time instead of materializing a list of dictionaries.
+
+        :param collection: The name of the collection to insert data into.
+        :param df: A polars DataFrame, one document per row.
+        :return: A list of ObjectIDs of the inserted documents.
+        """
+        if df is None or df.height == 0:
+            return None
+
+        col = self.db[collection]
+        result = col.insert_many(df.iter_rows(named=True))
+        return result.inserted_ids
+
+    def upsert_frame(self, collection, df, key):
+        """
+        Upsert all rows of a polars DataFrame keyed on an id field with one unordered bulk write, so storing the
+        same documents again updates them instead of adding duplicates.
+
+        :param collection: The name of the collection to upsert data in.
+        :param df: A polars DataFrame, one document per row.
+        :param key: The id field, e.g. "thing_id". Rows without a value are inserted.
+        :return: The BulkWriteResult.
+        """
+        if df is None or df.height == 0:
+            return None
+
+        col = self.db[collection]
+        return col.bulk_write(upsert_operations(df.iter_rows(named=True), key), ordered=False)
+
     def get_data(self, collection, query):
         """
         Retrieve documents from the specified collection based on the given query.
@@ -40,9 +312,27 @@ class MongoDBClient:
         :param query: A dictionary representing the MongoDB query.
         :return: A list of documents matching the query.
         """
+        return list(self.iter_data(collection, query))
+
+    def iter_data(self, collection, query, projection=None, batch_size=READ_BATCH_SIZE, raw=False):
+        """
+        Stream the documents matching the query from a cursor, `batch_size` documents per round trip.
+
+        Only one batch is held in memory at a time. The cursor is closed when the generator is exhausted or closed.
+
+        :param collection: The name of the collection to query data from.
+        :param query: A dictionary representing the MongoDB query.
+        :param projection: The fields to return, e.g. {'_id': 1, 'text': 1}, None for whole documents.
+        :param batch_size: The number of documents fetched per round trip.
+        :param raw: Return RawBSONDocuments, which only decode the fields that are accessed.
+        :return: A generator of documents.
+        """
         col = self.db[collection]
-        result = col.find(query)
-        return list(result)
+        if raw:
+            col = col.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+
+        with col.find(query, projection, batch_size=batch_size) as cursor:
+            yield from cursor
 
     def update_data_by_id(self, collection, doc_id, data):
         """
@@ -55,6 +345,99 @@ class MongoDBClient:
         col = self.db[collection]
         col.update_one({'_id': doc_id}, {'$set': data}, upsert=False)
 
+    def upsert_data(self, collection, query, data):
+        """
+        Update the document matching the query with the given data, or insert it if there is none.
+
+        :param collection: The name of the collection to upsert data in.
+        :param query: A dictionary identifying the document, e.g. {'post_id': ...}.
+        :param data: A dictionary containing the data to set.
+        """
+        col = self.db[collection]
+        col.update_one(query, {'$set': data}, upsert=True)
+
+    def ensure_indexes(self, indexes=None):
+        """
+        Create the indexes of the posts and comments collections if they do not exist.
+
+        Existing indexes on the same keys with other options are replaced. No documents are deleted: a unique index
+        that cannot be built because of duplicates from earlier runs raises an error, the duplicates are removed
+        explicitly with scripts/remove_duplicates.py.
+
+        :param indexes: The indexes per collection, defaults to INDEXES.
+        :raises RuntimeError: If a unique index cannot be built because the collection contains duplicates.
+        """
+        for collection, collection_indexes in (indexes or INDEXES).items():
+            col = self.db[collection]
+            for name, keys, options in collection_indexes:
+                try:
+                    col.create_index(keys, name=name, **options)
+                except OperationFailure as e:
+                    if e.code in INDEX_CONFLICT_CODES:
+                        self._drop_indexes_on(col, keys)
+                    elif e.code in DUPLICATE_KEY_CODES and options.get('unique'):
+                        raise RuntimeError(
+                            f"The unique index {name} of {collection} cannot be built because {collection} contains "
+                            f"documents with the same {', '.join(key for key, _ in keys)}. Remove them with "
+                            f"'python scripts/remove_duplicates.py' and start again.") from e
+                    else:
+                        raise
+                    col.create_index(keys, name=name, **options)
+
+    @staticmethod
+    def _drop_indexes_on(col, keys):
+        for index in col.list_indexes():
+            if list(index['key'].items()) == [(field, direction) for field, direction in keys]:
+                logger.info(f"Replacing index {index['name']} of {col.name}")
+                col.drop_index(index['name'])
+
+    def remove_duplicates(self, collection, key):
+        """
+        Remove documents with the same id, keeping the first stored document of every id.
+
+        :param collection: The name of the collection.
+        :param key: The id field, e.g. "thing_id".
+        :return: The number of removed documents.
+        """
+        col = self.db[collection]
+        duplicates = col.aggregate([
+            {'$match': {key: {'$gt': ''}}},
+            {'$sort': {'_id': 1}},
+            {'$group': {'_id': f'${key}', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}},
+        ], allowDiskUse=True)
+
+        removed = 0
+        for duplicate in duplicates:
+            removed += col.delete_many({'_id': {'$in': duplicate['ids'][1:]}}).deleted_count
+        return removed
+
+    def explain_query(self, collection, query):
+        """
+        Explain a query and return the stages of its winning plan.
+
+        :param collection: The name of the collection.
+        :param query: The query filter.
+        :return: A list of (stage, index name) tuples, see plan_stages.
+        """
+        explain = self.db[collection].find(query).explain()
+        return plan_stages(explain['queryPlanner']['winningPlan'])
+
+    def check_index_usage(self, queries=None):
+        """
+        Check with explain that the queries of the sentiment controller and the analysis use an index.
+
+        :param queries: Queries by name as (collection, filter) tuples, defaults to INDEXED_QUERIES.
+        :return: A dict of query name to the used index name, None for queries that scan the collection.
+        """
+        usage = {}
+        for name, (collection, query) in (queries or INDEXED_QUERIES).items():
+            indexes = [index for stage, index in self.explain_query(collection, query) if stage == 'IXSCAN']
+            usage[name] = indexes[0] if indexes else None
+            if usage[name] is None:
+                logger.warning(f"Query '{name}' on {collection} does not use an index: {query}")
+        return usage
+
     def drop_database(self, database_name):
         """
         Drop the specified database.
@@ -65,17 +448,18 @@ class MongoDBClient:
 
     def connect_to_db(self):
         """
-        Establish a connection to the MongoDB database.
+        Bind the database of the shared MongoClient. Connections are taken from the pool per operation.
         """
-        self.client = MongoClient(MONGODB_URI)
-        self.db = self.client[self.database_name]
+        if self.client is None:
+            self.client = get_client()
+            self.db = self.client[self.database_name]
 
     def close_db_connection(self):
         """
-        Close the connection to the MongoDB database.
+        Release the database handle. The shared client stays open for other users until the process exits.
         """
-        if self.client is not None:
-            self.client.close()
+        self.client = None
+        self.db = None
 
     def __enter__(self):
         """
@@ -86,12 +470,306 @@ class MongoDBClient:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Close the connection to the MongoDB database when the MongoDBClient object is used as a context manager.
+        End the session scope. The connections stay in the pool of the shared client.
+        """
+
+
+class _Marker:
+    """
+    A request in the queue of a BatchWriter that calls its callback once the writes queued before it are done.
+    """
+
+    def __init__(self, callback, owner, force):
+        self.callback = callback
+        self.owner = owner
+        self.force = force
+
+
+class BatchWriter:
+    """
+    A write-behind buffer for scraped documents.
+
+    Offers the write methods of MongoDBClient, but only queues the documents and returns. A background thread collects
+    the documents of many posts and writes them with unordered bulk writes once `batch_size` documents are pending or
+    the oldest pending document waited `flush_interval` seconds. The queue is bounded, so producers block when the
+    database falls behind. Pending documents are flushed on `close`, when the context manager exits and at
+    interpreter exit. Instances are thread-safe and can be shared by all scraping workers.
+
+    The writer remembers which thread queued a write, so a producer can learn whether its writes were stored, see
+    `when_written` and `confirm`, e.g. to mark a post as done only once its documents are in the database.
+    """
+
+    _STOP = object()
+    # seconds between two checks whether the writer thread is still alive while waiting for it
+    LIVENESS_INTERVAL = 1.0
+
+    def __init__(self, db_client, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL,
+                 max_queue=WRITE_QUEUE_SIZE, close_timeout=WRITE_CLOSE_TIMEOUT):
+        """
+        Initialize the BatchWriter and start its flush thread.
+
+        :param db_client: The MongoDBClient the batches are written with.
+        :param batch_size: The number of pending documents that triggers a bulk write.
+        :param flush_interval: The maximum time in seconds a document waits before it is written.
+        :param max_queue: The maximum number of queued write requests before producers block.
+        :param close_timeout: The maximum time in seconds `close` waits for the pending documents to be written.
+        """
+        self.db_client = db_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.close_timeout = close_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._lock = threading.Lock()
+        # producer threads with a failed write since their last marker, only used by the writer thread
+        self._failed_owners = set()
+
+        self.batches = 0
+        self.documents = 0
+        self.errors = 0
+        self.blocked_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='batch-writer', daemon=True)
+        self._thread.start()
+        _writers.add(self)
+
+    def _enqueue(self, request):
+        if self._closed:
+            raise RuntimeError("BatchWriter is closed")
+        start = time.monotonic()
+        while True:
+            try:
+                self._queue.put(request, timeout=self.LIVENESS_INTERVAL)
+                break
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError("The BatchWriter thread died, the documents cannot be written")
+        waited = time.monotonic() - start
+        if waited > 0.01:
+            with self._lock:
+                self.blocked_seconds += waited
+
+    def _put(self, collection, operations):
+        if not operations:
+            return
+        self._enqueue((collection, operations, threading.current_thread()))
+
+    def when_written(self, callback):
+        """
+        Call `callback(success)` from the writer thread once all writes queued by the calling thread so far are
+        done. `success` is False if any of them failed since the previous callback of the thread. The callback
+        waits for the regular flush, so the writes are still batched.
+
+        :param callback: The function called with True if the writes were stored.
+        """
+        self._enqueue(_Marker(callback, threading.current_thread(), force=False))
+
+    def confirm(self):
+        """
+        Write the pending documents now and block until all writes queued by the calling thread so far are done.
+
+        :return: True if they were stored, False if any of them failed or the writer thread died.
         """
-        self.close_db_connection()
+        done = threading.Event()
+        result = []
+        self._enqueue(_Marker(lambda success: (result.append(success), done.set()), threading.current_thread(),
+                              force=True))
+        return self._wait(done) and result[0]
+
+    def _wait(self, event):
+        while not event.wait(self.LIVENESS_INTERVAL):
+            if not self._thread.is_alive():
+                return False
+        return True
 
-    def __del__(self):
+    def insert_many_data(self, collection, data_list):
         """
-        Close the connection to the MongoDB database when the MongoDBClient object is deleted.
+        Queue documents for insertion into the specified collection.
+
+        :param collection: The name of the collection to insert data into.
+        :param data_list: A list of dictionaries containing the data to be inserted.
         """
-        self.close_db_connection()
+        if data_list is None or len(data_list) == 0:
+            return
+        self._put(collection, [InsertOne(document) for document in data_list])
+
+    def insert_frame(self, collection, df):
+        """
+        Queue all rows of a polars DataFrame for insertion into the specified collection.
+
+        :param collection: The name of the collection to insert data into.
+        :param df: A polars DataFrame, one document per row.
+        """
+        if df is None or df.height == 0:
+            return
+        self._put(collection, [InsertOne(document) for document in df.iter_rows(named=True)])
+
+    def upsert_frame(self, collection, df, key):
+        """
+        Queue upserts of all rows of a polars DataFrame keyed on an id field.
+
+        :param collection: The name of the collection to upsert data in.
+        :param df: A polars DataFrame, one document per row.
+        :param key: The id field, e.g. "thing_id". Rows without a value are inserted.
+        """
+        if df is None or df.height == 0:
+            return
+        self._put(collection, upsert_operations(df.iter_rows(named=True), key))
+
+    def upsert_data(self, collection, query, data):
+        """
+        Queue an upsert of the document matching the query.
+
+        :param collection: The name of the collection to upsert data in.
+        :param query: A dictionary identifying the document, e.g. {'post_id': ...}.
+        :param data: A dictionary containing the data to set.
+        """
+        self._put(collection, [UpdateOne(query, {'$set': data}, upsert=True)])
+
+    def _write(self, pending, owners):
+        """
+        Write the pending operations with one unordered bulk write per collection. The producers of failed
+        operations are remembered for their next marker.
+        """
+        with self.db_client as db_client:
+            for collection, operations in pending.items():
+                ends = [end for end, _ in owners[collection]]
+                try:
+                    db_client.db[collection].bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    write_errors = e.details.get('writeErrors', [])
+                    with self._lock:
+                        self.errors += len(write_errors)
+                    for error in write_errors:
+                        self._failed_owners.add(owners[collection][bisect.bisect_right(ends, error['index'])][1])
+                    logger.error(f"{len(write_errors)} of {len(operations)} writes to {collection} failed: {str(e)}")
+                except Exception as e:
+                    # e.g. a lost connection or a document that cannot be encoded, the next batches are still written
+                    with self._lock:
+                        self.errors += len(operations)
+                    self._failed_owners.update(owner for _, owner in owners[collection])
+                    logger.error(f"Bulk write of {len(operations)} documents to {collection} failed: "
+                                 f"{type(e).__name__}: {str(e)}")
+                with self._lock:
+                    self.batches += 1
+                    self.documents += len(operations)
+
+    def _notify(self, marker):
+        success = marker.owner not in self._failed_owners
+        self._failed_owners.discard(marker.owner)
+        try:
+            marker.callback(success)
+        except Exception as e:
+            logger.error(f"Callback after the writes failed: {type(e).__name__}: {str(e)}")
+
+    def _run(self):
+        pending = {}
+        # per collection, the end index of the operations of every request and the thread that queued it
+        owners = {}
+        markers = []
+        pending_count = 0
+        pending_requests = 0
+        deadline = None
+        stop = False
+
+        while not stop:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                request = None
+
+            force = False
+            if request is self._STOP:
+                stop = True
+                pending_requests += 1
+            elif isinstance(request, _Marker):
+                markers.append(request)
+                pending_requests += 1
+                # a marker without pending writes is answered right away
+                force = request.force or not pending
+            elif request is not None:
+                collection, operations, owner = request
+                collection_operations = pending.setdefault(collection, [])
+                collection_operations.extend(operations)
+                owners.setdefault(collection, []).append((len(collection_operations), owner))
+                pending_count += len(operations)
+                pending_requests += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if stop or force or pending_count >= self.batch_size \
+                    or (deadline is not None and time.monotonic() >= deadline):
+                if pending:
+                    try:
+                        self._write(pending, owners)
+                    except Exception as e:
+                        with self._lock:
+                            self.errors += pending_count
+                        self._failed_owners.update(owner for requests in owners.values() for _, owner in requests)
+                        logger.error(f"Writing {pending_count} documents failed: {type(e).__name__}: {str(e)}")
+                for marker in markers:
+                    self._notify(marker)
+                for _ in range(pending_requests):
+                    self._queue.task_done()
+                pending, owners, markers, pending_count, pending_requests, deadline = {}, {}, [], 0, 0, None
+
+    def flush(self):
+        """
+        Block until all queued documents are written.
+        """
+        if self._thread.is_alive():
+            done = threading.Event()
+            # not a producer, the marker does not consume the failures of a thread
+            self._enqueue(_Marker(lambda success: done.set(), None, force=False))
+            self._wait(done)
+
+    def close(self):
+        """
+        Write all queued documents and stop the flush thread. Waits at most `close_timeout` seconds.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        _writers.discard(self)
+
+        deadline = time.monotonic() + self.close_timeout
+        while self._thread.is_alive() and time.monotonic() < deadline:
+            try:
+                self._queue.put(self._STOP, timeout=self.LIVENESS_INTERVAL)
+                break
+            except queue.Full:
+                pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            logger.error(f"The BatchWriter did not finish within {self.close_timeout}s, "
+                         f"about {self._queue.qsize()} write requests are not written")
+        elif not self._queue.empty():
+            logger.error(f"The BatchWriter thread died, {self._queue.qsize()} write requests are not written")
+
+    def summary(self):
+        """
+        :return: A human readable summary of the writes.
+        """
+        with self._lock:
+            return (f"{self.documents} documents in {self.batches} bulk writes, {self.errors} failed, "
+                    f"producers blocked {self.blocked_seconds:.1f}s")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_writers = weakref.WeakSet()
+
+
+@atexit.register
+def close_writers():
+    """
+    Flush the writers that are still open at interpreter exit. Registered after `close_clients`, so it runs first.
+    """
+    for writer in list(_writers):
+        writer.close()
@@ -0,0 +1,220 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from selenium.common import WebDriverException
+
+from src.config import DRIVER_MAX_PAGE_LOADS, DRIVER_MAX_RSS_MB
+from src.utils import get_driver, get_process_tree_rss
+
+logger = logging.getLogger(__name__)
+
+
+class ManagedDriver:
+    """
+    A thin proxy around a webdriver that is kept alive by the DriverManager.
+
+    Every attribute is delegated to the wrapped driver, only `get` is intercepted to count page loads.
+    """
+
+    def __init__(self, driver):
+        """
+        Initialize the ManagedDriver.
+
+        :param driver: The webdriver instance to wrap.
+        """
+        self.driver = driver
+        self.page_loads = 0
+        self.cookies_accepted = False
+        self.created_at = time.monotonic()
+
+    def get(self, url):
+        """
+        Load a page and count it towards the recycle budget of the session.
+
+        :param url: The URL to load.
+        """
+        self.page_loads += 1
+        self.driver.get(url)
+
+    def __getattr__(self, name):
+        if name == 'driver':
+            raise AttributeError(name)
+        return getattr(self.driver, name)
+
+
+class DriverManager:
+    """
+    Keeps warm browser sessions alive across subreddits.
+
+    A session is started lazily and reused until it has served `max_page_loads` pages or the browser process tree
+    grows beyond `max_rss_mb`, after which it is recycled. Cookies of a recycled session, including the accepted
+    cookie banner, are carried over to its successor. Startup and per-subreddit overhead are recorded so the savings
+    compared to a fresh browser per subreddit can be reported.
+
+    A DriverManager is not thread-safe; every scraping worker owns its own instance.
+    """
+
+    def __init__(self, driver_options, max_page_loads=DRIVER_MAX_PAGE_LOADS, max_rss_mb=DRIVER_MAX_RSS_MB):
+        """
+        Initialize the DriverManager.
+
+        :param driver_options: Webdriver options used for every browser session.
+        :param max_page_loads: Page loads after which a session is recycled. None disables the limit.
+        :param max_rss_mb: Resident memory of the browser in MB after which a session is recycled. None disables the
+            limit.
+        """
+        self.driver_options = driver_options
+        self.max_page_loads = max_page_loads
+        self.max_rss_mb = max_rss_mb
+
+        self._driver = None
+        self._cookies = []
+
+        self.startups = 0
+        self.startup_seconds = 0.0
+        self.recycles = 0
+        self.sessions_served = 0
+        self.overhead_seconds = 0.0
+
+    @contextmanager
+    def session(self):
+        """
+        Provide a warm driver for the duration of one unit of work, e.g. scraping a subreddit.
+
+        If the work fails with a WebDriverException the browser is discarded, otherwise it is kept for the next
+        session unless one of the recycle limits has been reached.
+
+        :return: ManagedDriver instance.
+        """
+        start = time.monotonic()
+        driver = self._acquire()
+        self.sessions_served += 1
+        self.overhead_seconds += time.monotonic() - start
+
+        try:
+            yield driver
+        except WebDriverException:
+            self._quit()
+            raise
+
+        if self._should_recycle(driver):
+            self.recycles += 1
+            self._quit()
+
+    def _acquire(self):
+        """
+        Return the current driver, starting a new browser if there is none.
+
+        :return: ManagedDriver instance.
+        """
+        if self._driver is not None:
+            return self._driver
+
+        start = time.monotonic()
+        driver = ManagedDriver(get_driver(self.driver_options))
+        elapsed = time.monotonic() - start
+
+        self.startups += 1
+        self.startup_seconds += elapsed
+        logger.info(f"Browser session started in {elapsed:.2f}s")
+
+        self._driver = driver
+        return driver
+
+    def restore_cookies(self, driver):
+        """
+        Add the cookies saved from a recycled session to the given driver.
+
+        Must be called after a page of the cookies' domain has been loaded. The cookie banner counts as accepted
+        once the cookies are restored.
+
+        :param driver: ManagedDriver instance.
+        :return: True if cookies were restored.
+        """
+        if not self._cookies or driver.cookies_accepted:
+            return False
+
+        for cookie in self._cookies:
+            try:
+                driver.add_cookie(cookie)
+            except WebDriverException as e:
+                logger.debug(f"Could not restore cookie {cookie.get('name')}: {str(e)}")
+
+        driver.cookies_accepted = True
+        return True
+
+    def _should_recycle(self, driver):
+        """
+        Check whether the given driver reached one of the recycle limits.
+
+        :param driver: ManagedDriver instance.
+        :return: True if the driver should be recycled.
+        """
+        if self.max_page_loads is not None and driver.page_loads >= self.max_page_loads:
+            logger.info(f"Recycling browser after {driver.page_loads} page loads")
+            return True
+
+        if self.max_rss_mb is not None:
+            rss = self.get_browser_rss(driver)
+            if rss is not None and rss / 2 ** 20 >= self.max_rss_mb:
+                logger.info(f"Recycling browser using {rss / 2 ** 20:.0f} MB")
+                return True
+
+        return False
+
+    @staticmethod
+    def get_browser_rss(driver):
+        """
+        Return the resident memory of a local browser, including geckodriver and all content processes.
+
+        :param driver: ManagedDriver instance.
+        :return: Resident memory in bytes or None for remote drivers.
+        """
+        try:
+            pid = driver.service.process.pid
+        except AttributeError:
+            return None
+        return get_process_tree_rss(pid)
+
+    def _quit(self):
+        """
+        Quit the current browser, keeping its cookies for the next session.
+        """
+        if self._driver is None:
+            return
+
+        driver, self._driver = self._driver, None
+        try:
+            if driver.cookies_accepted:
+                self._cookies = driver.get_cookies()
+        except WebDriverException:
+            pass
+
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            logger.debug(f"Error while quitting browser: {str(e)}")
+
+    def close(self):
+        """
+        Quit the current browser and log the session statistics.
+        """
+        self._quit()
+        logger.info(f"Browser sessions: {self.summary()}")
+
+    def summary(self):
+        """
+        :return: A human readable summary of startup and per-subreddit overhead.
+        """
+        avg_startup = self.startup_seconds / self.startups if self.startups else 0.0
+        avg_overhead = self.overhead_seconds / self.sessions_served if self.sessions_served else 0.0
+        return (f"{self.startups} browser startups ({self.recycles} recycles) for {self.sessions_served} sessions, "
+                f"{self.startup_seconds:.1f}s total startup ({avg_startup:.2f}s avg), "
+                f"{avg_overhead:.2f}s avg overhead per session")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,204 @@
+import json
+import logging
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+# Selectors shared by the live scraper and the offline page parser
+LISTING_POST_XPATH = ("//div[@data-testid='post-container' and not(descendant::span[contains(text(), 'nsfw')])]"
+                      "//a[@data-click-id='body']")
+COMMENT_XPATH = "//shreddit-comment[not(@is-comment-deleted) and not(@is-author-deleted)]"
+COMMENT_TEXT_XPATH = ".//div[@id='-post-rtjson-content']/p"
+AUTHOR_XPATH = "//a[contains(@class, 'author-name')]"
+
+COMMENT_SCHEMA = {'post_id': pl.Utf8, 'text': pl.Utf8, 'subreddit': pl.Utf8, 'author': pl.Utf8, 'upvotes': pl.Int64,
+                  'thing_id': pl.Utf8, 'parent_id': pl.Utf8}
+
+# Collects all comments of a post page in the browser and returns them as one JSON string, so a whole thread
+# costs a single WebDriver round trip. Only the first paragraph that belongs to the comment itself is used as text,
+# paragraphs of nested replies are skipped.
+COMMENT_EXTRACTION_SCRIPT = """
+const records = [];
+const comments = document.querySelectorAll(
+    "shreddit-comment:not([is-comment-deleted]):not([is-author-deleted])");
+for (const comment of comments) {
+    let paragraph = null;
+    for (const candidate of comment.querySelectorAll("div[id='-post-rtjson-content'] > p")) {
+        if (candidate.closest("shreddit-comment") === comment) {
+            paragraph = candidate;
+            break;
+        }
+    }
+    if (paragraph === null) {
+        continue;
+    }
+    records.push({
+        text: paragraph.innerText,
+        author: comment.getAttribute("author"),
+        thing_id: comment.getAttribute("thingid"),
+        parent_id: comment.getAttribute("parentid"),
+        score: comment.getAttribute("score"),
+        permalink: comment.getAttribute("permalink")
+    });
+}
+return JSON.stringify(records);
+"""
+
+
+class CommentColumns:
+    """
+    Accumulates comment records in one buffer per column and materializes them as a single DataFrame.
+
+    Appending a comment only stores its values in the column buffers, the DataFrame with COMMENT_SCHEMA is built
+    once per post in `to_frame`.
+    """
+
+    def __init__(self, capacity=0):
+        """
+        Initialize the column buffers.
+
+        :param capacity: Expected number of comments, the buffers are preallocated to this size.
+        """
+        self._columns = {name: [None] * capacity for name in COMMENT_SCHEMA}
+        self._size = 0
+
+    def append(self, post_id, text, subreddit, author, upvotes, thing_id, parent_id):
+        """
+        Append one comment to the column buffers.
+        """
+        values = (post_id, text, subreddit, author, upvotes, thing_id, parent_id)
+        index = self._size
+        for column, value in zip(self._columns.values(), values):
+            if index < len(column):
+                column[index] = value
+            else:
+                column.append(value)
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def to_frame(self):
+        """
+        :return: DataFrame with COMMENT_SCHEMA containing all appended comments.
+        """
+        return pl.DataFrame({name: column[:self._size] for name, column in self._columns.items()},
+                            schema=COMMENT_SCHEMA)
+
+
+# Collects the comment count shown on the listing for every post, keyed by the absolute post link
+LISTING_COMMENT_COUNTS_SCRIPT = """
+const counts = {};
+const links = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (let i = 0; i < links.snapshotLength; i++) {
+    const link = links.snapshotItem(i);
+    const container = link.closest("div[data-testid='post-container']");
+    const comments = container ? container.querySelector("a[data-click-id='comments']") : null;
+    counts[link.href] = comments ? comments.innerText : null;
+}
+return JSON.stringify(counts);
+"""
+
+
+def extract_listing_comment_counts(driver):
+    """
+    Extracts the comment count of every post on the loaded listing page with a single injected script.
+
+    :param driver: Selenium webdriver instance with a listing page loaded.
+    :return: A dictionary mapping post links to comment counts, None where the count is unknown.
+    """
+    counts = json.loads(driver.execute_script(LISTING_COMMENT_COUNTS_SCRIPT, LISTING_POST_XPATH))
+    return {href: parse_comment_count(text) for href, text in counts.items()}
+
+
+def parse_comment_count(text):
+    """
+    Converts a comment count label such as "42 comments", "1.2k Comments" or "Comment" to an integer.
+
+    :param text: The label shown on the listing.
+    :return: The comment count or None if the label cannot be parsed.
+    """
+    if not text:
+        return None
+    number = text.strip().split()[0].lower().replace(',', '')
+    if number in ('comment', 'comments'):
+        return 0
+
+    multiplier = 1
+    if number.endswith('k'):
+        number, multiplier = number[:-1], 1000
+    elif number.endswith('m'):
+        number, multiplier = number[:-1], 1000000
+
+    try:
+        return int(float(number) * multiplier)
+    except ValueError:
+        return None
+
+
+def parse_post_href(href):
+    """
+    Splits the link of a post of the form https://www.reddit.com/r/<subreddit>/comments/<post_id>/<title>/
+
+    :param href: link to the post.
+    :return: A tuple of (post_id, subreddit, title).
+    """
+    split_url = href.split('/')
+    return split_url[6], split_url[4], split_url[7]
+
+
+def parse_score(score):
+    """
+    Converts the score attribute of a comment to an integer.
+
+    :param score: The raw score attribute, may be None or empty.
+    :return: The score as integer, 0 if it is missing or not numeric.
+    """
+    try:
+        return int(score)
+    except (TypeError, ValueError):
+        return 0
+
+
+def subreddit_from_permalink(permalink):
+    """
+    Extracts the subreddit from a comment permalink of the form /r/<subreddit>/comments/...
+
+    :param permalink: The permalink of the comment.
+    :return: The subreddit or an empty string if the permalink is missing.
+    """
+    if not permalink:
+        return ''
+    parts = permalink.split("/")
+    return parts[2] if len(parts) > 2 else ''
+
+
+def extract_comments_bulk(driver, post_id):
+    """
+    Extracts all comments of the loaded post page with a single injected script.
+
+    :param driver: Selenium webdriver instance with a post page loaded.
+    :param post_id: post id
+    :return: DataFrame with comments data
+    """
+    records = json.loads(driver.execute_script(COMMENT_EXTRACTION_SCRIPT))
+    return comments_frame_from_records(records, post_id)
+
+
+def comments_frame_from_records(records, post_id):
+    """
+    Builds the comments DataFrame column by column from the records returned by the extraction script.
+
+    :param records: List of dictionaries with the raw comment attributes.
+    :param post_id: post id
+    :return: DataFrame with comments data
+    """
+    columns = CommentColumns(capacity=len(records))
+    for record in records:
+        if record.get('text') is None:
+            continue
+        columns.append(post_id, record['text'], subreddit_from_permalink(record.get('permalink')),
+                       record.get('author'), parse_score(record.get('score')), record.get('thing_id'),
+                       record.get('parent_id') or "")
+    return columns.to_frame()
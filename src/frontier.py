@@ -0,0 +1,142 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subreddits (
+    subreddit TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS posts (
+    href TEXT PRIMARY KEY,
+    subreddit TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    comment_count INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS posts_subreddit_state ON posts (subreddit, state);
+"""
+
+
+class Frontier:
+    """
+    The crash-safe scrape frontier, stored in a SQLite file.
+
+    Records the post hrefs discovered on every subreddit listing together with their state (pending, done or failed
+    with the number of attempts). Every state change is committed right away, so after a crash a run can continue
+    with the open posts instead of scrolling the listings and visiting the finished posts again. Instances are
+    thread-safe and can be shared by all scraping workers.
+    """
+
+    def __init__(self, path=config.FRONTIER_FILE, max_attempts=config.FRONTIER_MAX_ATTEMPTS):
+        """
+        Initialize the Frontier.
+
+        :param path: The SQLite file of the frontier, created if it does not exist.
+        :param max_attempts: The number of failed visits after which a post is given up.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def reset(self):
+        """
+        Forget all subreddits and posts, e.g. at the start of a run that is not resumed.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM posts")
+            self._connection.execute("DELETE FROM subreddits")
+
+    def is_discovered(self, subreddit):
+        """
+        :param subreddit: The subreddit.
+        :return: True if the posts of the subreddit's listing are already recorded.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM subreddits WHERE subreddit = ?", (subreddit,)).fetchone()
+        return row is not None
+
+    def add_posts(self, subreddit, posts):
+        """
+        Record the posts found on a subreddit listing and mark the subreddit as discovered.
+
+        :param subreddit: The subreddit.
+        :param posts: (href, comment count) tuples in listing order, the comment count can be None.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO posts (href, subreddit, position, comment_count) VALUES (?, ?, ?, ?)",
+                [(href, subreddit, position, comment_count) for position, (href, comment_count) in enumerate(posts)])
+            self._connection.execute("INSERT OR IGNORE INTO subreddits (subreddit) VALUES (?)", (subreddit,))
+
+    def open_posts(self, subreddit):
+        """
+        :param subreddit: The subreddit.
+        :return: (href, comment count) tuples of the pending posts and the failed posts with attempts left, in
+            listing order.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT href, comment_count FROM posts WHERE subreddit = ? AND "
+                "(state = ? OR (state = ? AND attempts < ?)) ORDER BY position",
+                (subreddit, PENDING, FAILED, self.max_attempts)).fetchall()
+
+    def is_finished(self, subreddit):
+        """
+        :param subreddit: The subreddit.
+        :return: True if the subreddit was discovered and has no open posts left.
+        """
+        return self.is_discovered(subreddit) and not self.open_posts(subreddit)
+
+    def mark_done(self, href):
+        """
+        :param href: The href of a post that was processed.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE posts SET state = ?, attempts = attempts + 1 WHERE href = ?",
+                                     (DONE, href))
+
+    def mark_failed(self, href):
+        """
+        :param href: The href of a post that could not be processed.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE posts SET state = ?, attempts = attempts + 1 WHERE href = ?",
+                                     (FAILED, href))
+
+    def counts(self):
+        """
+        :return: A dict with the number of posts per state.
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT state, COUNT(*) FROM posts GROUP BY state").fetchall()
+        return {PENDING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def summary(self):
+        """
+        :return: A human readable summary of the frontier.
+        """
+        counts = self.counts()
+        return f"{counts[DONE]} posts done, {counts[PENDING]} pending, {counts[FAILED]} failed"
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
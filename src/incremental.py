@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import math
+import threading
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter for string keys.
+
+    Used instead of a set once the number of known comments gets large. Lookups can return false positives but never
+    false negatives, so positives have to be confirmed against the database.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Initialize the BloomFilter.
+
+        :param capacity: The expected number of keys.
+        :param error_rate: The false positive rate at the expected number of keys.
+        """
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class KnownItems:
+    """
+    The posts and comments that are already stored in the database.
+
+    Known posts are kept with the comment count seen on the listing at their last visit, so a post is only visited
+    again if its comment count changed. Known comment ids are kept in a set, or in a Bloom filter for large histories,
+    so only new comments are written. Instances are thread-safe and can be shared by all scraping workers.
+    """
+
+    def __init__(self, bloom_threshold=config.INCREMENTAL_BLOOM_THRESHOLD,
+                 bloom_error_rate=config.INCREMENTAL_BLOOM_ERROR_RATE):
+        """
+        Initialize the KnownItems.
+
+        :param bloom_threshold: Number of known comments from which on a Bloom filter is used instead of a set.
+        :param bloom_error_rate: False positive rate of the Bloom filter.
+        """
+        self.bloom_threshold = bloom_threshold
+        self.bloom_error_rate = bloom_error_rate
+
+        self._lock = threading.Lock()
+        self._post_comment_counts = {}
+        self._comment_ids = set()
+        self._comment_ids_exact = True
+
+        self.skipped_posts = 0
+        self.skipped_comments = 0
+
+    def load(self, db_client):
+        """
+        Load the known post and comment ids from the database.
+
+        :param db_client: MongoDBClient instance.
+        :return: self
+        """
+        with db_client:
+            posts = db_client.db[config.POSTS_COLLECTION]
+            comments = db_client.db[config.COMMENTS_COLLECTION]
+            for post in posts.find({}, {'_id': 0, 'post_id': 1, 'comment_count': 1}):
+                self._post_comment_counts[post['post_id']] = post.get('comment_count')
+
+            comment_count = comments.estimated_document_count()
+            if comment_count >= self.bloom_threshold:
+                logger.info(f"Using a Bloom filter for {comment_count} known comments")
+                self._comment_ids = BloomFilter(int(comment_count * 1.5), self.bloom_error_rate)
+                self._comment_ids_exact = False
+
+            for comment in comments.find({'thing_id': {'$ne': None}}, {'_id': 0, 'thing_id': 1}).batch_size(10000):
+                self._comment_ids.add(comment['thing_id'])
+
+        logger.info(f"Loaded {len(self._post_comment_counts)} known posts and {comment_count} known comments")
+        return self
+
+    def is_post_unchanged(self, post_id, comment_count):
+        """
+        Check whether a post is stored and its comment count did not change since the last visit.
+
+        A skipped post is counted as avoided page load.
+
+        :param post_id: post id
+        :param comment_count: The comment count shown on the listing, None if unknown.
+        :return: True if the post does not have to be visited again.
+        """
+        with self._lock:
+            if comment_count is None or post_id not in self._post_comment_counts:
+                return False
+            if self._post_comment_counts[post_id] != comment_count:
+                return False
+            self.skipped_posts += 1
+            return True
+
+    def add_post(self, post_id, comment_count):
+        with self._lock:
+            self._post_comment_counts[post_id] = comment_count
+
+    def filter_new_comments(self, df_comments, db_client):
+        """
+        Remove the comments that are already stored from the DataFrame and remember the remaining ones.
+
+        Comments reported as known by a Bloom filter are confirmed with a query on the indexed thing_id.
+
+        :param df_comments: DataFrame with comments data.
+        :param db_client: MongoDBClient instance with an open connection.
+        :return: DataFrame with the new comments only.
+        """
+        thing_ids = df_comments['thing_id'].to_list()
+        with self._lock:
+            maybe_known = {thing_id for thing_id in thing_ids if thing_id is not None and thing_id in self._comment_ids}
+
+        if maybe_known and not self._comment_ids_exact:
+            stored = db_client.db[config.COMMENTS_COLLECTION].find({'thing_id': {'$in': list(maybe_known)}},
+                                                                   {'_id': 0, 'thing_id': 1})
+            maybe_known = {comment['thing_id'] for comment in stored}
+
+        df_new = df_comments.filter(~df_comments['thing_id'].is_in(list(maybe_known))) if maybe_known else df_comments
+
+        with self._lock:
+            self.skipped_comments += df_comments.height - df_new.height
+            for thing_id in df_new['thing_id'].to_list():
+                if thing_id is not None:
+                    self._comment_ids.add(thing_id)
+
+        return df_new
+
+    def summary(self):
+        """
+        :return: A human readable summary of the avoided work.
+        """
+        with self._lock:
+            return f"{self.skipped_posts} page loads and {self.skipped_comments} comment inserts avoided"
@@ -0,0 +1,193 @@
+import logging
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+import torch
+import torch.multiprocessing
+
+from src.config import COMMENTS_COLLECTION, SENTIMENT_WORKERS, SENTIMENT_WORKER_CHUNK_SIZE, \
+    SENTIMENT_WORKER_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# seconds between two checks whether the workers are still alive while waiting for the queues
+LIVENESS_INTERVAL = 1.0
+
+
+class InferenceError(Exception):
+    """
+    Raised in the controller's process when a worker failed to score a chunk of texts.
+    """
+
+
+def core_slices(workers, cores=None):
+    """
+    Splits the usable cores into one slice per worker.
+
+    :param workers: The number of workers.
+    :param cores: The usable core ids, defaults to the cores the process may run on.
+    :return: A list of core id lists, one per worker. Workers share cores if there are fewer cores than workers.
+    """
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    slices = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+def _work(pipeline, cores, tasks, results):
+    """
+    The loop of a worker process: scores chunks of preprocessed texts from the task queue until it receives None.
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    # one intra-op thread per pinned core, so the workers do not oversubscribe the machine
+    torch.set_num_threads(len(cores))
+    torch.set_num_interop_threads(1)
+
+    while (task := tasks.get()) is not None:
+        task_id, texts = task
+        try:
+            results.put((task_id, pipeline.infer(texts), None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"))
+
+
+class InferencePool:
+    """
+    Scores texts on a pool of worker processes that share the weights of one SentimentPipeline.
+
+    The model is loaded once in the controller's process and its weights are moved to shared memory, so the spawned
+    workers map the same weights instead of loading a copy each (with the torch fp32 backend). Every worker is pinned to
+    its own slice of the cores and runs torch with one thread per core of its slice. The texts of a call are sorted by
+    length and split into chunks that the workers take from a bounded queue, so similar lengths are batched together and
+    busy workers do not hold up the others. The texts are preprocessed and looked up in the sentiment cache of the
+    calling process, the workers only score the cache misses. Errors of a worker are raised in the calling process as
+    InferenceError, a worker that died breaks the pool with BrokenProcessPool.
+    """
+
+    def __init__(self, pipeline, workers=SENTIMENT_WORKERS, chunk_size=SENTIMENT_WORKER_CHUNK_SIZE,
+                 queue_size=SENTIMENT_WORKER_QUEUE_SIZE, cores=None):
+        """
+        Initialize the InferencePool and start the workers.
+
+        :param pipeline: The loaded SentimentPipeline.
+        :param workers: The number of worker processes.
+        :param chunk_size: The number of texts per task.
+        :param queue_size: The maximum number of tasks waiting for a worker.
+        :param cores: The core ids the workers are pinned to, defaults to all usable cores.
+        """
+        self.pipeline = pipeline
+        self.chunk_size = chunk_size
+        self.broken = False
+        self._lock = threading.Lock()
+
+        pipeline.share_memory()
+        context = torch.multiprocessing.get_context('spawn')
+        self._tasks = context.Queue(maxsize=queue_size)
+        self._results = context.Queue()
+        self._processes = [context.Process(target=_work, args=(pipeline, slice_cores, self._tasks, self._results),
+                                           name=f"inference-{i}", daemon=True)
+                           for i, slice_cores in enumerate(core_slices(workers, cores))]
+        for process in self._processes:
+            process.start()
+        logger.info(f"Started {workers} inference workers")
+
+    def _check_alive(self):
+        dead = [process.name for process in self._processes if not process.is_alive()]
+        if dead:
+            self.broken = True
+            raise BrokenProcessPool(f"Inference workers died: {', '.join(dead)}")
+
+    def _put(self, task):
+        while True:
+            try:
+                self._tasks.put(task, timeout=LIVENESS_INTERVAL)
+                return
+            except queue.Full:
+                self._check_alive()
+
+    def _get(self):
+        while True:
+            try:
+                return self._results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                self._check_alive()
+
+    def get_sentiments(self, texts, collection=COMMENTS_COLLECTION):
+        """
+        Get the sentiments of many texts from the workers. Calls from several threads are served one after another.
+
+        :param texts: The input strings.
+        :param collection: The collection type of the input data.
+        :return: A list with a dictionary containing the sentiment label and score per text, in the order of the texts.
+        :raises InferenceError: if a worker failed to score a chunk, after all chunks were collected.
+        :raises BrokenProcessPool: if a worker died.
+        """
+        if self.broken:
+            raise BrokenProcessPool("The inference pool is broken")
+
+        texts = [self.pipeline.preprocess(text, type=collection) for text in texts]
+        return self.pipeline.cached_sentiments(texts, self._infer)
+
+    def _infer(self, texts):
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        chunks = [order[start:start + self.chunk_size] for start in range(0, len(order), self.chunk_size)]
+
+        with self._lock:
+            # tasks are put from a thread, so results are collected while the bounded task queue is full
+            feeder = threading.Thread(target=self._feed, args=(chunks, texts), daemon=True)
+            feeder.start()
+            sentiments = [None] * len(texts)
+            errors = []
+            for _ in chunks:
+                task_id, chunk_sentiments, error = self._get()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                for index, sentiment in zip(chunks[task_id], chunk_sentiments):
+                    sentiments[index] = sentiment
+            feeder.join()
+
+        if errors:
+            raise InferenceError(f"{len(errors)} of {len(chunks)} chunks failed, first error: {errors[0]}")
+        return sentiments
+
+    def _feed(self, chunks, texts):
+        try:
+            for task_id, chunk in enumerate(chunks):
+                self._put((task_id, [texts[i] for i in chunk]))
+        except BrokenProcessPool:
+            pass
+
+    def close(self):
+        """
+        Stop the workers after their current task.
+        """
+        for process in self._processes:
+            if process.is_alive():
+                try:
+                    self._tasks.put(None, timeout=LIVENESS_INTERVAL)
+                except queue.Full:
+                    break
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        logger.info("Stopped the inference workers")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback_):
+        self.close()
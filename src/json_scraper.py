@@ -0,0 +1,205 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from src import config
+from src.extraction import CommentColumns, parse_post_href, subreddit_from_permalink
+from src.metrics import ScrapeStats
+
+logger = logging.getLogger(__name__)
+
+DELETED_MARKERS = ('[deleted]', '[removed]')
+
+
+class JsonSubredditScraper:
+    """
+    Scrapes subreddits through the `.json` endpoints of Reddit instead of a browser.
+
+    Provides the same `scrape_subreddit` interface as SubredditScraper and stores the same post and comment records.
+    All requests of a run share one HTTP session, so connections are reused, and up to `concurrency` posts are
+    fetched at the same time. Database writes happen on a single background thread to keep the event loop free.
+    """
+
+    def __init__(self, db_client, stats=None, base_url=config.JSON_BASE_URL, concurrency=config.JSON_CONCURRENCY,
+                 known_items=None, writer=None):
+        """
+        Initialize the JsonSubredditScraper.
+
+        :param db_client: MongoDBClient the records are written to, nothing is written if None.
+        :param stats: ScrapeStats to record the progress in.
+        :param base_url: The base URL of Reddit, can point to a local stand-in server.
+        :param concurrency: The maximum number of requests in flight.
+        :param known_items: KnownItems for incremental scraping, None to scrape everything.
+        :param writer: BatchWriter that writes the records in the background, None to write them directly.
+        """
+        self.db_client = db_client
+        self.stats = stats if stats is not None else ScrapeStats()
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.known_items = known_items
+        self.writer = writer
+
+    def scrape_subreddit(self, subreddit_id, max_posts=None):
+        """
+        Scrapes a subreddit and saves the data to the database.
+        :param subreddit_id: subreddit to scrape
+        :param max_posts: maximum number of posts to scrape
+        """
+        self.scrape_subreddits([subreddit_id], max_posts=max_posts)
+
+    def scrape_subreddits(self, subreddit_list, max_posts=None):
+        """
+        Scrapes several subreddits concurrently within one HTTP session.
+        :param subreddit_list: subreddits to scrape
+        :param max_posts: maximum number of posts to scrape per subreddit
+        :return: ScrapeStats of the run
+        """
+        asyncio.run(self._scrape_subreddits(subreddit_list, max_posts))
+        logger.info(f"JSON scraping throughput: {self.stats.summary()}")
+        return self.stats
+
+    async def _scrape_subreddits(self, subreddit_list, max_posts):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=config.JSON_REQUEST_TIMEOUT)
+        headers = {'User-Agent': config.JSON_USER_AGENT}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='json-db') as db_executor:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+                await asyncio.gather(*(self._scrape_subreddit(session, semaphore, db_executor, subreddit, max_posts)
+                                       for subreddit in subreddit_list))
+
+    async def _scrape_subreddit(self, session, semaphore, db_executor, subreddit_id, max_posts):
+        try:
+            posts = await self.fetch_listing(session, semaphore, subreddit_id, max_posts)
+        except Exception as e:
+            logger.error(f"Error while fetching listing of subreddit {subreddit_id}: {str(e)}")
+            return
+
+        logger.info(f"Found {len(posts)} posts in subreddit: {subreddit_id}")
+        if self.known_items is not None:
+            posts = [post for post in posts if not self.known_items.is_post_unchanged(post['id'],
+                                                                                      post.get('num_comments'))]
+
+        await asyncio.gather(*(self._process_post(session, semaphore, db_executor, post) for post in posts))
+        self.stats.record_subreddit()
+        logger.info(f"Post data extraction complete for subreddit: {subreddit_id}")
+
+    async def fetch_listing(self, session, semaphore, subreddit_id, max_posts=None):
+        """
+        Fetches the posts of a subreddit listing, following the pagination until max_posts are collected.
+        :return: list of post data dictionaries, NSFW posts excluded
+        """
+        posts = []
+        after = None
+        while max_posts is None or len(posts) < max_posts:
+            params = {'limit': 100, 'raw_json': 1}
+            if after:
+                params['after'] = after
+            listing = await self._get_json(session, semaphore, f"{self.base_url}/r/{subreddit_id}.json", params)
+
+            data = listing.get('data', {})
+            posts.extend(child['data'] for child in data.get('children', [])
+                         if child.get('kind') == 't3' and not child['data'].get('over_18'))
+            after = data.get('after')
+            if not after:
+                break
+
+        return posts[:max_posts] if max_posts else posts
+
+    async def _process_post(self, session, semaphore, db_executor, post):
+        href = f"{self.base_url}{post['permalink']}"
+        try:
+            thread = await self._get_json(session, semaphore, f"{href.rstrip('/')}.json",
+                                          {'limit': config.JSON_COMMENT_LIMIT, 'raw_json': 1})
+        except Exception as e:
+            logger.error(f"Error while fetching comments of post: {href}, {str(e)}. Continue with next.")
+            return
+
+        df_comments = self.comments_from_thread(thread, post['id'])
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(db_executor, self._store_post, post, href, df_comments)
+
+    def _store_post(self, post, href, df_comments):
+        """
+        Stores a post and its comments with the same records as SubredditScraper.process_post.
+        """
+        post_id, subreddit, title = parse_post_href(f"https://www.reddit.com{post['permalink']}")
+        document = {'post_id': post_id, 'author': post.get('author', ''), 'subreddit': subreddit, 'title': title,
+                    'permalink': href}
+        if post.get('num_comments') is not None:
+            document['comment_count'] = post['num_comments']
+
+        if self.db_client:
+            with self.db_client as db_client:
+                if self.known_items is not None:
+                    df_comments = self.known_items.filter_new_comments(df_comments, db_client)
+
+                sink = self.writer if self.writer is not None else db_client
+                sink.upsert_frame(config.COMMENTS_COLLECTION, df_comments, 'thing_id')
+                sink.upsert_data(config.POSTS_COLLECTION, {'post_id': post_id}, document)
+
+        if self.known_items is not None:
+            # only a stored post is skipped by the next incremental run
+            if self.writer is not None:
+                self.writer.when_written(lambda stored: stored and self.known_items.add_post(
+                    post_id, post.get('num_comments')))
+            else:
+                self.known_items.add_post(post_id, post.get('num_comments'))
+        self.stats.record_post(df_comments.height)
+
+    @staticmethod
+    def comments_from_thread(thread, post_id):
+        """
+        Builds the comments DataFrame from the JSON of a post thread.
+
+        Like the browser path only the first paragraph of a comment is used as text, deleted comments are skipped,
+        top-level comments have an empty parent id and duplicated texts are removed.
+
+        :param thread: The decoded JSON of the post thread, a list of the post listing and the comment listing.
+        :param post_id: post id
+        :return: DataFrame with comments data
+        """
+        columns = CommentColumns()
+        stack = list(reversed(thread[1]['data']['children'])) if len(thread) > 1 else []
+        while stack:
+            child = stack.pop()
+            if child.get('kind') != 't1':
+                continue
+            data = child['data']
+
+            replies = data.get('replies')
+            if isinstance(replies, dict):
+                stack.extend(reversed(replies['data']['children']))
+
+            body = (data.get('body') or '').strip()
+            if not body or body in DELETED_MARKERS or data.get('author') in DELETED_MARKERS:
+                continue
+
+            parent_id = data.get('parent_id') or ''
+            columns.append(post_id, body.split('\n\n')[0].strip(), subreddit_from_permalink(data.get('permalink')),
+                           data.get('author'), int(data.get('score') or 0), data.get('name'),
+                           parent_id if parent_id.startswith('t1_') else '')
+
+        return columns.to_frame().unique(subset=["text"], maintain_order=True)
+
+    @staticmethod
+    async def _get_json(session, semaphore, url, params):
+        """
+        GET a JSON document, backing off and retrying when rate limited.
+        """
+        for attempt in range(config.JSON_MAX_RETRIES + 1):
+            async with semaphore:
+                async with session.get(url, params=params) as response:
+                    if response.status != 429 and response.status < 500:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+                    retry_after = response.headers.get('Retry-After')
+
+            if attempt == config.JSON_MAX_RETRIES:
+                response.raise_for_status()
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            logger.warning(f"HTTP {response.status} for {url}, retrying in {delay}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,171 @@
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ScrapeStats:
+    """
+    Thread-safe counters for the posts and comments collected during a scraping run.
+
+    A single instance can be shared by several scraping workers to report aggregate throughput.
+    """
+
+    def __init__(self):
+        """
+        Initialize the counters and start the run clock.
+        """
+        self._lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.subreddits = 0
+        self.posts = 0
+        self.comments = 0
+        self.timings = PageTimings()
+
+    def record_subreddit(self):
+        """
+        Count a subreddit that has been scraped.
+        """
+        with self._lock:
+            self.subreddits += 1
+
+    def record_post(self, comment_count):
+        """
+        Count a stored post together with its comments.
+
+        :param comment_count: The number of comments stored for the post.
+        """
+        with self._lock:
+            self.posts += 1
+            self.comments += comment_count
+
+    def elapsed(self):
+        """
+        :return: Seconds since the counters were created.
+        """
+        return time.monotonic() - self.start_time
+
+    def rates(self):
+        """
+        :return: A tuple of (posts per minute, comments per minute) since the counters were created.
+        """
+        minutes = max(self.elapsed(), 1e-9) / 60
+        with self._lock:
+            return self.posts / minutes, self.comments / minutes
+
+    def summary(self):
+        """
+        :return: A human readable summary of the run.
+        """
+        posts_per_min, comments_per_min = self.rates()
+        return (f"{self.subreddits} subreddits, {self.posts} posts, {self.comments} comments "
+                f"in {self.elapsed():.1f}s ({posts_per_min:.1f} posts/min, {comments_per_min:.1f} comments/min)")
+
+
+class PageTimings:
+    """
+    Thread-safe collection of per-page timing samples, e.g. the time from navigation start until comments are available.
+
+    Used to compare browser profiles with each other.
+    """
+
+    def __init__(self):
+        """
+        Initialize the empty sample lists.
+        """
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, name, seconds):
+        """
+        Add a timing sample.
+
+        :param name: The name of the measured phase.
+        :param seconds: The measured duration in seconds.
+        """
+        if seconds is None:
+            return
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+
+    def samples(self, name):
+        """
+        :param name: The name of the measured phase.
+        :return: A copy of the samples recorded for the phase.
+        """
+        with self._lock:
+            return list(self._samples.get(name, []))
+
+    def summary(self):
+        """
+        :return: A human readable summary with count, mean, median and 90th percentile per phase.
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items() if values}
+
+        parts = []
+        for name, values in samples.items():
+            p90 = values[min(len(values) - 1, int(len(values) * 0.9))]
+            parts.append(f"{name}: n={len(values)} mean={statistics.fmean(values):.2f}s "
+                         f"median={statistics.median(values):.2f}s p90={p90:.2f}s")
+        return "; ".join(parts) if parts else "no page timings recorded"
+
+
+class StartupTimings:
+    """
+    Thread-safe record of the startup phases of a run, e.g. the import of the modules of a stage or the load of the
+    sentiment model, in the order they finished.
+
+    Reported by main.py with --timing.
+    """
+
+    def __init__(self):
+        """
+        Initialize the empty record.
+        """
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def record(self, name, seconds):
+        """
+        Add the duration of a phase. A phase that is recorded again, e.g. a stage run twice, adds up.
+
+        :param name: The name of the phase.
+        :param seconds: The measured duration in seconds.
+        """
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Context manager recording the duration of its body as a phase.
+
+        :param name: The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def phases(self):
+        """
+        :return: A copy of the recorded durations by phase.
+        """
+        with self._lock:
+            return dict(self._phases)
+
+    def summary(self):
+        """
+        :return: A human readable summary of the duration per phase and in total.
+        """
+        phases = self.phases()
+        if not phases:
+            return "no startup phases recorded"
+        return ", ".join(f"{name}: {seconds:.2f}s" for name, seconds in phases.items()) \
+            + f" (total {sum(phases.values()):.2f}s)"
+
+
+# startup phases of this process
+STARTUP_TIMINGS = StartupTimings()
@@ -0,0 +1,114 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lxml import html as lxml_html
+
+from src import config
+from src.archive import LISTING_PAGE, POST_PAGE, PageArchive, read_archived_page
+from src.extraction import AUTHOR_XPATH, COMMENT_TEXT_XPATH, COMMENT_XPATH, CommentColumns, \
+    parse_post_href, parse_score, subreddit_from_permalink
+from src.metrics import ScrapeStats
+
+logger = logging.getLogger(__name__)
+
+
+def parse_post_page(page_source, href):
+    """
+    Extracts the post and its comments from the source of a post page.
+
+    Produces the same records as SubredditScraper.process_post does for a live page.
+
+    :param page_source: The HTML source of the post page.
+    :param href: link to the post.
+    :return: A tuple of (post document, comments DataFrame).
+    """
+    post_id, subreddit, title = parse_post_href(href)
+    tree = lxml_html.fromstring(page_source)
+
+    author_elements = tree.xpath(AUTHOR_XPATH)
+    author = author_elements[0].text_content().strip() if author_elements else ''
+
+    comments = tree.xpath(COMMENT_XPATH)
+    columns = CommentColumns(capacity=len(comments))
+    for comment in comments:
+        text = _comment_text(comment)
+        if text is None:
+            continue
+        columns.append(post_id, text, subreddit_from_permalink(comment.get('permalink')), comment.get('author'),
+                       parse_score(comment.get('score')), comment.get('thingid'), comment.get('parentid') or "")
+
+    # Remove duplicated comments based on text, as the live scraper does
+    df_comments = columns.to_frame().unique(subset=["text"])
+
+    post = {'post_id': post_id, 'author': author, 'subreddit': subreddit, 'title': title, 'permalink': href}
+    return post, df_comments
+
+
+def _comment_text(comment):
+    """
+    Returns the text of the first paragraph that belongs to the comment itself and not to a nested reply.
+
+    :param comment: The shreddit-comment element.
+    :return: The text or None if the comment has no paragraph.
+    """
+    for paragraph in comment.xpath(COMMENT_TEXT_XPATH):
+        owner = paragraph.xpath("ancestor::shreddit-comment[1]")
+        if owner and owner[0] is comment:
+            return paragraph.text_content().strip()
+    return None
+
+
+def parse_archived_post(root, entry):
+    """
+    Parses an archived post page. Runs in a worker process.
+
+    :param root: The directory of the archive.
+    :param entry: The index entry of the post page.
+    :return: A tuple of (post document, comments DataFrame) or None if the page could not be parsed.
+    """
+    try:
+        return parse_post_page(read_archived_page(root, entry), entry['url'])
+    except Exception as e:
+        logger.error(f"Error while parsing archived post {entry.get('url')}: {str(e)}")
+        return None
+
+
+def parse_archive(root, db_client=None, processes=config.PARSER_PROCESSES, writer=None):
+    """
+    Parses all post pages of an archive in a process pool and stores the records in the database.
+
+    :param root: The directory of the archive.
+    :param db_client: MongoDBClient the records are written to, nothing is written if None.
+    :param processes: The number of parser processes, defaults to the number of cores.
+    :param writer: BatchWriter that writes the records in the background, None to write them with db_client.
+    :return: ScrapeStats with the number of parsed posts and comments.
+    """
+    archive = PageArchive(root)
+    stats = ScrapeStats()
+    entries = list(archive.entries(POST_PAGE))
+    listings = sum(1 for _ in archive.entries(LISTING_PAGE))
+    processes = processes or os.cpu_count() or 1
+    logger.info(f"Parsing {len(entries)} post pages of {listings} listings in {root} with {processes} processes")
+
+    chunksize = max(1, len(entries) // (processes * 4))
+    # polars' thread pool does not survive a fork, so the workers are spawned
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for result in executor.map(partial(parse_archived_post, root), entries, chunksize=chunksize):
+            if result is None:
+                continue
+
+            post, df_comments = result
+            if writer is not None:
+                writer.upsert_frame(config.COMMENTS_COLLECTION, df_comments, 'thing_id')
+                writer.upsert_data(config.POSTS_COLLECTION, {'post_id': post['post_id']}, post)
+            elif db_client:
+                with db_client:
+                    db_client.upsert_frame(config.COMMENTS_COLLECTION, df_comments, 'thing_id')
+                    db_client.upsert_data(config.POSTS_COLLECTION, {'post_id': post['post_id']}, post)
+            stats.record_post(df_comments.height)
+
+    logger.info(f"Archive parsed: {stats.summary()}")
+    return stats
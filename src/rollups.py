@@ -0,0 +1,174 @@
+import logging
+from collections import defaultdict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src import config
+from src.database import DUPLICATE_KEY_CODES, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Fields of the scored documents the rollups are grouped by and weighted with
+ROLLUP_FIELDS = ('subreddit', 'post_id', 'author', 'upvotes')
+
+POLARITIES = {'positive': 1, 'negative': -1}
+
+
+def rollup_keys(document):
+    """
+    :param document: A scored post or comment.
+    :return: A dict of the rollup key of the document per dimension, dimensions without a key are left out. The day
+        is the day the document was stored, taken from its ObjectId.
+    """
+    keys = {'subreddit': document.get('subreddit'), 'post': document.get('post_id'),
+            'author': document.get('author')}
+    if hasattr(document['_id'], 'generation_time'):
+        keys['day'] = document['_id'].generation_time.strftime('%Y-%m-%d')
+    return {dimension: key for dimension, key in keys.items() if key}
+
+
+def polarity(sentiment):
+    """
+    :param sentiment: A stored sentiment with label and score.
+    :return: The score signed by the label, positive for positive, negative for negative and 0 for neutral labels.
+    """
+    return POLARITIES.get(str(sentiment['label']).lower(), 0) * float(sentiment['score'])
+
+
+def rollup_stats(totals):
+    """
+    Derives the statistics of a rollup from its running totals.
+
+    :param totals: The totals of one source collection in a rollup document, e.g. rollup['comments'].
+    :return: A dict with the count, the count and share per label, the mean and variance of the score, the mean
+        polarity and the upvote-weighted mean polarity, which is None if no document has upvotes.
+    """
+    count = totals['count']
+    mean = totals['score_sum'] / count
+    return {
+        'count': count,
+        'labels': totals['labels'],
+        'label_shares': {label: n / count for label, n in totals['labels'].items()},
+        'score_mean': mean,
+        'score_variance': max(totals['score_sq_sum'] / count - mean ** 2, 0.0),
+        'polarity_mean': totals['polarity_sum'] / count,
+        'weighted_polarity_mean': totals['weighted_polarity_sum'] / totals['weight_sum']
+        if totals['weight_sum'] else None,
+    }
+
+
+class SentimentRollups:
+    """
+    Materialized sentiment rollups per subreddit, post, author and day, kept in one collection per dimension.
+
+    Every rollup document holds the running totals of one key of a dimension (e.g. one subreddit) for one version of
+    the sentiment pipeline, split by the collection the scored documents came from: the number of documents, the
+    count per label, the sums of the score and its square, the sum of the polarity and its upvote-weighted sum. The
+    totals are incremented with `$inc` as sentiments are written, so reports read the small rollup documents instead
+    of the scored collections. Mean and variance are derived with `rollup_stats`.
+    """
+
+    def __init__(self, collections=config.SENTIMENT_ROLLUP_COLLECTIONS):
+        """
+        Initialize the SentimentRollups.
+
+        :param collections: The name of the rollup collection per dimension.
+        """
+        self.collections = collections
+
+    @staticmethod
+    def increments(collection, scored):
+        """
+        Sums up the rollup increments of a batch of scored documents.
+
+        :param collection: The collection the documents came from.
+        :param scored: (document, sentiment) tuples.
+        :return: A dict of the `$inc` document per (dimension, key).
+        """
+        increments = defaultdict(lambda: defaultdict(int))
+        for document, sentiment in scored:
+            score = float(sentiment['score'])
+            weight = max(document.get('upvotes', 1) or 0, 0)
+            label = str(sentiment['label']).replace('.', '_').replace('$', '_')
+            for dimension, key in rollup_keys(document).items():
+                inc = increments[(dimension, key)]
+                inc[f'{collection}.count'] += 1
+                inc[f'{collection}.labels.{label}'] += 1
+                inc[f'{collection}.score_sum'] += score
+                inc[f'{collection}.score_sq_sum'] += score ** 2
+                inc[f'{collection}.polarity_sum'] += polarity(sentiment)
+                inc[f'{collection}.weight_sum'] += weight
+                inc[f'{collection}.weighted_polarity_sum'] += weight * polarity(sentiment)
+        return increments
+
+    def add(self, db_client, collection, scored, version):
+        """
+        Adds a batch of scored documents to the rollups with one unordered bulk write per dimension.
+
+        :param db_client: The connected MongoDBClient.
+        :param collection: The collection the documents came from.
+        :param scored: (document, sentiment) tuples, the documents need the fields of ROLLUP_FIELDS.
+        :param version: The version of the sentiment pipeline that scored the documents.
+        """
+        operations = defaultdict(list)
+        for (dimension, key), inc in self.increments(collection, scored).items():
+            operations[dimension].append(UpdateOne({'version': version, 'key': key}, {'$inc': dict(inc)},
+                                                   upsert=True))
+
+        for dimension, dimension_operations in operations.items():
+            self._bulk_write(db_client.db[self.collections[dimension]], dimension_operations)
+
+    @staticmethod
+    def _bulk_write(col, operations):
+        try:
+            col.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # concurrent upserts of a new key insert it only once, the losing increments are applied again
+            errors = e.details['writeErrors']
+            if any(error['code'] not in DUPLICATE_KEY_CODES for error in errors):
+                raise
+            col.bulk_write([operations[error['index']] for error in errors], ordered=False)
+
+    def read(self, db_client, dimension, version, keys=None):
+        """
+        :param db_client: The connected MongoDBClient.
+        :param dimension: 'subreddit', 'post', 'author' or 'day'.
+        :param version: The version of the sentiment pipeline.
+        :param keys: The keys to read, None for all keys of the dimension.
+        :return: A dict of the statistics per source collection per key, see rollup_stats.
+        """
+        query = {'version': version}
+        if keys is not None:
+            query['key'] = {'$in': list(keys)}
+        return {rollup['key']: {collection: rollup_stats(totals) for collection, totals in rollup.items()
+                                if isinstance(totals, dict) and 'count' in totals}
+                for rollup in db_client.db[self.collections[dimension]].find(query)}
+
+    def rebuild(self, db_client, features=config.SENTIMENT_FEATURES, batch_size=config.READ_BATCH_SIZE):
+        """
+        Recomputes all rollups from the stored sentiments, e.g. to include sentiments stored before the rollups
+        existed or to repair totals after a failed write.
+
+        :param db_client: The connected MongoDBClient.
+        :param features: (collection, field) tuples of the analyzed collections.
+        :param batch_size: The number of documents read and added per bulk write.
+        :return: The number of added documents.
+        """
+        for name in self.collections.values():
+            db_client.db[name].delete_many({})
+
+        added = 0
+        for collection, _ in features:
+            documents = db_client.iter_data(collection, {'sentiment.version': {'$exists': True}},
+                                            projection={'_id': 1, 'sentiment': 1, **dict.fromkeys(ROLLUP_FIELDS, 1)},
+                                            batch_size=batch_size)
+            for chunk in iter_chunks(documents, batch_size):
+                by_version = defaultdict(list)
+                for document in chunk:
+                    by_version[document['sentiment']['version']].append((document, document['sentiment']))
+                for version, scored in by_version.items():
+                    self.add(db_client, collection, scored, version)
+                added += len(chunk)
+            logger.info(f"Rolled up the sentiments of {collection}")
+        return added
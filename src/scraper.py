@@ -1,22 +1,71 @@
 import logging
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
 
-import polars as pl
 from selenium.common import NoSuchElementException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
 from src import config
-from src.utils import get_driver, handle_cookie_banner, scroll_to_bottom
+from src.archive import LISTING_PAGE, POST_PAGE
+from src.driver_manager import ManagedDriver
+from src.extraction import AUTHOR_XPATH, COMMENT_TEXT_XPATH, COMMENT_XPATH, LISTING_POST_XPATH, CommentColumns, \
+    extract_comments_bulk, extract_listing_comment_counts, parse_post_href, parse_score, subreddit_from_permalink
+from src.metrics import ScrapeStats
+from src.throttle import RateLimited, backoff_delay
+from src.utils import get_driver, handle_cookie_banner, is_rate_limited, scroll_until
 
 # Each import should be on separate line according to PEP8
 logger = logging.getLogger(__name__)
 
+# Milliseconds since navigation start, now and at the end of DOMContentLoaded
+PAGE_TIMING_SCRIPT = """
+const navigation = performance.getEntriesByType("navigation")[0];
+return [performance.now(), navigation ? navigation.domContentLoadedEventEnd : null];
+"""
+
 
 class SubredditScraper:
-    def __init__(self, driver_options, db_client):
+    def __init__(self, driver_options, db_client, stats=None, driver_manager=None, archive=None, known_items=None,
+                 scheduler=None, frontier=None, writer=None, stopped=None):
         self.driver_options = driver_options
         self.db_client = db_client
+        self.stats = stats if stats is not None else ScrapeStats()
+        self.driver_manager = driver_manager
+        # if an archive is given, pages are only captured and parsed offline later on
+        self.archive = archive
+        # if known items are given, unchanged posts are skipped and only new comments are written
+        self.known_items = known_items
+        # HostScheduler shared by all workers to pace page loads, None for no throttling
+        self.scheduler = scheduler
+        # if a frontier is given, discovered posts and their state are recorded so a crashed run can be resumed
+        self.frontier = frontier
+        # BatchWriter that writes the documents in the background, None to write them directly
+        self.writer = writer
+        # threading.Event that stops the scraper after the current post, e.g. on SIGTERM, None to never stop
+        self.stopped = stopped
+
+    @contextmanager
+    def _driver_session(self):
+        """
+        Provides a driver for scraping one subreddit.
+
+        Uses a warm session of the driver manager if one is configured, otherwise a fresh browser is started.
+        """
+        if self.driver_manager is not None:
+            with self.driver_manager.session() as driver:
+                yield driver
+        else:
+            with get_driver(self.driver_options) as driver:
+                yield driver
+
+    def _slot(self, url):
+        """
+        Provides a scheduler slot for loading the given URL, or a no-op if there is no scheduler.
+        """
+        return self.scheduler.slot(url) if self.scheduler is not None else nullcontext()
 
     def scrape_subreddit(self, subreddit_id, max_posts=None):
         """
@@ -24,93 +73,309 @@ class SubredditScraper:
         :param subreddit_id: subreddit to scrape
         :param max_posts: maximum number of posts to scrape
         """
+        if self.frontier is not None and self.frontier.is_finished(subreddit_id):
+            logger.info(f"Subreddit {subreddit_id} already finished in the frontier, skipping")
+            return
+
         try:
-            with get_driver(self.driver_options) as driver:
-                driver.get(self.get_subreddit_url(subreddit_id))
-                WebDriverWait(driver, 10).until(EC.url_matches(r"https://www.reddit.com/r/.*"))
+            with self._driver_session() as driver:
+                self.open_listing(driver, subreddit_id)
 
-                handle_cookie_banner(driver)
+                if self.frontier is not None and self.frontier.is_discovered(subreddit_id):
+                    posts = self.frontier.open_posts(subreddit_id)
+                    logger.info(f"Resuming subreddit {subreddit_id} with {len(posts)} open posts from the frontier")
+                    self.visit_posts(driver, subreddit_id, posts)
+                    self.stats.record_subreddit()
+                    return
 
-                logger.info(f"Scrolling {config.SCROLL_TIME} seconds...")
-                scroll_to_bottom(driver, config.SCROLL_TIME)
-                logger.info("Scrolling finished")
+                self.load_listing(driver, subreddit_id, max_posts)
 
                 logger.info("Extracting post data...")
                 self.extract_post_data(driver, subreddit_id, max_posts)
                 logger.info(f"Post data extraction complete for subreddit: {subreddit_id}")
+                self.stats.record_subreddit()
 
         except (TimeoutException, WebDriverException) as e:
             logger.error(f"WebDriver error during subreddit scraping: {str(e)}")
         except Exception as e:
             logger.error(f"Unknown error during subreddit scraping: {str(e)}")
 
-    def extract_post_data(self, driver, subreddit_id, max_posts=None):
+    def open_listing(self, driver, subreddit_id):
         """
-        Extracts post data from the subreddit page.
+        Loads the listing of a subreddit and accepts the cookies if the browser has not done so yet.
         :param driver: Selenium webdriver instance.
         :param subreddit_id: Subreddit ID.
-        :param max_posts: maximum number of posts to extract.
         """
-        try:
-            post_elements = driver.find_elements(By.XPATH,
-                                                 "//div[@data-testid='post-container' and not(descendant::span[contains(text(), 'nsfw')])]//a[@data-click-id='body']")
+        subreddit_url = self.get_subreddit_url(subreddit_id)
+        with self._slot(subreddit_url):
+            driver.get(subreddit_url)
+            WebDriverWait(driver, 10).until(EC.url_matches(r"https://www.reddit.com/r/.*"))
+
+        if isinstance(driver, ManagedDriver):
+            self.driver_manager.restore_cookies(driver)
+            if not driver.cookies_accepted:
+                handle_cookie_banner(driver)
+                driver.cookies_accepted = True
+        else:
+            handle_cookie_banner(driver)
+
+    def load_listing(self, driver, subreddit_id, max_posts=None):
+        """
+        Scrolls the opened listing until enough posts are loaded and archives it in archive mode.
+        :param driver: Selenium webdriver instance.
+        :param subreddit_id: Subreddit ID.
+        :param max_posts: maximum number of posts to load.
+        """
+        logger.info(f"Scrolling up to {config.SCROLL_TIME} seconds...")
+        post_count = scroll_until(driver, LISTING_POST_XPATH, target_count=max_posts,
+                                  max_time=config.SCROLL_TIME, settle_time=config.SCROLL_SETTLE_TIME,
+                                  poll_interval=config.SCROLL_POLL_INTERVAL)
+        logger.info(f"Scrolling finished with {post_count} posts loaded")
+
+        if self.archive is not None:
+            self.archive.add_page(LISTING_PAGE, driver.current_url, subreddit_id, driver.page_source)
+
+    def find_posts(self, driver, max_posts=None):
+        """
+        Finds the posts to visit on the loaded listing.
+        :param driver: Selenium webdriver instance.
+        :param max_posts: maximum number of posts to return.
+        :return: (href, comment count) tuples in listing order, the comment count is None if not extracted.
+        """
+        post_elements = driver.find_elements(By.XPATH, LISTING_POST_XPATH)
 
-            post_hrefs = [element.get_attribute('href') for element in post_elements]
+        post_hrefs = [element.get_attribute('href') for element in post_elements]
 
-            logger.info(f"Found {len(post_hrefs)} posts")
+        logger.info(f"Found {len(post_hrefs)} posts")
 
-            if max_posts:
-                logger.info(f"Limiting posts to {max_posts}")
-                post_hrefs = post_hrefs[:max_posts]
+        if max_posts:
+            logger.info(f"Limiting posts to {max_posts}")
+            post_hrefs = post_hrefs[:max_posts]
 
-            for i, href in enumerate(post_hrefs):
-                self.process_post(driver, href)
-                if (i + 1) % 10 == 0:
-                    logger.info(f"subreddit: {subreddit_id}; processed {i + 1}/{len(post_hrefs)} posts")
+        comment_counts = {}
+        if self.known_items is not None:
+            comment_counts = self.extract_comment_counts(driver)
+            post_hrefs = [href for href in post_hrefs if not self.known_items.is_post_unchanged(
+                parse_post_href(href)[0], comment_counts.get(href))]
+            logger.info(f"{len(post_hrefs)} new or changed posts to visit")
+
+        return [(href, comment_counts.get(href)) for href in post_hrefs]
+
+    def discover_posts(self, subreddit_id, max_posts=None):
+        """
+        Loads the listing of a subreddit and returns its posts without visiting them, e.g. to distribute the posts
+        over several workers. Errors are raised to the caller.
+        :param subreddit_id: Subreddit ID.
+        :param max_posts: maximum number of posts to return.
+        :return: (href, comment count) tuples in listing order, the comment count can be None.
+        """
+        with self._driver_session() as driver:
+            self.open_listing(driver, subreddit_id)
+            self.load_listing(driver, subreddit_id, max_posts)
+            posts = self.find_posts(driver, max_posts)
+        self.stats.record_subreddit()
+        return posts
+
+    def scrape_post(self, href, comment_count=None):
+        """
+        Visits a single post in its own driver session, e.g. a post handed out by a work queue.
+        :param href: link to the post.
+        :param comment_count: comment count shown on the listing.
+        :return: False if the post could not be processed.
+        """
+        with self._driver_session() as driver:
+            if not isinstance(driver, ManagedDriver) or not driver.cookies_accepted:
+                # the cookie banner is handled on the listing, so a fresh browser opens it once
+                self.open_listing(driver, parse_post_href(href)[1])
+
+            if self.archive is not None:
+                with self._slot(href):
+                    return self.archive_post(driver, href)
+            success = self.process_post_with_retry(driver, href, comment_count=comment_count)
+
+        # the lease of a work queue item is completed only once the documents of the post are stored
+        if success and self.writer is not None and not self.writer.confirm():
+            logger.error(f"The documents of the post could not be stored: {href}")
+            return False
+        return success
+
+    def extract_post_data(self, driver, subreddit_id, max_posts=None):
+        """
+        Extracts post data from the subreddit page.
+        :param driver: Selenium webdriver instance.
+        :param subreddit_id: Subreddit ID.
+        :param max_posts: maximum number of posts to extract.
+        """
+        try:
+            posts = self.find_posts(driver, max_posts)
+            if self.frontier is not None:
+                self.frontier.add_posts(subreddit_id, posts)
+            self.visit_posts(driver, subreddit_id, posts)
 
         except (TimeoutException, NoSuchElementException) as e:
             logger.error(f"NoSuchElementException during post data extraction: {str(e)}")
         except Exception as e:
             logger.error(f"Unknown error during post data extraction: {str(e)}")
 
-    def process_post(self, driver, href):
+    def visit_posts(self, driver, subreddit_id, posts):
+        """
+        Visits the given posts one after the other and records the outcome in the frontier.
+        :param driver: Selenium webdriver instance.
+        :param subreddit_id: Subreddit ID.
+        :param posts: (href, comment count) tuples, the comment count can be None.
+        """
+        for i, (href, comment_count) in enumerate(posts):
+            if self.stopped is not None and self.stopped.is_set():
+                logger.info(f"Scraper stopped, {len(posts) - i} posts of subreddit {subreddit_id} left open")
+                return
+
+            if self.archive is not None:
+                with self._slot(href):
+                    success = self.archive_post(driver, href)
+            else:
+                success = self.process_post_with_retry(driver, href, comment_count=comment_count)
+
+            if self.frontier is not None:
+                if success is not False:
+                    self.when_written(partial(self.record_visit, href))
+                else:
+                    self.frontier.mark_failed(href)
+
+            if (i + 1) % 10 == 0:
+                logger.info(f"subreddit: {subreddit_id}; processed {i + 1}/{len(posts)} posts")
+
+    def when_written(self, callback):
+        """
+        Calls `callback(stored)` once the documents queued by this thread so far are written, right away when the
+        documents are written directly.
+        :param callback: function called with True if the documents were stored.
+        """
+        if self.writer is not None:
+            self.writer.when_written(callback)
+        else:
+            callback(True)
+
+    def record_visit(self, href, stored):
+        """
+        Records a visited post in the frontier once its documents are written. A post whose documents could not be
+        stored is visited again.
+        :param href: link to the post.
+        :param stored: True if the documents of the post were stored.
+        """
+        if stored:
+            self.frontier.mark_done(href)
+        else:
+            logger.error(f"The documents of the post could not be stored: {href}")
+            self.frontier.mark_failed(href)
+
+    def process_post_with_retry(self, driver, href, comment_count=None):
+        """
+        Processes a single post inside a scheduler slot and retries failures with jittered exponential backoff.
+        :param driver: Selenium webdriver instance.
+        :param href: link to the post.
+        :param comment_count: comment count shown on the listing.
+        :return: True if the post was processed.
+        """
+        for attempt in range(config.POST_RETRIES + 1):
+            try:
+                with self._slot(href):
+                    if self.process_post(driver, href, comment_count=comment_count) is not False:
+                        return True
+            except (RateLimited, WebDriverException) as e:
+                logger.warning(f"Attempt {attempt + 1} failed for post: {href}, {type(e).__name__}: {str(e)}")
+
+            if attempt < config.POST_RETRIES:
+                delay = backoff_delay(attempt)
+                logger.info(f"Retrying post in {delay:.1f}s: {href}")
+                time.sleep(delay)
+
+        logger.error(f"Giving up on post after {config.POST_RETRIES + 1} attempts: {href}")
+        return False
+
+    def process_post(self, driver, href, comment_count=None):
         """
         Processes a single post by extracting the post data and the comments data.
         :param driver: Selenium webdriver instance.
         :param href: link to the post.
+        :param comment_count: comment count shown on the listing, stored to detect changes on the next run.
+        :return: False if the post could not be loaded because of an unknown error.
+        :raises RateLimited: if Reddit answered with a rate limit page instead of the post.
+        :raises WebDriverException: if the page load failed or timed out, so the scheduler slot shrinks the concurrency
+            limit of the host before the post is retried.
         """
+        start = time.monotonic()
         try:
             driver.get(href)
-        except (TimeoutException, WebDriverException) as e:
-            logger.error(f"WebDriver error while getting href: {href}, {str(e)}. Continue with next.")
+        except WebDriverException as e:
+            logger.error(f"WebDriver error while getting href: {href}, {str(e)}")
             driver.refresh()
-            return
+            raise
         except Exception as e:
             logger.error(f"Unknown error while getting href: {href}, {str(e)}. Continue with next.")
             driver.refresh()
-            return
+            return False
 
-        split_url = href.split('/')
-        post_id = split_url[6]
-        subreddit = split_url[4]
-        title = split_url[7]
+        post_id, subreddit, title = parse_post_href(href)
 
         WebDriverWait(driver, 10).until(EC.url_contains(subreddit))
 
         author = self.extract_author(driver)
 
         df_comments = self.extract_comments_data(driver, post_id)
+        self.stats.timings.record('post_total', time.monotonic() - start)
+
+        if df_comments is None and is_rate_limited(driver):
+            raise RateLimited(href)
 
         if self.db_client and df_comments is not None:
+            post = {'post_id': post_id, 'author': author, 'subreddit': subreddit, 'title': title, 'permalink': href}
+            if comment_count is not None:
+                post['comment_count'] = comment_count
+
             with self.db_client as db_client:
-                db_client.insert_many_data(config.COMMENTS_COLLECTION, df_comments.to_dicts())
+                if self.known_items is not None:
+                    df_comments = self.known_items.filter_new_comments(df_comments, db_client)
+
+                # upserts keyed on the Reddit ids, so a post that is scraped again does not add duplicates
+                sink = self.writer if self.writer is not None else db_client
+                sink.upsert_frame(config.COMMENTS_COLLECTION, df_comments, 'thing_id')
                 logger.debug(f"Comments saved for post: {post_id}")
 
-                db_client.insert_many_data(config.POSTS_COLLECTION, pl.DataFrame([
-                    {'post_id': post_id, 'author': author, 'subreddit': subreddit, 'title': title,
-                     'permalink': href}]).to_dicts())
+                sink.upsert_data(config.POSTS_COLLECTION, {'post_id': post_id}, post)
                 logger.debug(f"Post saved for subreddit: {subreddit}")
 
+            if self.known_items is not None:
+                # only a stored post is skipped by the next incremental run
+                self.when_written(lambda stored: stored and self.known_items.add_post(post_id, comment_count))
+            self.stats.record_post(len(df_comments))
+
+    def archive_post(self, driver, href):
+        """
+        Captures the source of a post page into the archive without extracting any data.
+        :param driver: Selenium webdriver instance.
+        :param href: link to the post.
+        :return: False if the post could not be loaded.
+        """
+        try:
+            driver.get(href)
+        except Exception as e:
+            logger.error(f"Error while getting href: {href}, {str(e)}. Continue with next.")
+            driver.refresh()
+            return False
+
+        post_id, subreddit, _ = parse_post_href(href)
+
+        try:
+            WebDriverWait(driver, 10).until(EC.url_contains(subreddit))
+            self.scroll_comments(driver)
+            WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, COMMENT_XPATH)))
+        except TimeoutException:
+            logger.warning(f"Comments not found for post: {post_id}. Archiving page anyway.")
+
+        self.archive.add_page(POST_PAGE, href, subreddit, driver.page_source, post_id=post_id)
+        self.stats.record_post(0)
+        return True
+
     def extract_comments_data(self, driver, post_id):
         """
         Extract comments data from post
@@ -119,11 +384,10 @@ class SubredditScraper:
         :return: comments data or None if not found
         """
         try:
-            scroll_to_bottom(driver, 1)  # Scroll to bottom to load more comments per post
+            WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, COMMENT_XPATH)))
+            self.record_page_timing(driver)
 
-            comments = WebDriverWait(driver, 5).until(
-                EC.presence_of_all_elements_located(
-                    (By.XPATH, "//shreddit-comment[not(@is-comment-deleted) and not(@is-author-deleted)]")))
+            self.scroll_comments(driver)
         except (TimeoutException, NoSuchElementException) as e:
             logger.error(f"WebDriver error while getting comments: {str(e)}")
             logger.warning(f"Comments not found for post: {post_id}. Continue with next.")
@@ -134,12 +398,58 @@ class SubredditScraper:
             logger.warning(f"Error for post: {post_id}. Continue with next.")
             return None
 
-        comments_data = self.process_comments(comments, post_id)
+        comments_data = None
+        if config.BULK_COMMENT_EXTRACTION:
+            try:
+                comments_data = extract_comments_bulk(driver, post_id)
+            except Exception as e:
+                logger.warning(f"Bulk comment extraction failed for post: {post_id}, falling back: {str(e)}")
+
+        if comments_data is None:
+            comments = driver.find_elements(By.XPATH, COMMENT_XPATH)
+            comments_data = self.process_comments(comments, post_id)
 
         # Remove duplicated comments based on text
         comments_data = comments_data.unique(subset=["text"])
         return comments_data
 
+    def record_page_timing(self, driver):
+        """
+        Record the time from navigation start until DOM content loaded and until comments are available
+        :param driver: Driver with a post page whose comments just became available
+        """
+        try:
+            comments_available, dom_content_loaded = driver.execute_script(PAGE_TIMING_SCRIPT)
+        except Exception as e:
+            logger.debug(f"Could not capture page timing: {str(e)}")
+            return
+
+        self.stats.timings.record('comments_available', comments_available / 1000)
+        if dom_content_loaded:
+            self.stats.timings.record('dom_content_loaded', dom_content_loaded / 1000)
+
+    @staticmethod
+    def extract_comment_counts(driver):
+        """
+        Extract the comment counts of all posts on the listing
+        :param driver: Driver
+        :return: dictionary mapping post links to comment counts, empty if the counts cannot be extracted
+        """
+        try:
+            return extract_listing_comment_counts(driver)
+        except Exception as e:
+            logger.warning(f"Could not extract comment counts from listing: {str(e)}")
+            return {}
+
+    @staticmethod
+    def scroll_comments(driver):
+        """
+        Scroll to the bottom of a post page until no more comments are loaded
+        :param driver: Driver
+        """
+        scroll_until(driver, COMMENT_XPATH, max_time=config.COMMENT_SCROLL_TIME,
+                     settle_time=config.SCROLL_SETTLE_TIME, poll_interval=config.SCROLL_POLL_INTERVAL)
+
     @staticmethod
     def extract_author(driver):
         """
@@ -148,9 +458,8 @@ class SubredditScraper:
         :return: author or empty string if not found
         """
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//a[contains(@class, 'author-name')]")))
-            return driver.find_element(By.XPATH, "//a[contains(@class, 'author-name')]").text
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, AUTHOR_XPATH)))
+            return driver.find_element(By.XPATH, AUTHOR_XPATH).text
         except (TimeoutException, NoSuchElementException) as e:
             logger.error(f"NoSuchElementException while getting author: {str(e)}")
             return ''
@@ -166,21 +475,20 @@ class SubredditScraper:
         :param post_id: post id (relevant for logging)
         :return: DataFrame with comments data
         """
-        df_comments = pl.DataFrame(
-            schema={'post_id': pl.Utf8, 'text': pl.Utf8, 'subreddit': pl.Utf8, 'author': pl.Utf8, 'upvotes': pl.Int64,
-                    'thing_id': pl.Utf8, 'parent_id': pl.Utf8})
+        columns = CommentColumns(capacity=len(comments))
 
         for i, comment in enumerate(comments):
             try:
-                WebDriverWait(comment, 5).until(
-                    EC.presence_of_element_located((By.XPATH, ".//div[@id='-post-rtjson-content']/p")))
-                text = comment.find_element(By.XPATH, ".//div[@id='-post-rtjson-content']/p").text
+                WebDriverWait(comment, 5).until(EC.presence_of_element_located((By.XPATH, COMMENT_TEXT_XPATH)))
+                text = comment.find_element(By.XPATH, COMMENT_TEXT_XPATH).text
 
                 if text is None:
                     logger.warning(f"Skipping comment {i + 1} of {len(comments)} as it has no text, post: {post_id}")
                     continue
 
-                df_comments = pl.concat([df_comments, SubredditScraper.extract_comment_data(comment, post_id, text)])
+                record = SubredditScraper.extract_comment_data(comment, post_id, text)
+                if record is not None:
+                    columns.append(**record)
 
             except NoSuchElementException as e:
                 logger.error(f"NoSuchElementException while processing comment: {str(e)}")
@@ -190,7 +498,7 @@ class SubredditScraper:
                 logger.warning(f"Skipping comment {i + 1} of {len(comments)}, post: {post_id}")
                 continue
 
-        return df_comments
+        return columns.to_frame()
 
     @staticmethod
     def extract_comment_data(comment, post_id, text):
@@ -199,20 +507,20 @@ class SubredditScraper:
         :param comment: Comment element
         :param post_id: post id
         :param text: text of the comment
-        :return: DataFrame with comment data
+        :return: dictionary with the comment data or None on error
         """
         try:
             author = comment.get_attribute("author")
             thing_id = comment.get_attribute("thingid")
-            parent_id = comment.get_attribute("parentid") if comment.get_attribute("parentid") else ""
-            up_votes = int(comment.get_attribute("score")) if comment.get_attribute("score") else 0
-            subreddit = comment.get_attribute("permalink").split("/")[2]
+            parent_id = comment.get_attribute("parentid") or ""
+            up_votes = parse_score(comment.get_attribute("score"))
+            subreddit = subreddit_from_permalink(comment.get_attribute("permalink"))
 
-            return pl.DataFrame([{'post_id': post_id, 'text': text, 'subreddit': subreddit, 'author': author,
-                                  'upvotes': up_votes, 'thing_id': thing_id, 'parent_id': parent_id}])
+            return {'post_id': post_id, 'text': text, 'subreddit': subreddit, 'author': author,
+                    'upvotes': up_votes, 'thing_id': thing_id, 'parent_id': parent_id}
         except Exception as e:
             logger.error(f"Error while extracting comment data: {str(e)}")
-            return pl.DataFrame()
+            return None
 
     @staticmethod
     def get_subreddit_url(subreddit_id):
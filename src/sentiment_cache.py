@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+
+from src import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sentiments (
+    key BLOB PRIMARY KEY,
+    label TEXT NOT NULL,
+    score REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# keys per SELECT, below SQLite's limit of host parameters
+QUERY_CHUNK_SIZE = 500
+
+
+def cache_key(text, version):
+    """
+    :param text: The preprocessed text.
+    :param version: The version of the sentiment pipeline.
+    :return: The content address of the sentiment of the text, a SHA-256 digest of the version and the text.
+    """
+    return hashlib.sha256(f"{version}\0{text}".encode('utf-8')).digest()
+
+
+class SentimentCache:
+    """
+    A content-addressed cache of sentiments, keyed by the hash of the preprocessed text and the pipeline version.
+
+    Lookups go to an in-process LRU first and then to a SQLite file, so repeated texts like "This" or bot boilerplate
+    are scored once and reused by later runs and by other processes on the same machine. Instances are thread-safe.
+    The hit counters cover both layers.
+    """
+
+    def __init__(self, path=config.SENTIMENT_CACHE_FILE, max_entries=config.SENTIMENT_CACHE_SIZE):
+        """
+        Initialize the SentimentCache.
+
+        :param path: The SQLite file of the persistent layer, created if it does not exist. None keeps the cache in
+            memory only.
+        :param max_entries: The maximum number of sentiments in the in-process LRU.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def _remember(self, key, sentiment):
+        self._entries[key] = sentiment
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Look up sentiments, first in memory, then on disk. Sentiments found on disk are kept in memory.
+
+        Every key that is not found counts as one miss, the caller scores its text once. Repeated keys are counted as
+        memory hits, since their texts are not scored again.
+
+        :param keys: Cache keys, see cache_key, one per text.
+        :return: A dict of the found sentiments by key.
+        """
+        occurrences = Counter(keys)
+        found = {}
+        with self._lock:
+            for key, count in occurrences.items():
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.memory_hits += count
+
+            missing = [key for key in occurrences if key not in found]
+            if self._connection is not None:
+                for start in range(0, len(missing), QUERY_CHUNK_SIZE):
+                    chunk = missing[start:start + QUERY_CHUNK_SIZE]
+                    rows = self._connection.execute(
+                        f"SELECT key, label, score FROM sentiments WHERE key IN ({', '.join('?' * len(chunk))})",
+                        chunk).fetchall()
+                    for key, label, score in rows:
+                        found[key] = {'label': label, 'score': score}
+                        self._remember(key, found[key])
+                        self.disk_hits += occurrences[key]
+
+            for key in missing:
+                if key not in found:
+                    self.misses += 1
+                    self.memory_hits += occurrences[key] - 1
+        return found
+
+    def put_many(self, sentiments):
+        """
+        Store sentiments in both layers.
+
+        :param sentiments: A dict of sentiments with label and score by key.
+        """
+        with self._lock:
+            for key, sentiment in sentiments.items():
+                self._remember(key, sentiment)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO sentiments (key, label, score) VALUES (?, ?, ?)",
+                        [(key, sentiment['label'], sentiment['score']) for key, sentiment in sentiments.items()])
+
+    @property
+    def hit_rate(self):
+        """
+        :return: The share of texts that were not scored by the model, None before the first lookup.
+        """
+        hits = self.memory_hits + self.disk_hits
+        return hits / (hits + self.misses) if hits + self.misses else None
+
+    def summary(self):
+        """
+        :return: A human readable summary of the hit rate.
+        """
+        if self.hit_rate is None:
+            return "no lookups"
+        return f"{self.hit_rate:.1%} hits ({self.memory_hits} in memory, {self.disk_hits} on disk, " \
+               f"{self.misses} misses)"
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,42 +1,229 @@
 import logging
+import time
+from concurrent.futures.process import BrokenProcessPool
 
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+from src.config import SENTIMENT_WRITE_BATCH_SIZE, SENTIMENT_WRITE_RETRIES, SENTIMENT_RAW_BSON, SENTIMENT_ROLLUPS, \
+    SENTIMENT_WORKERS
+from src.database import iter_chunks, unscored_query
+from src.inference_pool import InferencePool
+from src.rollups import ROLLUP_FIELDS, SentimentRollups
 from src.sentiment_pipeline import SentimentPipeline
+from src.throttle import backoff_delay
 
 logger = logging.getLogger(__name__)
 
 
+def is_transient_error(error):
+    """
+    Checks if a database error is worth retrying, e.g. a lost connection or a primary election.
+
+    :param error: The PyMongoError.
+    :return: True if the failed operation can be retried.
+    """
+    return isinstance(error, ConnectionFailure) or error.has_error_label('RetryableWriteError') \
+        or error.has_error_label('TransientTransactionError')
+
+
 class SentimentController:
     """
     A class that provides methods to control the sentiment analysis on documents in the MongoDB database.
     """
 
-    def __init__(self, db_client):
+    def __init__(self, db_client, batch_size=SENTIMENT_WRITE_BATCH_SIZE, max_retries=SENTIMENT_WRITE_RETRIES,
+                 raw_bson=SENTIMENT_RAW_BSON, rollups=SENTIMENT_ROLLUPS, workers=SENTIMENT_WORKERS):
         """
         Initialize the SentimentController.
+
+        :param db_client: The MongoDBClient the documents are read from and written to.
+        :param batch_size: The number of documents read, analyzed and written back per chunk.
+        :param max_retries: The number of retries of a bulk write that failed with a transient error.
+        :param raw_bson: Read the documents as raw BSON that only decodes the accessed fields.
+        :param rollups: Add the written sentiments to the rollups per subreddit, post, author and day.
+        :param workers: The number of inference worker processes, 0 to score in this process.
         """
         self.db_client = db_client
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.raw_bson = raw_bson
         self.sentiment_pipeline = SentimentPipeline()
+        self.rollups = SentimentRollups() if rollups else None
+        self.inference_pool = InferencePool(self.sentiment_pipeline, workers=workers) if workers > 0 else None
+        self.counts = {}
 
     def write_sentiments_to_documents(self, collection, field_to_analyze):
         """
-        Writes the sentiment score and label to the documents in the specified collection.
+        Writes the sentiment score and label to the documents in the specified collection that have no sentiment yet
+        or were scored by another version of the sentiment pipeline. Every sentiment records the model, its revision
+        and the preprocessing version, so routine runs only score new documents and a model change scores all
+        documents again.
+
+        The documents are streamed from a cursor with only the _id and the analyzed field and processed in chunks of
+        `batch_size`, so memory stays flat and the first sentiments are written after the first chunk.
 
         :param collection: The name of the collection to write the sentiment to.
         :param field_to_analyze: The name of the field in the collection to analyze.
+        :return: The number of updated documents.
+        """
+        version = self.sentiment_pipeline.version
+        analyzed = 0
+        updated = 0
+        with self.db_client as db_client:
+            skipped = db_client.db[collection].count_documents({'sentiment.version': version})
+            documents = db_client.iter_data(collection, unscored_query(version),
+                                            projection=self.projection(field_to_analyze),
+                                            batch_size=self.batch_size, raw=self.raw_bson)
+            for chunk in iter_chunks(documents, self.batch_size):
+                updated += self.score_documents(db_client, collection, field_to_analyze, chunk)
+                analyzed += len(chunk)
+
+        self.counts[collection] = {'scored': updated, 'failed': analyzed - updated, 'skipped': skipped}
+        logger.info(f"Scored {updated} of {analyzed} documents in {collection} with {version}, "
+                    f"skipped {skipped} documents already scored with this version")
+        return updated
+
+    def projection(self, field_to_analyze):
+        """
+        :param field_to_analyze: The name of the analyzed field.
+        :return: The projection of the documents to score, the _id, the analyzed field and the fields of the rollups.
+        """
+        projection = {'_id': 1, field_to_analyze: 1}
+        if self.rollups is not None:
+            projection.update(dict.fromkeys(ROLLUP_FIELDS, 1))
+        return projection
+
+    def close(self):
         """
-        from concurrent.futures import ThreadPoolExecutor
+        Stop the inference workers and close the sentiment cache.
+        """
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+        if self.sentiment_pipeline.cache is not None:
+            self.sentiment_pipeline.cache.close()
 
-        def process_document(document):
-            sentiment = self.sentiment_pipeline.get_tokenized_sentiment(data=document[field_to_analyze],
-                                                                        collection=collection)
-            # update current document with sentiment
-            db_client.update_data_by_id(collection, document['_id'], {'sentiment': sentiment})
+    def analyze(self, collection, field_to_analyze, documents):
+        """
+        Analyzes the documents with one call of the batch API of the inference pool, or of the pipeline without
+        workers. Documents without a text in the analyzed field are logged and left out before batching. If a batch
+        fails, it is split in halves that are analyzed again, so only the failing documents are logged and left out.
 
-            logger.info(
-                f'Updated {document["_id"]} with Sentiment Score {sentiment["score"]} and Sentiment Label {sentiment["label"]}.'
-            )
+        :param collection: The name of the collection of the documents.
+        :param field_to_analyze: The name of the analyzed field.
+        :param documents: Documents with the analyzed field.
+        :return: (document, sentiment) tuples of the analyzed documents.
+        :raises BrokenProcessPool: if an inference worker died.
+        """
+        valid = []
+        for document in documents:
+            if isinstance(document.get(field_to_analyze), str):
+                valid.append(document)
+            else:
+                logger.error(f"Sentiment analysis skipped {document['_id']}: {field_to_analyze} is not a text")
+        return self.analyze_batch(collection, field_to_analyze, valid) if valid else []
 
-        with self.db_client as db_client:
-            documents = list(db_client.db[collection].find())
-            with ThreadPoolExecutor() as executor:
-                executor.map(process_document, documents)
+    def analyze_batch(self, collection, field_to_analyze, documents):
+        """
+        Analyzes a batch of documents and bisects it on failure until the failing documents are found.
+
+        :param collection: The name of the collection of the documents.
+        :param field_to_analyze: The name of the analyzed field.
+        :param documents: Documents with a text in the analyzed field.
+        :return: (document, sentiment) tuples of the analyzed documents.
+        :raises BrokenProcessPool: if an inference worker died.
+        """
+        analyzer = self.inference_pool or self.sentiment_pipeline
+        try:
+            sentiments = analyzer.get_sentiments([document[field_to_analyze] for document in documents],
+                                                 collection=collection)
+            return list(zip(documents, sentiments))
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            if len(documents) == 1:
+                logger.error(f"Sentiment analysis failed for {documents[0]['_id']}: {str(e)}")
+                return []
+            logger.warning(f"Sentiment analysis of {len(documents)} documents failed: {str(e)}. "
+                           f"Analyzing both halves separately")
+
+        middle = len(documents) // 2
+        return self.analyze_batch(collection, field_to_analyze, documents[:middle]) + \
+            self.analyze_batch(collection, field_to_analyze, documents[middle:])
+
+    def score_documents(self, db_client, collection, field_to_analyze, documents):
+        """
+        Analyzes a batch of documents and writes their sentiments back with one bulk write. The written sentiments are
+        added to the rollups.
+
+        A document is only updated if it has no sentiment of this version yet, so a document scored at the same time by
+        another run, e.g. the daemon and a batch run, is written and rolled up once. Every sentiment of the batch
+        records the `write_id` of the batch. If fewer documents were modified than scored, the documents of the batch
+        are looked up by it, so only the documents this batch wrote are added to the rollups.
+
+        :param db_client: The connected MongoDBClient to write with.
+        :param collection: The name of the collection of the documents.
+        :param field_to_analyze: The name of the analyzed field.
+        :param documents: Documents with the fields of `projection`.
+        :return: The number of updated documents.
+        """
+        version_info = self.sentiment_pipeline.version_info
+        write_id = ObjectId()
+        scored = [(document, {**sentiment, **version_info, 'write_id': write_id})
+                  for document, sentiment in self.analyze(collection, field_to_analyze, documents)]
+        if not scored:
+            return 0
+
+        version = version_info['version']
+        modified = self.write_batch(db_client, collection, [
+            UpdateOne({'_id': document['_id'], 'sentiment.version': {'$ne': version}},
+                      {'$set': {'sentiment': sentiment}}) for document, sentiment in scored])
+        if modified < len(scored):
+            # scored concurrently by another run, or written by an attempt of write_batch that seemed to fail
+            written = {document['_id'] for document in db_client.db[collection].find(
+                {'_id': {'$in': [document['_id'] for document, _ in scored]}, 'sentiment.write_id': write_id},
+                {'_id': 1})}
+            scored = [(document, sentiment) for document, sentiment in scored if document['_id'] in written]
+
+        if self.rollups is not None and scored:
+            self.rollups.add(db_client, collection, scored, version)
+        return len(scored)
+
+    def write_batch(self, db_client, collection, operations):
+        """
+        Writes a batch of sentiment updates with one unordered bulk write, retrying transient errors with backoff.
+        The updates only set fields by _id, so a partially applied batch can be sent again.
+
+        :param db_client: The MongoDBClient to write with.
+        :param collection: The name of the collection to write to.
+        :param operations: UpdateOne operations.
+        :return: The number of modified documents of the successful attempt.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = db_client.db[collection].bulk_write(operations, ordered=False)
+                logger.info(f"Wrote {len(operations)} sentiments to {collection}")
+                return result.modified_count
+            except PyMongoError as e:
+                if attempt == self.max_retries or not is_transient_error(e):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Bulk write of {len(operations)} sentiments to {collection} failed: {str(e)}. "
+                               f"Retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def summary(self):
+        """
+        :return: A human readable summary of the scored, failed and skipped documents per collection.
+        """
+        return ", ".join(f"{collection}: {counts['scored']} scored, {counts['failed']} failed, "
+                         f"{counts['skipped']} skipped" for collection, counts in self.counts.items()) \
+            or "no documents scored"
+
+    def cache_summary(self):
+        """
+        :return: A human readable summary of the hit rate of the sentiment cache in this run.
+        """
+        cache = self.sentiment_pipeline.cache
+        return cache.summary() if cache is not None else "disabled"
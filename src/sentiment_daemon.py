@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# Server error codes of a change stream on a standalone server, and of a resume token that left the oplog
+CHANGE_STREAMS_UNSUPPORTED_CODES = (40573,)
+CHANGE_STREAM_HISTORY_LOST_CODES = (286,)
+
+
+class SentimentDaemon:
+    """
+    Scores new posts and comments shortly after they were inserted, while the scrapers are still running.
+
+    Every analyzed collection is tailed by its own thread. On a replica set the thread watches the inserts with a
+    change stream, on a standalone server it polls for documents whose ObjectId is above a watermark. New documents
+    are scored in micro-batches of up to `batch_size` documents, a batch is scored once it is full or its first
+    document waited `max_wait` seconds. After every batch the resume token or watermark is stored in the watermark
+    collection, so a restarted daemon continues where it stopped instead of scanning the collections again.
+    """
+
+    def __init__(self, controller, features=config.SENTIMENT_FEATURES,
+                 batch_size=config.SENTIMENT_DAEMON_BATCH_SIZE, max_wait=config.SENTIMENT_DAEMON_MAX_WAIT,
+                 poll_interval=config.SENTIMENT_DAEMON_POLL_INTERVAL, poll_lag=config.SENTIMENT_DAEMON_POLL_LAG,
+                 change_streams=config.SENTIMENT_DAEMON_CHANGE_STREAMS,
+                 watermarks=config.SENTIMENT_DAEMON_COLLECTION):
+        """
+        Initialize the SentimentDaemon.
+
+        :param controller: The SentimentController that scores the documents and writes the sentiments.
+        :param features: (collection, field) tuples of the analyzed collections and fields.
+        :param batch_size: The maximum number of documents scored together.
+        :param max_wait: The maximum time in seconds a new document waits for its batch to fill up.
+        :param poll_interval: The time in seconds between two polls that found no new documents.
+        :param poll_lag: Documents whose ObjectId is younger than this many seconds are left for a later poll, so
+            documents of concurrent writers with slightly older ids are not skipped by the watermark.
+        :param change_streams: Watch the collections with change streams if the server supports them.
+        :param watermarks: The name of the collection the resume tokens and watermarks are stored in.
+        """
+        self.controller = controller
+        self.features = features
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.poll_lag = poll_lag
+        self.change_streams = change_streams
+        self.watermarks = watermarks
+        self.scored = {collection: 0 for collection, _ in features}
+        self._errors = []
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """
+        Stop tailing after the current batch.
+        """
+        self._stopped.set()
+
+    def run(self):
+        """
+        Tail all analyzed collections until the daemon is stopped.
+
+        :return: The number of scored documents per collection.
+        :raises Exception: the error that stopped a tailing thread, which stops the other threads as well.
+        """
+        with self.controller.db_client as db_client:
+            threads = [threading.Thread(target=self._tail_safely, args=(db_client, collection, field),
+                                        name=f"sentiment-{collection}", daemon=True)
+                       for collection, field in self.features]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return self.scored
+
+    def _tail_safely(self, db_client, collection, field):
+        try:
+            self.tail(db_client, collection, field)
+        except Exception as e:
+            logger.error(f"Tailing {collection} failed: {str(e)}")
+            self._errors.append(e)
+            self.stop()
+
+    def tail(self, db_client, collection, field):
+        """
+        Score the new documents of a collection until the daemon is stopped, with a change stream if possible and
+        by polling otherwise.
+
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the collection.
+        :param field: The name of the analyzed field.
+        """
+        if self.change_streams:
+            try:
+                self.watch(db_client, collection, field)
+                return
+            except OperationFailure as e:
+                if e.code not in CHANGE_STREAMS_UNSUPPORTED_CODES:
+                    raise
+                logger.info(f"Change streams are not supported by the server, polling {collection} instead")
+        self.poll(db_client, collection, field)
+
+    def watch(self, db_client, collection, field):
+        """
+        Score the documents inserted into a collection, read from a change stream.
+
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the collection.
+        :param field: The name of the analyzed field.
+        :raises OperationFailure: if the server does not support change streams.
+        """
+        col = db_client.db[collection]
+        pipeline = [{'$match': {'operationType': 'insert'}},
+                    {'$project': {f'fullDocument.{name}': 1 for name in self.controller.projection(field)}}]
+        resume_token = self.load_watermark(db_client, collection).get('resume_token')
+        try:
+            stream = col.watch(pipeline, resume_after=resume_token, max_await_time_ms=int(self.max_wait * 1000))
+        except OperationFailure as e:
+            if resume_token is None or e.code not in CHANGE_STREAM_HISTORY_LOST_CODES:
+                raise
+            logger.warning(f"The resume token of {collection} is no longer in the oplog, watching new inserts only")
+            stream = col.watch(pipeline, max_await_time_ms=int(self.max_wait * 1000))
+
+        logger.info(f"Watching {collection} for new documents")
+        with stream:
+            while not self._stopped.is_set():
+                batch = []
+                deadline = None
+                while len(batch) < self.batch_size and not self._stopped.is_set():
+                    change = stream.try_next()
+                    if change is not None:
+                        batch.append(change['fullDocument'])
+                        deadline = deadline or time.monotonic() + self.max_wait
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                if batch:
+                    self.score(db_client, collection, field, batch, resume_token=stream.resume_token)
+
+    def poll(self, db_client, collection, field):
+        """
+        Score the documents of a collection whose ObjectId is above the stored watermark, polling for new ones.
+        Without a stored watermark the poll starts at the current time, older documents are scored by a regular
+        sentiment analysis run.
+
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the collection.
+        :param field: The name of the analyzed field.
+        """
+        col = db_client.db[collection]
+        last_id = self.load_watermark(db_client, collection).get('last_id')
+        if last_id is None:
+            last_id = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=self.poll_lag))
+
+        logger.info(f"Polling {collection} for documents after {last_id}")
+        while not self._stopped.is_set():
+            cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=self.poll_lag))
+            documents = list(col.find({'_id': {'$gt': last_id, '$lt': cutoff}}, self.controller.projection(field))
+                             .sort('_id', ASCENDING).limit(self.batch_size))
+            if documents:
+                last_id = documents[-1]['_id']
+                self.score(db_client, collection, field, documents, last_id=last_id)
+            if len(documents) < self.batch_size:
+                self._stopped.wait(self.poll_interval)
+
+    def score(self, db_client, collection, field, documents, **watermark):
+        """
+        Score a micro-batch of new documents and store the watermark after it.
+
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the collection.
+        :param field: The name of the analyzed field.
+        :param documents: Documents with the fields of the controller's projection.
+        :param watermark: The resume_token or last_id after the batch.
+        """
+        documents = [document for document in documents if field in document]
+        updated = self.controller.score_documents(db_client, collection, field, documents)
+        self.scored[collection] += updated
+        self.save_watermark(db_client, collection, **watermark)
+        logger.info(f"Scored {updated} of {len(documents)} new documents in {collection}")
+
+    def load_watermark(self, db_client, collection):
+        """
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the tailed collection.
+        :return: The stored watermark of the collection with its `resume_token` or `last_id`, empty if none is stored.
+        """
+        return db_client.db[self.watermarks].find_one({'_id': collection}) or {}
+
+    def save_watermark(self, db_client, collection, **watermark):
+        """
+        :param db_client: The connected MongoDBClient.
+        :param collection: The name of the tailed collection.
+        :param watermark: The resume_token or last_id to store.
+        """
+        db_client.db[self.watermarks].update_one(
+            {'_id': collection}, {'$set': {**watermark, 'updated_at': datetime.now(timezone.utc)}}, upsert=True)
+
+    def summary(self):
+        """
+        :return: A human readable summary of the scored documents per collection.
+        """
+        return ", ".join(f"{collection}: {scored} scored" for collection, scored in self.scored.items())
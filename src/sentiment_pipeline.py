@@ -1,11 +1,124 @@
+import io
+import logging
+import os
 import re
 
-import numpy as np
-from scipy.special import softmax
+import torch
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
 from transformers import AutoModelForSequenceClassification
 from transformers import AutoTokenizer, AutoConfig
 
-from src.config import COMMENTS_COLLECTION, SENTIMENT_MODEL, POSTS_COLLECTION
+from src.config import COMMENTS_COLLECTION, SENTIMENT_MODEL, SENTIMENT_MODEL_REVISION, POSTS_COLLECTION, \
+    SENTIMENT_MAX_LENGTH, SENTIMENT_MAX_BATCH_TOKENS, SENTIMENT_MAX_BATCH_SIZE, SENTIMENT_BACKEND, SENTIMENT_BACKENDS, \
+    SENTIMENT_ONNX_DIR, SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_FILE
+from src.metrics import STARTUP_TIMINGS
+from src.sentiment_cache import SentimentCache, cache_key
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever `preprocess` changes, so stored sentiments of the old preprocessing are scored again
+PREPROCESSING_VERSION = 1
+
+# files of a hub model needed to run it with torch, other weight formats are not downloaded
+MODEL_FILES = ["*.json", "*.bin", "*.safetensors", "*.model", "*.txt"]
+
+
+def resolve_model(model_path, revision=None):
+    """
+    Resolves a model to a local directory. A hub model is looked up in the local Hugging Face cache without any
+    request to the hub and only downloaded if it is not cached yet, so routine starts work offline.
+
+    :param model_path: The huggingface model path or a local directory.
+    :param revision: The model revision (branch, tag or commit hash), None for the latest revision.
+    :return: The local directory and the commit hash of the model, None for a local directory.
+    """
+    if os.path.isdir(model_path):
+        return model_path, None
+    try:
+        directory = snapshot_download(model_path, revision=revision, local_files_only=True)
+    except LocalEntryNotFoundError:
+        logger.info(f"{model_path} is not cached yet, downloading it")
+        directory = snapshot_download(model_path, revision=revision, allow_patterns=MODEL_FILES)
+    # cached snapshots are stored in a directory named after their commit hash
+    return directory, os.path.basename(os.path.normpath(directory))
+
+
+def length_buckets(lengths, max_tokens=SENTIMENT_MAX_BATCH_TOKENS, max_batch_size=SENTIMENT_MAX_BATCH_SIZE):
+    """
+    Groups inputs of similar length into batches, so little compute is spent on padding.
+
+    The inputs are sorted by length, longest first, and a batch is filled until its padded size, the number of
+    inputs times the length of its longest input, would exceed `max_tokens`. Short inputs therefore end up in large
+    batches and long inputs in small ones. An input longer than `max_tokens` gets a batch of its own.
+
+    :param lengths: The number of tokens per input.
+    :param max_tokens: The maximum number of tokens of a padded batch.
+    :param max_batch_size: The maximum number of inputs per batch.
+    :return: A list of batches, each a list of input indexes.
+    """
+    batches = []
+    batch = []
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        # the first input of a batch is its longest
+        if batch and (len(batch) == max_batch_size or (len(batch) + 1) * lengths[batch[0]] > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def pad_batch(sequences, pad_token_id):
+    """
+    Pads token id sequences to the length of the longest one.
+
+    :param sequences: Lists of token ids.
+    :param pad_token_id: The token id to pad with.
+    :return: The model input, a dict with the padded `input_ids` and the `attention_mask` as tensors.
+    """
+    width = max(len(sequence) for sequence in sequences)
+    input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+    for row, sequence in enumerate(sequences):
+        input_ids[row, :len(sequence)] = torch.tensor(sequence, dtype=torch.long)
+        attention_mask[row, :len(sequence)] = 1
+    return {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+
+class _Logits(torch.nn.Module):
+    """
+    Wraps a sequence classification model so it returns the plain logits tensor, the output of the ONNX graph.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def export_onnx(model, path):
+    """
+    Exports a sequence classification model to an ONNX graph with dynamic batch size and sequence length. The graph
+    is written to a temporary file first, so an interrupted export leaves no broken graph behind.
+
+    :param model: The torch model.
+    :param path: The path of the ONNX file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    sample = torch.ones((2, 8), dtype=torch.long)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    torch.onnx.export(_Logits(model).eval(), (sample, sample), temporary, input_names=['input_ids', 'attention_mask'],
+                      output_names=['logits'],
+                      dynamic_axes={'input_ids': {0: 'batch', 1: 'sequence'},
+                                    'attention_mask': {0: 'batch', 1: 'sequence'}, 'logits': {0: 'batch'}},
+                      opset_version=14)
+    os.replace(temporary, path)
 
 
 class SentimentPipeline:
@@ -13,16 +126,141 @@ class SentimentPipeline:
     A Sentiment Pipeline class that provides methods to interact with the huggingface sentiment model.
     """
 
-    def __init__(self, model_path=SENTIMENT_MODEL):
+    def __init__(self, model_path=SENTIMENT_MODEL, revision=SENTIMENT_MODEL_REVISION, backend=SENTIMENT_BACKEND,
+                 onnx_dir=SENTIMENT_ONNX_DIR, cache_size=SENTIMENT_CACHE_SIZE, cache_file=SENTIMENT_CACHE_FILE):
         """
         Initialize the Sentiment Pipeline class.
 
         :param model_path: The huggingface model path. Defaults to the path specified in the config.
+        :param revision: The model revision (branch, tag or commit hash). Defaults to the revision specified in the
+            config, None loads the latest revision.
+        :param backend: The inference backend, "torch" (fp32), "torch-int8" (dynamically quantized linear layers) or
+            "onnx" (ONNX Runtime). Defaults to the backend specified in the config.
+        :param onnx_dir: The directory the exported ONNX graphs are cached in.
+        :param cache_size: The number of sentiments kept in memory by the sentiment cache, 0 disables the cache.
+        :param cache_file: The SQLite file of the persistent layer of the sentiment cache, None caches in memory only.
         """
         self.model_path = model_path
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-        self.config = AutoConfig.from_pretrained(self.model_path)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+        # the model, the tokenizer and the config are read from one local snapshot, the config only once
+        with STARTUP_TIMINGS.measure('sentiment model resolve'):
+            directory, commit_hash = resolve_model(model_path, revision)
+        with STARTUP_TIMINGS.measure('sentiment config'):
+            self.config = AutoConfig.from_pretrained(directory)
+        with STARTUP_TIMINGS.measure('sentiment tokenizer'):
+            self.tokenizer = AutoTokenizer.from_pretrained(directory, config=self.config, use_fast=True)
+        with STARTUP_TIMINGS.measure('sentiment model load'):
+            self.model = AutoModelForSequenceClassification.from_pretrained(directory, config=self.config)
+        # the commit hash the revision resolved to, local models have none
+        self.revision = commit_hash or revision or 'local'
+        self.onnx_dir = onnx_dir
+        with STARTUP_TIMINGS.measure(f'sentiment backend {backend}'):
+            self.use_backend(backend)
+        self.cache = SentimentCache(cache_file, cache_size) if cache_size > 0 else None
+
+    def use_backend(self, backend):
+        """
+        Switch the inference backend of the loaded fp32 model.
+
+        "torch-int8" quantizes the weights of the linear layers to int8, the activations are quantized on the fly.
+        "onnx" runs the model with ONNX Runtime, the graph is exported once per model revision and cached in
+        `onnx_dir`.
+
+        :param backend: One of SENTIMENT_BACKENDS.
+        """
+        if backend not in SENTIMENT_BACKENDS:
+            raise ValueError(f"Unknown sentiment backend '{backend}', expected one of {SENTIMENT_BACKENDS}")
+        self.backend = backend
+        self._session = None
+
+        if backend == 'torch-int8':
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == 'onnx':
+            if not os.path.exists(self.onnx_path):
+                logger.info(f"Exporting {self.model_path} to {self.onnx_path}")
+                export_onnx(self.model, self.onnx_path)
+            # the graph holds the weights, the torch model is not needed anymore
+            self.model = None
+
+    @property
+    def onnx_path(self):
+        """
+        :return: The path of the cached ONNX graph of the model revision.
+        """
+        return os.path.join(self.onnx_dir, f"{self.model_path.replace('/', '--')}@{self.revision}.onnx")
+
+    @property
+    def session(self):
+        """
+        :return: The ONNX Runtime session of the "onnx" backend, created on first use with one intra-op thread per
+            torch thread, so it follows the thread count of an inference worker.
+        """
+        if self._session is None:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            self._session = onnxruntime.InferenceSession(self.onnx_path, options,
+                                                         providers=['CPUExecutionProvider'])
+        return self._session
+
+    def share_memory(self):
+        """
+        Move the torch weights to shared memory, so worker processes map them instead of copying them. The int8 and
+        ONNX backends are loaded by every worker.
+        """
+        if self.backend == 'torch':
+            self.model.share_memory()
+
+    def __getstate__(self):
+        # ONNX Runtime sessions cannot be pickled, a worker process creates its own. Quantized weights cannot be
+        # passed through shared memory, they are serialized. Workers only score the cache misses of the parent.
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['cache'] = None
+        if self.backend == 'torch-int8':
+            buffer = io.BytesIO()
+            torch.save(self.model, buffer)
+            state['model'] = buffer.getvalue()
+        return state
+
+    def __setstate__(self, state):
+        if state['backend'] == 'torch-int8':
+            state['model'] = torch.load(io.BytesIO(state['model']))
+        self.__dict__.update(state)
+
+    def forward(self, encoded_input):
+        """
+        Run a padded batch through the model of the selected backend.
+
+        :param encoded_input: A dict with the `input_ids` and the `attention_mask` tensors.
+        :return: The logits tensor.
+        """
+        if self.backend == 'onnx':
+            logits = self.session.run(['logits'], {name: tensor.numpy() for name, tensor in encoded_input.items()})[0]
+            return torch.from_numpy(logits)
+        with torch.inference_mode():
+            return self.model(**encoded_input).logits
+
+    @property
+    def version(self):
+        """
+        :return: The version of the stored sentiments, made of the model name, the model revision and the
+            preprocessing version.
+        """
+        return f"{self.model_path}@{self.revision}/preprocessing-{PREPROCESSING_VERSION}"
+
+    @property
+    def version_info(self):
+        """
+        :return: The fields stored with every sentiment to record how it was scored.
+        """
+        return {
+            'model': self.model_path,
+            'model_revision': self.revision,
+            'preprocessing_version': PREPROCESSING_VERSION,
+            'backend': self.backend,
+            'version': self.version
+        }
 
     def get_tokenized_sentiment(self, data, collection=COMMENTS_COLLECTION):
         """
@@ -32,22 +270,80 @@ class SentimentPipeline:
         :param collection: The collection type of the input data. Defaults to COMMENTS_COLLECTION which is specified in the config.
         :return: A dictionary containing the sentiment label and score.
         """
+        return self.get_sentiments([data], collection=collection)[0]
 
-        # anonymize the input text
-        text = self.preprocess(data, type=collection)
+    def get_sentiments(self, texts, collection=COMMENTS_COLLECTION, max_tokens=SENTIMENT_MAX_BATCH_TOKENS,
+                       max_batch_size=SENTIMENT_MAX_BATCH_SIZE):
+        """
+        Get the sentiments of many texts with batched inference. Texts found in the sentiment cache are not scored
+        again, see cached_sentiments.
 
-        encoded_input = self.tokenizer(text, return_tensors='pt')
-        output = self.model(**encoded_input)
+        :param texts: The input strings.
+        :param collection: The collection type of the input data. Defaults to COMMENTS_COLLECTION which is specified
+            in the config.
+        :param max_tokens: The maximum number of tokens of a padded batch.
+        :param max_batch_size: The maximum number of texts per batch.
+        :return: A list with a dictionary containing the sentiment label and score per text, in the order of the texts.
+        """
+        # anonymize the input texts
+        texts = [self.preprocess(text, type=collection) for text in texts]
+        return self.cached_sentiments(texts, lambda missing: self.infer(missing, max_tokens, max_batch_size))
 
-        # get the sentiment label and convert the score to a probability
-        scores = output[0][0].detach().numpy()
-        scores = softmax(scores)
-        ranking = np.argsort(scores)[::-1]
+    def cached_sentiments(self, texts, infer):
+        """
+        Get the sentiments of preprocessed texts from the sentiment cache and score only the missing ones.
 
-        return {
-            'label': self.config.id2label[ranking[0]],
-            'score': np.round(float(scores[ranking[0]]), 4)
-        }
+        The cache is content-addressed: a sentiment is keyed by the hash of the preprocessed text, the pipeline version
+        and the backend, so a new model revision, preprocessing or backend never reuses old sentiments. Texts that
+        occur several times are scored once.
+
+        :param texts: The preprocessed input strings.
+        :param infer: The function scoring a list of preprocessed texts, e.g. `infer` or the workers of an
+            InferencePool.
+        :return: A list with a dictionary containing the sentiment label and score per text, in the order of the texts.
+        """
+        if self.cache is None:
+            return infer(texts)
+
+        version = f"{self.version}/{self.backend}"
+        keys = [cache_key(text, version) for text in texts]
+        sentiments = self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in sentiments}
+        if missing:
+            scored = dict(zip(missing, infer(list(missing.values()))))
+            self.cache.put_many(scored)
+            sentiments.update(scored)
+        # copies, so callers adding fields do not change the cached sentiments
+        return [dict(sentiments[key]) for key in keys]
+
+    def infer(self, texts, max_tokens=SENTIMENT_MAX_BATCH_TOKENS, max_batch_size=SENTIMENT_MAX_BATCH_SIZE):
+        """
+        Score preprocessed texts with batched inference, without the sentiment cache.
+
+        The texts are tokenized at once by the fast tokenizer, truncated to SENTIMENT_MAX_LENGTH tokens and grouped
+        into batches of similar length, see length_buckets. Every batch runs through the model of the backend and
+        the label and probability of all its texts are taken with one softmax and argmax.
+
+        :param texts: The preprocessed input strings.
+        :param max_tokens: The maximum number of tokens of a padded batch.
+        :param max_batch_size: The maximum number of texts per batch.
+        :return: A list with a dictionary containing the sentiment label and score per text, in the order of the texts.
+        """
+        input_ids = self.tokenizer(texts, truncation=True, max_length=SENTIMENT_MAX_LENGTH)['input_ids']
+
+        sentiments = [None] * len(texts)
+        for batch in length_buckets([len(ids) for ids in input_ids], max_tokens, max_batch_size):
+            encoded_input = pad_batch([input_ids[i] for i in batch], self.tokenizer.pad_token_id)
+            logits = self.forward(encoded_input)
+
+            # get the sentiment label and convert the score to a probability
+            scores, labels = torch.softmax(logits, dim=-1).max(dim=-1)
+            for index, label, score in zip(batch, labels.tolist(), scores.tolist()):
+                sentiments[index] = {
+                    'label': self.config.id2label[label],
+                    'score': round(score, 4)
+                }
+        return sentiments
 
     def preprocess(self, text, type):
         """
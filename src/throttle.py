@@ -0,0 +1,216 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """
+    Raised inside a scheduler slot when the host signalled that we are too fast, e.g. with an interstitial page.
+    """
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket limiting the request rate to a host.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize the TokenBucket.
+
+        :param rate: Tokens added per second.
+        :param capacity: The maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Take a token, blocking until one is available.
+
+        :return: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the given time, e.g. after the host asked us to slow down.
+
+        :param seconds: The pause in seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class AdaptiveConcurrency:
+    """
+    An AIMD concurrency limit.
+
+    The limit grows additively by about one slot per limit's worth of healthy responses and is halved on timeouts or
+    rate limit signals, like TCP congestion control.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=16, target_latency=5.0):
+        """
+        Initialize the AdaptiveConcurrency.
+
+        :param initial: The initial concurrency limit.
+        :param minimum: The lower bound of the limit.
+        :param maximum: The upper bound of the limit.
+        :param target_latency: Latency in seconds above which a response counts as unhealthy.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """
+        Grow the limit after a healthy response, shrink it if the response was slow.
+
+        :param latency: The latency of the response in seconds.
+        """
+        if latency > self.target_latency:
+            self.on_congestion()
+            return
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_congestion(self):
+        """
+        Halve the limit after a timeout, a slow response or a rate limit signal.
+        """
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class HostScheduler:
+    """
+    A politeness and throughput scheduler shared by all scraping workers.
+
+    Every host gets its own token bucket and AIMD concurrency limit. Work on a host runs inside a `slot`, which waits
+    for a token and a free concurrency slot and feeds the observed latency or failure back into the limit.
+    """
+
+    def __init__(self, rate=config.THROTTLE_REQUESTS_PER_SECOND, burst=config.THROTTLE_BURST,
+                 initial_concurrency=config.THROTTLE_INITIAL_CONCURRENCY,
+                 max_concurrency=config.THROTTLE_MAX_CONCURRENCY, target_latency=config.THROTTLE_TARGET_LATENCY,
+                 rate_limit_pause=config.THROTTLE_RATE_LIMIT_PAUSE):
+        """
+        Initialize the HostScheduler.
+
+        :param rate: Requests per second per host.
+        :param burst: The number of requests that may be sent in a burst.
+        :param initial_concurrency: The initial concurrency limit per host.
+        :param max_concurrency: The upper bound of the concurrency limit per host.
+        :param target_latency: Latency in seconds above which a response counts as unhealthy.
+        :param rate_limit_pause: Seconds no requests are sent to a host after it signalled a rate limit.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.rate_limit_pause = rate_limit_pause
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (TokenBucket(self.rate, self.burst),
+                                     AdaptiveConcurrency(self.initial_concurrency, maximum=self.max_concurrency,
+                                                         target_latency=self.target_latency))
+            return self._hosts[host]
+
+    def concurrency(self, url):
+        """
+        :param url: A URL of the host.
+        :return: The current concurrency limit of the host.
+        """
+        return self._host(url)[1].limit
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Run a unit of work against the host of the URL, e.g. loading and extracting a page.
+
+        Timeouts, other failed page loads (WebDriverException) and RateLimited exceptions raised inside the slot shrink
+        the concurrency limit of the host, RateLimited additionally pauses the host. The exceptions are re-raised.
+
+        :param url: The URL the work is done on.
+        """
+        from selenium.common import WebDriverException
+
+        bucket, concurrency = self._host(url)
+        concurrency.acquire()
+        try:
+            bucket.acquire()
+            start = time.monotonic()
+            try:
+                yield
+            except RateLimited:
+                logger.warning(f"Rate limited by {urlparse(url).netloc}, pausing {self.rate_limit_pause}s")
+                concurrency.on_congestion()
+                bucket.pause(self.rate_limit_pause)
+                raise
+            except WebDriverException:
+                # includes TimeoutException
+                concurrency.on_congestion()
+                raise
+            concurrency.on_success(time.monotonic() - start)
+        finally:
+            concurrency.release()
+
+
+def backoff_delay(attempt, base_delay=config.RETRY_BASE_DELAY, max_delay=config.RETRY_MAX_DELAY):
+    """
+    Exponential backoff with full jitter.
+
+    :param attempt: The number of the failed attempt, starting at 0.
+    :param base_delay: The delay of the first retry in seconds.
+    :param max_delay: The upper bound of the delay in seconds.
+    :return: A random delay between 0 and min(max_delay, base_delay * 2 ** attempt).
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
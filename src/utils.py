@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import time
+from functools import lru_cache
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -10,6 +11,12 @@ from webdriver_manager.firefox import GeckoDriverManager
 
 logger = logging.getLogger(__name__)
 
+# URL of the Selenium grid hub. Setting SELENIUM_HUB_URL forces the remote driver outside of Docker as well.
+SELENIUM_HUB_URL = os.environ.get('SELENIUM_HUB_URL', 'http://selenium-hub:4444/wd/hub')
+
+# On-disk cache of the resolved geckodriver binary, so the driver manager does not hit the network on every start
+GECKODRIVER_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'reddit-sentiment', 'geckodriver.json')
+
 
 def is_running_in_docker():
     """
@@ -46,11 +53,105 @@ def get_driver(driver_options):
     :param driver_options: Firefox webdriver options.
     :return: Firefox webdriver instance.
     """
-    if is_running_in_docker():
-        logger.info("Running in Docker container, using remote webdriver")
-        return webdriver.Remote(command_executor='http://selenium-hub:4444/wd/hub', options=driver_options)
+    if is_running_in_docker() or os.environ.get('SELENIUM_HUB_URL'):
+        logger.info(f"Using remote webdriver at {SELENIUM_HUB_URL}")
+        return webdriver.Remote(command_executor=SELENIUM_HUB_URL, options=driver_options)
+
+    return webdriver.Firefox(service=Service(resolve_geckodriver_path()), options=driver_options)
+
+
+@lru_cache(maxsize=None)
+def resolve_geckodriver_path(cache_file=GECKODRIVER_CACHE_FILE):
+    """
+    Returns the path of the geckodriver binary.
+
+    The path is resolved once per process. An explicit GECKODRIVER_PATH environment variable wins, otherwise the path
+    cached on disk by a previous run is used as long as the binary still exists. Only if neither is available the
+    GeckoDriverManager is asked to install the driver, which may require network access.
+
+    :param cache_file: JSON file in which the resolved path is cached.
+    :return: Path of the geckodriver binary.
+    """
+    env_path = os.environ.get('GECKODRIVER_PATH')
+    if env_path:
+        return env_path
+
+    try:
+        with open(cache_file, "r") as file:
+            cached_path = json.load(file).get('path')
+        if cached_path and os.path.isfile(cached_path):
+            logger.debug(f"Using cached geckodriver at {cached_path}")
+            return cached_path
+    except (OSError, ValueError):
+        pass
+
+    path = GeckoDriverManager().install()
+
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, "w") as file:
+            json.dump({'path': path}, file)
+    except OSError as e:
+        logger.warning(f"Could not cache geckodriver path: {str(e)}")
+
+    return path
+
+
+def get_process_tree_rss(pid):
+    """
+    Returns the resident set size of a process and all of its descendants.
+
+    Reads from /proc, so it only works for local processes on Linux.
+
+    :param pid: Process id of the root process.
+    :return: Resident set size in bytes, or None if it cannot be determined.
+    """
+    if not os.path.isdir('/proc'):
+        return None
+
+    children = {}
+    rss_pages = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as file:
+                # the process name may contain spaces, so split after the closing parenthesis
+                fields = file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss_pages[int(entry)] = int(fields[21])
+
+    if pid not in rss_pages:
+        return None
 
-    return webdriver.Firefox(service=Service(GeckoDriverManager().install()), options=driver_options)
+    total_pages = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total_pages += rss_pages.get(current, 0)
+        stack.extend(children.get(current, []))
+
+    return total_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+# Page titles Reddit shows instead of the requested page when we are too fast
+RATE_LIMIT_TITLES = ('too many requests', 'blocked', 'whoa there')
+
+
+def is_rate_limited(driver):
+    """
+    Checks if Reddit answered with a rate limit or block page instead of the requested page.
+
+    :param driver: Webdriver instance.
+    :return: True if the loaded page is a rate limit page.
+    """
+    try:
+        title = (driver.title or '').lower()
+    except Exception:
+        return False
+    return isinstance(title, str) and any(marker in title for marker in RATE_LIMIT_TITLES)
 
 
 def handle_cookie_banner(driver):
@@ -83,6 +184,63 @@ def scroll_to_bottom(driver, scroll_time):
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
 
 
+# Scrolls to the bottom and reports the page height and the number of elements matching an XPath in one round trip
+SCROLL_AND_MEASURE_SCRIPT = """
+window.scrollTo(0, document.body.scrollHeight);
+const count = arguments[0] === null ? 0 : document.evaluate(
+    "count(" + arguments[0] + ")", document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+return [document.body.scrollHeight, count];
+"""
+
+
+def scroll_until(driver, count_xpath=None, target_count=None, max_time=10, settle_time=1.0, poll_interval=0.25):
+    """
+    Scrolls to the bottom of the page until enough content is loaded.
+
+    Scrolling stops as soon as one of the following is true:
+      - the number of elements matching `count_xpath` reached `target_count`
+      - neither the page height nor the element count grew for `settle_time` seconds
+      - `max_time` seconds have passed
+
+    :param driver: Webdriver instance.
+    :param count_xpath: XPath of the elements to count, e.g. the posts of a listing. Only the page height is
+                        observed if None.
+    :param target_count: The number of elements after which scrolling stops, None for no target.
+    :param max_time: Hard time budget in seconds.
+    :param settle_time: Seconds without growth after which the page counts as fully loaded.
+    :param poll_interval: Seconds to wait between two scrolls.
+    :return: The number of matching elements when scrolling stopped.
+    """
+    start_time = time.monotonic()
+    last_growth = start_time
+    last_height, last_count = -1, -1
+    count = 0
+
+    while True:
+        height, count = driver.execute_script(SCROLL_AND_MEASURE_SCRIPT, count_xpath)
+        count = int(count)
+        now = time.monotonic()
+
+        if target_count is not None and count >= target_count:
+            logger.debug(f"Scrolling reached target of {target_count} elements after {now - start_time:.1f}s")
+            break
+
+        if height > last_height or count > last_count:
+            last_height, last_count = height, count
+            last_growth = now
+        elif now - last_growth >= settle_time:
+            logger.debug(f"Page settled with {count} elements after {now - start_time:.1f}s")
+            break
+
+        if now - start_time >= max_time:
+            logger.debug(f"Scroll time budget of {max_time}s used up with {count} elements")
+            break
+
+        time.sleep(poll_interval)
+
+    return count
+
+
 def handle_google_credential(driver):
     """
     Handles the Google Credential popup by clicking the "Close" button.
@@ -0,0 +1,317 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from src import config
+from src.throttle import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+SUBREDDIT = 'subreddit'
+POST = 'post'
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# posts are handed out before subreddits, so discovered work is finished before new work is discovered
+PRIORITIES = {SUBREDDIT: 0, POST: 1}
+
+
+def default_worker_id():
+    """
+    :return: A worker id that is unique across the processes of all nodes.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    A work queue of subreddits and posts stored in a MongoDB collection, shared by workers on any number of nodes.
+
+    Workers claim items with a lease: an atomic find-and-modify marks the item as leased by the worker until the
+    lease expires. Workers renew the lease with heartbeats while they work on an item. Items whose lease expired,
+    because the worker died or lost the connection, can be claimed again by another worker. Failed items are released
+    for a retry after a jittered backoff until they failed `max_attempts` times.
+    """
+
+    def __init__(self, db_client, collection=config.WORK_QUEUE_COLLECTION,
+                 lease_seconds=config.WORK_QUEUE_LEASE_SECONDS, max_attempts=config.WORK_QUEUE_MAX_ATTEMPTS):
+        """
+        Initialize the WorkQueue.
+
+        :param db_client: A connected MongoDBClient.
+        :param collection: The name of the queue collection.
+        :param lease_seconds: The time in seconds a claimed item stays leased without a heartbeat.
+        :param max_attempts: The number of claims after which a failing item is given up.
+        """
+        self.db_client = db_client
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @property
+    def _col(self):
+        return self.db_client.db[self.collection]
+
+    def create_indexes(self):
+        """
+        Create the index used to claim the next item.
+        """
+        self._col.create_index([('state', ASCENDING), ('priority', DESCENDING), ('available_at', ASCENDING)])
+
+    def enqueue(self, kind, items):
+        """
+        Add items to the queue. Items that are already queued, in any state, are not added again.
+
+        :param kind: SUBREDDIT or POST.
+        :param items: Dicts with the item's `key` (subreddit name or post href) and optional data, e.g. the
+            `subreddit` and `comment_count` of a post.
+        :return: The number of added items.
+        """
+        now = datetime.now(timezone.utc)
+        requests = [UpdateOne({'_id': f"{kind}:{item['key']}"},
+                              {'$setOnInsert': {**item, 'kind': kind, 'state': PENDING, 'priority': PRIORITIES[kind],
+                                                'attempts': 0, 'available_at': now, 'created_at': now}},
+                              upsert=True)
+                    for item in items]
+        if not requests:
+            return 0
+        return self._col.bulk_write(requests, ordered=False).upserted_count
+
+    def enqueue_subreddits(self, subreddits):
+        """
+        :param subreddits: Names of the subreddits to scrape.
+        :return: The number of added subreddits.
+        """
+        return self.enqueue(SUBREDDIT, [{'key': subreddit} for subreddit in subreddits])
+
+    def enqueue_posts(self, subreddit, posts):
+        """
+        :param subreddit: The subreddit of the posts.
+        :param posts: (href, comment count) tuples, the comment count can be None.
+        :return: The number of added posts.
+        """
+        return self.enqueue(POST, [{'key': href, 'subreddit': subreddit, 'comment_count': comment_count}
+                                   for href, comment_count in posts])
+
+    def claim(self, worker_id):
+        """
+        Lease the next available item to the worker.
+
+        Pending items and leased items whose lease expired are available. An item that was claimed `max_attempts`
+        times without being completed is marked as failed instead of being handed out again.
+
+        :param worker_id: The id of the claiming worker.
+        :return: The leased item, or None if no item is available.
+        """
+        while True:
+            now = datetime.now(timezone.utc)
+            item = self._col.find_one_and_update(
+                {'$or': [{'state': PENDING, 'available_at': {'$lte': now}},
+                         {'state': LEASED, 'lease_expires': {'$lte': now}}]},
+                {'$set': {'state': LEASED, 'lease_owner': worker_id,
+                          'lease_expires': now + timedelta(seconds=self.lease_seconds)},
+                 '$inc': {'attempts': 1}},
+                sort=[('priority', DESCENDING), ('available_at', ASCENDING)],
+                return_document=ReturnDocument.AFTER)
+
+            if item is None or item['attempts'] <= self.max_attempts:
+                return item
+
+            logger.warning(f"Giving up on {item['_id']} after {self.max_attempts} expired leases")
+            self._finish(item, worker_id, FAILED, error='lease expired')
+
+    def heartbeat(self, item, worker_id):
+        """
+        Extend the lease of an item.
+
+        :param item: The leased item.
+        :param worker_id: The id of the worker holding the lease.
+        :return: False if the worker lost the lease, e.g. because it expired and another worker claimed the item.
+        """
+        result = self._col.update_one(
+            {'_id': item['_id'], 'state': LEASED, 'lease_owner': worker_id},
+            {'$set': {'lease_expires': datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}})
+        return result.matched_count == 1
+
+    def _finish(self, item, worker_id, state, error=None):
+        result = self._col.update_one(
+            {'_id': item['_id'], 'state': LEASED, 'lease_owner': worker_id},
+            {'$set': {'state': state, 'finished_at': datetime.now(timezone.utc), 'error': error},
+             '$unset': {'lease_owner': '', 'lease_expires': ''}})
+        return result.matched_count == 1
+
+    def complete(self, item, worker_id):
+        """
+        Mark a leased item as done.
+
+        :param item: The leased item.
+        :param worker_id: The id of the worker holding the lease.
+        :return: False if the worker no longer held the lease.
+        """
+        return self._finish(item, worker_id, DONE)
+
+    def release(self, item, worker_id, error=None):
+        """
+        Give a leased item back after a failure. The item is retried after a backoff, or marked as failed once it
+        was attempted `max_attempts` times.
+
+        :param item: The leased item.
+        :param worker_id: The id of the worker holding the lease.
+        :param error: A description of the failure.
+        :return: False if the worker no longer held the lease.
+        """
+        if item['attempts'] >= self.max_attempts:
+            logger.warning(f"Giving up on {item['_id']} after {item['attempts']} attempts: {error}")
+            return self._finish(item, worker_id, FAILED, error=error)
+
+        available_at = datetime.now(timezone.utc) + timedelta(seconds=backoff_delay(item['attempts'] - 1))
+        result = self._col.update_one(
+            {'_id': item['_id'], 'state': LEASED, 'lease_owner': worker_id},
+            {'$set': {'state': PENDING, 'available_at': available_at, 'error': error},
+             '$unset': {'lease_owner': '', 'lease_expires': ''}})
+        return result.matched_count == 1
+
+    @contextmanager
+    def leased(self, item, worker_id, heartbeat_interval=config.WORK_QUEUE_HEARTBEAT_INTERVAL):
+        """
+        Keep the lease of an item alive with heartbeats from a background thread while the block runs.
+
+        :param item: The leased item.
+        :param worker_id: The id of the worker holding the lease.
+        :param heartbeat_interval: The time in seconds between two heartbeats, well below the lease time.
+        """
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(heartbeat_interval):
+                try:
+                    if not self.heartbeat(item, worker_id):
+                        logger.warning(f"Lost the lease of {item['_id']}")
+                        return
+                except Exception as e:
+                    logger.error(f"Heartbeat failed for {item['_id']}: {str(e)}")
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{worker_id}", daemon=True)
+        thread.start()
+        try:
+            yield item
+        finally:
+            stopped.set()
+            thread.join()
+
+    def counts(self):
+        """
+        :return: A dict with the number of items per state.
+        """
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self._col.aggregate([{'$group': {'_id': '$state', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
+
+    def is_drained(self):
+        """
+        :return: True if no item is pending or leased.
+        """
+        return self._col.count_documents({'state': {'$in': [PENDING, LEASED]}}, limit=1) == 0
+
+    def reset(self):
+        """
+        Remove all items from the queue.
+        """
+        self._col.delete_many({})
+
+
+class QueueWorker:
+    """
+    A worker that claims items from a WorkQueue until it is stopped or the queue is drained.
+
+    Subreddit items are discovered with the handler's `discover_posts`, which loads the listing and returns its posts,
+    and the posts are enqueued for any worker. Post items are scraped with the handler's `scrape_post`. A
+    SubredditScraper can be used as handler.
+    """
+
+    def __init__(self, queue, handler, worker_id=None, max_posts=None,
+                 heartbeat_interval=config.WORK_QUEUE_HEARTBEAT_INTERVAL,
+                 poll_interval=config.WORK_QUEUE_POLL_INTERVAL):
+        """
+        Initialize the QueueWorker.
+
+        :param queue: The WorkQueue to work on.
+        :param handler: Object with `discover_posts(subreddit, max_posts)` and `scrape_post(href, comment_count)`.
+        :param worker_id: The id of the worker, defaults to host name and process id.
+        :param max_posts: Maximum number of posts to discover per subreddit.
+        :param heartbeat_interval: The time in seconds between two heartbeats of a leased item.
+        :param poll_interval: The time in seconds to wait for new items when none is available.
+        """
+        self.queue = queue
+        self.handler = handler
+        self.worker_id = worker_id or default_worker_id()
+        self.max_posts = max_posts
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.failed = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """
+        Stop the worker after the current item.
+        """
+        self._stopped.set()
+
+    def process(self, item):
+        """
+        Process a single leased item.
+
+        :param item: The leased item.
+        :raises Exception: if the item could not be processed.
+        """
+        if item['kind'] == SUBREDDIT:
+            posts = self.handler.discover_posts(item['key'], max_posts=self.max_posts)
+            added = self.queue.enqueue_posts(item['key'], posts)
+            logger.info(f"[{self.worker_id}] Enqueued {added} of {len(posts)} posts of subreddit {item['key']}")
+        elif self.handler.scrape_post(item['key'], comment_count=item.get('comment_count')) is False:
+            raise RuntimeError(f"post could not be scraped: {item['key']}")
+
+    def run(self, exit_when_empty=False):
+        """
+        Claim and process items until the worker is stopped.
+
+        :param exit_when_empty: Return once no item is pending or leased instead of waiting for new items.
+        :return: The number of processed items.
+        """
+        logger.info(f"[{self.worker_id}] Worker started")
+        while not self._stopped.is_set():
+            item = self.queue.claim(self.worker_id)
+            if item is None:
+                if exit_when_empty and self.queue.is_drained():
+                    break
+                self._stopped.wait(self.poll_interval)
+                continue
+
+            with self.queue.leased(item, self.worker_id, heartbeat_interval=self.heartbeat_interval):
+                start = time.monotonic()
+                try:
+                    self.process(item)
+                except Exception as e:
+                    logger.error(f"[{self.worker_id}] Failed to process {item['_id']}: {str(e)}")
+                    self.queue.release(item, self.worker_id, error=str(e))
+                    self.failed += 1
+                    continue
+
+                if not self.queue.complete(item, self.worker_id):
+                    logger.warning(f"[{self.worker_id}] Lease of {item['_id']} expired before it was completed")
+                self.processed += 1
+                logger.info(f"[{self.worker_id}] Processed {item['_id']} in {time.monotonic() - start:.1f}s")
+
+        logger.info(f"[{self.worker_id}] Worker stopped after {self.processed} items, {self.failed} failures")
+        return self.processed
@@ -0,0 +1,128 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.config import DATABASE_NAME, DRIVER_PERSISTENT_SESSIONS
+from src.database import MongoDBClient
+from src.driver_manager import DriverManager
+from src.metrics import ScrapeStats
+from src.scraper import SubredditScraper
+
+logger = logging.getLogger(__name__)
+
+
+class ScraperPool:
+    """
+    Spreads subreddits over a pool of independent scraping workers.
+
+    Every worker thread owns its own SubredditScraper and database client, so each worker drives its own browser
+    obtained from `utils.get_driver` (a local Firefox or a session on the Selenium grid). The database clients share
+    the connection pool of the process. The browsers run as separate processes, which lets the threads scrape in
+    parallel. Subreddits are handed out one at a time, so a slow subreddit does not hold up the remaining ones.
+    """
+
+    def __init__(self, driver_options, workers=1, database_name=DATABASE_NAME,
+                 persistent_sessions=DRIVER_PERSISTENT_SESSIONS, archive=None, known_items=None, scheduler=None,
+                 frontier=None, writer=None):
+        """
+        Initialize the ScraperPool.
+
+        :param driver_options: Webdriver options passed to every worker.
+        :param workers: The number of concurrent browser workers.
+        :param database_name: The database the workers write to.
+        :param persistent_sessions: Whether every worker keeps its browser alive across subreddits.
+        :param archive: PageArchive shared by all workers to only capture pages, None to scrape live.
+        :param known_items: KnownItems shared by all workers for incremental scraping, None to scrape everything.
+        :param scheduler: HostScheduler shared by all workers to pace page loads per host, None for no throttling.
+        :param frontier: Frontier shared by all workers to record the progress of the run, None to record nothing.
+        :param writer: BatchWriter shared by all workers to write in the background, None to write directly.
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+
+        self.driver_options = driver_options
+        self.workers = workers
+        self.database_name = database_name
+        self.persistent_sessions = persistent_sessions
+        self.archive = archive
+        self.known_items = known_items
+        self.scheduler = scheduler
+        self.frontier = frontier
+        self.writer = writer
+        self.stats = ScrapeStats()
+        self._local = threading.local()
+        self._driver_managers = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """
+        Stop the workers after their current post. Subreddits that were not started yet are skipped.
+        """
+        self._stopped.set()
+
+    def _get_scraper(self):
+        """
+        Return the scraper of the calling worker thread, creating it on first use.
+
+        :return: SubredditScraper owned by the current thread.
+        """
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            db_client = MongoDBClient(database_name=self.database_name)
+            driver_manager = None
+            if self.persistent_sessions:
+                driver_manager = DriverManager(self.driver_options)
+                with self._lock:
+                    self._driver_managers.append(driver_manager)
+            scraper = SubredditScraper(self.driver_options, db_client, stats=self.stats, driver_manager=driver_manager,
+                                       archive=self.archive, known_items=self.known_items,
+                                       scheduler=self.scheduler, frontier=self.frontier,
+                                       writer=self.writer, stopped=self._stopped)
+            self._local.scraper = scraper
+        return scraper
+
+    def _scrape(self, subreddit_id, max_posts):
+        """
+        Scrape a single subreddit on the calling worker thread.
+
+        :param subreddit_id: Subreddit to scrape.
+        :param max_posts: Maximum number of posts to scrape.
+        """
+        if self._stopped.is_set():
+            return
+        logger.info(f"[{threading.current_thread().name}] Scraping subreddit: {subreddit_id}")
+        self._get_scraper().scrape_subreddit(subreddit_id, max_posts=max_posts)
+
+    def scrape(self, subreddit_list, max_posts=None):
+        """
+        Scrape all subreddits in the list using the worker pool.
+
+        If the calling thread is interrupted, e.g. by the SystemExit of a SIGTERM handler, the workers are stopped after
+        their current post and the subreddits that were not started yet are cancelled before the error is raised.
+
+        :param subreddit_list: Subreddits to scrape.
+        :param max_posts: Maximum number of posts to scrape per subreddit.
+        :return: ScrapeStats with the aggregate counters of all workers.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scraper')
+        try:
+            futures = {executor.submit(self._scrape, subreddit, max_posts): subreddit for subreddit in subreddit_list}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Worker failed while scraping subreddit {futures[future]}: {str(e)}")
+        except BaseException:
+            logger.info("Stopping the scraping workers after their current post")
+            self.stop()
+            raise
+        finally:
+            executor.shutdown(cancel_futures=True)
+            # the executor has joined all workers, so their browsers can be closed from here
+            for driver_manager in self._driver_managers:
+                driver_manager.close()
+            self._driver_managers.clear()
+
+        logger.info(f"Scraping throughput with {self.workers} workers: {self.stats.summary()}")
+        return self.stats
@@ -0,0 +1,55 @@
+import unittest
+from urllib.parse import unquote
+
+from src.browser_profiles import BLACKHOLE_PROXY, build_blocking_pac
+from src.config import LEAN_BLOCKED_HOSTS, get_driver_options
+from src.metrics import PageTimings
+
+
+class TestBrowserProfiles(unittest.TestCase):
+    """
+    Unit Test class for the browser profiles.
+
+    Methods:
+        test_default_profile: Test that the default profile disables images, loads normally and uses no proxy.
+        test_lean_profile: Test that the lean profile loads eagerly, blocks content types and the configured hosts.
+        test_unknown_profile: Test that an unknown profile is rejected.
+        test_page_timings_summary: Test the summary of the recorded page timings.
+    """
+    def test_default_profile(self):
+        options = get_driver_options("default")
+        self.assertEqual(options.page_load_strategy, "normal")
+        self.assertEqual(options.preferences["permissions.default.image"], 2)
+        self.assertNotIn("network.proxy.autoconfig_url", options.preferences)
+
+    def test_lean_profile(self):
+        options = get_driver_options("lean")
+
+        self.assertEqual(options.page_load_strategy, "eager")
+        self.assertEqual(options.preferences["permissions.default.image"], 2)
+        self.assertEqual(options.preferences["media.autoplay.default"], 5)
+        self.assertEqual(options.preferences["network.proxy.type"], 2)
+
+        pac = unquote(options.preferences["network.proxy.autoconfig_url"].split(",", 1)[1])
+        self.assertEqual(pac, build_blocking_pac(LEAN_BLOCKED_HOSTS))
+        self.assertIn('"v.redd.it"', pac)
+        self.assertIn(BLACKHOLE_PROXY, pac)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_driver_options("turbo")
+
+    def test_page_timings_summary(self):
+        timings = PageTimings()
+        self.assertEqual(timings.summary(), "no page timings recorded")
+
+        for seconds in [1.0, 2.0, 3.0]:
+            timings.record("comments_available", seconds)
+        timings.record("comments_available", None)
+
+        self.assertEqual(timings.samples("comments_available"), [1.0, 2.0, 3.0])
+        self.assertIn("comments_available: n=3 mean=2.00s median=2.00s", timings.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import polars as pl
+from pymongo import InsertOne, UpdateOne
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError
+
+from src import database
+from src.database import BatchWriter, DatabaseStats, MongoDBClient, close_clients, get_client, iter_chunks, \
+    plan_stages, upsert_operations
+
+
+class TestDatabase(unittest.TestCase):
+    """
+    Unit Test class for the shared client and the database statistics. No database server is needed.
+
+    Methods:
+        tearDown: Close the shared clients.
+        test_shared_client: Test that all MongoDBClient instances and threads use one pooled client.
+        test_session_scope: Test that leaving the context manager keeps the shared client open.
+        test_stats: Test the connection counters and operation latencies collected from monitoring events.
+        test_writer_batch_size: Test that a full batch is written with unordered bulk writes per collection.
+        test_writer_flush_interval: Test that pending documents are written after the flush interval.
+        test_writer_backpressure: Test that producers block while the queue is full.
+        test_writer_errors: Test that failed writes are counted and do not stop the writer.
+        test_writer_unexpected_error: Test that an error outside of pymongo does not stop the writer.
+        test_writer_when_written: Test that a producer learns whether its own writes were stored.
+        test_writer_close_timeout: Test that close returns after the timeout if the writes do not finish.
+        test_upsert_operations: Test that documents are upserted on their id and documents without id are inserted.
+        test_plan_stages: Test the stages collected from an explained query plan.
+        test_iter_chunks: Test that an iterable is split into chunks lazily.
+    """
+    def tearDown(self):
+        close_clients()
+
+    def test_shared_client(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(MongoDBClient().__enter__().client))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIs(clients[0], get_client())
+        self.assertIn(database.DB_STATS, clients[0].options.event_listeners)
+
+    def test_session_scope(self):
+        with MongoDBClient(database_name="test_database") as db_client:
+            client = db_client.client
+            self.assertEqual(db_client.db.name, "test_database")
+        with MongoDBClient() as db_client:
+            self.assertIs(db_client.client, client)
+
+        close_clients()
+        with MongoDBClient() as db_client:
+            self.assertIsNot(db_client.client, client)
+
+    def test_stats(self):
+        stats = DatabaseStats()
+        self.assertIn("no operations", stats.summary())
+
+        for _ in range(3):
+            stats.connection_created(None)
+        stats.connection_closed(None)
+        stats.connection_checked_out(None)
+        stats.connection_checked_out(None)
+        stats.connection_checked_in(None)
+        stats.succeeded(SimpleNamespace(command_name='insert', duration_micros=2000))
+        stats.succeeded(SimpleNamespace(command_name='insert', duration_micros=4000))
+        stats.failed(SimpleNamespace(command_name='find', duration_micros=1000))
+
+        self.assertEqual(stats.open_connections, 2)
+        self.assertEqual(stats.peak_checked_out, 2)
+        self.assertEqual(stats.checked_out, 1)
+        self.assertEqual(stats.operations(), {'insert': (2, 0.003, 0.004)})
+        self.assertIn("2 insert mean=3.0ms max=4.0ms", stats.summary())
+        self.assertIn("1 failed operations", stats.summary())
+
+    @staticmethod
+    def _db_client():
+        db_client = MagicMock()
+        db_client.__enter__.return_value = db_client
+        return db_client
+
+    def test_writer_batch_size(self):
+        db_client = self._db_client()
+        with BatchWriter(db_client, batch_size=4, flush_interval=60) as writer:
+            writer.insert_frame('comments', pl.DataFrame({'text': ['a', 'b', 'c']}))
+            writer.upsert_data('posts', {'post_id': 'p1'}, {'post_id': 'p1'})
+            writer.flush()
+
+            bulk_write = db_client.db.__getitem__.return_value.bulk_write
+            self.assertEqual(bulk_write.call_count, 2)
+            operations = [op for call in bulk_write.call_args_list for op in call.args[0]]
+            self.assertEqual(operations[:3], [InsertOne({'text': text}) for text in 'abc'])
+            self.assertEqual(operations[3], UpdateOne({'post_id': 'p1'}, {'$set': {'post_id': 'p1'}}, upsert=True))
+            self.assertTrue(all(call.kwargs == {'ordered': False} for call in bulk_write.call_args_list))
+
+            writer.insert_many_data('posts', [{'post_id': 'p2'}])
+        self.assertEqual(bulk_write.call_count, 3)
+        self.assertEqual(writer.documents, 5)
+
+    def test_writer_flush_interval(self):
+        db_client = self._db_client()
+        with BatchWriter(db_client, batch_size=1000, flush_interval=0.1) as writer:
+            writer.insert_many_data('posts', [{'post_id': 'p1'}])
+            start = time.monotonic()
+            writer.flush()
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+            self.assertEqual(writer.batches, 1)
+
+    def test_writer_backpressure(self):
+        db_client = self._db_client()
+        release = threading.Event()
+        db_client.db.__getitem__.return_value.bulk_write.side_effect = lambda *args, **kwargs: release.wait()
+        writer = BatchWriter(db_client, batch_size=1, flush_interval=60, max_queue=1)
+
+        writer.insert_many_data('posts', [{'post_id': 'p1'}])
+        writer.insert_many_data('posts', [{'post_id': 'p2'}])
+        blocked = threading.Thread(target=writer.insert_many_data, args=('posts', [{'post_id': 'p3'}]))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        release.set()
+        blocked.join(1)
+        self.assertFalse(blocked.is_alive())
+        writer.close()
+        self.assertEqual(writer.documents, 3)
+
+    def test_writer_errors(self):
+        db_client = self._db_client()
+        db_client.db.__getitem__.return_value.bulk_write.side_effect = [
+            BulkWriteError({'writeErrors': [{'index': 0, 'code': 11000}]}), None]
+        with BatchWriter(db_client, batch_size=2, flush_interval=60) as writer:
+            writer.insert_many_data('comments', [{'thing_id': 't1'}, {'thing_id': 't2'}])
+            writer.flush()
+            writer.insert_many_data('comments', [{'thing_id': 't3'}])
+        self.assertEqual(writer.errors, 1)
+        self.assertEqual(writer.documents, 3)
+
+    def test_writer_unexpected_error(self):
+        db_client = self._db_client()
+        db_client.db.__getitem__.return_value.bulk_write.side_effect = [InvalidDocument("cannot encode object"), None]
+        writer = BatchWriter(db_client, batch_size=1, flush_interval=60, close_timeout=5)
+        writer.insert_many_data('comments', [{'thing_id': object()}])
+        self.assertFalse(writer.confirm())
+        writer.insert_many_data('comments', [{'thing_id': 't2'}])
+        self.assertTrue(writer.confirm())
+
+        self.assertTrue(writer._thread.is_alive())
+        writer.close()
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual((writer.errors, writer.documents), (1, 2))
+
+    def test_writer_when_written(self):
+        db_client = self._db_client()
+        db_client.db.__getitem__.return_value.bulk_write.side_effect = [
+            BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000}]}), None]
+        outcomes = {}
+        with BatchWriter(db_client, batch_size=1000, flush_interval=0.1) as writer:
+            def produce(name, documents):
+                writer.insert_many_data('comments', documents)
+                writer.when_written(lambda stored: outcomes.__setitem__(name, stored))
+
+            # the failed second operation of the batch was queued by the second producer
+            for name, documents in [('p1', [{'thing_id': 't1'}]), ('p2', [{'thing_id': 't2'}, {'thing_id': 't3'}])]:
+                thread = threading.Thread(target=produce, args=(name, documents))
+                thread.start()
+                thread.join()
+            writer.flush()
+            self.assertEqual(outcomes, {'p1': True, 'p2': False})
+
+            writer.insert_many_data('comments', [{'thing_id': 't4'}])
+            self.assertTrue(writer.confirm())
+        self.assertEqual(db_client.db.__getitem__.return_value.bulk_write.call_count, 2)
+
+    def test_writer_close_timeout(self):
+        db_client = self._db_client()
+        release = threading.Event()
+        db_client.db.__getitem__.return_value.bulk_write.side_effect = lambda *args, **kwargs: release.wait()
+        writer = BatchWriter(db_client, batch_size=1, flush_interval=60, close_timeout=0.2)
+        writer.insert_many_data('posts', [{'post_id': 'p1'}])
+
+        start = time.monotonic()
+        writer.close()
+        self.assertLess(time.monotonic() - start, 2)
+        release.set()
+
+    def test_upsert_operations(self):
+        operations = upsert_operations([{'thing_id': 't1', 'text': 'a'}, {'thing_id': None, 'text': 'b'}], 'thing_id')
+        self.assertEqual(operations, [
+            UpdateOne({'thing_id': 't1'}, {'$set': {'thing_id': 't1', 'text': 'a'}}, upsert=True),
+            InsertOne({'thing_id': None, 'text': 'b'}),
+        ])
+
+    def test_plan_stages(self):
+        plan = {'stage': 'FETCH', 'filter': {}, 'inputStage': {'stage': 'IXSCAN', 'indexName': 'post_id'}}
+        self.assertEqual(plan_stages(plan), [('FETCH', None), ('IXSCAN', 'post_id')])
+        self.assertEqual(plan_stages({'stage': 'COLLSCAN'}), [('COLLSCAN', None)])
+
+        plan = {'stage': 'SUBPLAN', 'inputStage': {'stage': 'OR', 'inputStages': [
+            {'stage': 'IXSCAN', 'indexName': 'a'}, {'stage': 'FETCH', 'inputStage': {'stage': 'COLLSCAN'}}]}}
+        self.assertEqual(plan_stages(plan), [('SUBPLAN', None), ('OR', None), ('IXSCAN', 'a'), ('FETCH', None),
+                                             ('COLLSCAN', None)])
+
+    def test_iter_chunks(self):
+        consumed = []
+
+        def documents():
+            for i in range(5):
+                consumed.append(i)
+                yield i
+
+        chunks = iter_chunks(documents(), 2)
+        self.assertEqual(next(chunks), [0, 1])
+        self.assertEqual(consumed, [0, 1])
+        self.assertEqual(list(chunks), [[2, 3], [4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
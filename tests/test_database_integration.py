@@ -1,5 +1,8 @@
 import unittest
 
+import polars as pl
+
+from src.config import COMMENTS_COLLECTION
 from src.database import MongoDBClient
 from tests.test_constants import TEST_DATABASE_NAME, TEST_COLLECTION_NAME
 
@@ -12,8 +15,13 @@ class TestDatabaseIntegration(unittest.TestCase):
         setUp: Initializes a MongoDBClient with the necessary configurations.
         tearDown: Cleans up the MongoDBClient and drops the test database.
         test_insert_many_data: Tests the insertion of multiple data items into a collection and validates the operation.
+        test_insert_frame: Tests the insertion of the rows of a polars DataFrame and validates the operation.
         test_get_data: Tests the retrieval of data from a collection and validates the operation.
         test_update_data_by_id: Tests the update operation for a specific document by its id and validates the operation.
+        test_upsert_frame: Tests that storing the same comments again updates them instead of adding duplicates.
+        test_ensure_indexes: Tests that duplicates stop startup and the ids become unique once they are removed.
+        test_check_index_usage: Tests with explain that the controller and analysis queries use the indexes.
+        test_iter_data: Tests streaming projected documents, decoded and as raw BSON.
     """
     def setUp(self):
         self.client = MongoDBClient(database_name=TEST_DATABASE_NAME)
@@ -33,6 +41,15 @@ class TestDatabaseIntegration(unittest.TestCase):
             self.assertIsNotNone(inserted_ids)
             self.assertEqual(len(inserted_ids), 2)
 
+    def test_insert_frame(self):
+        df = pl.DataFrame({"name": ["John", "Jane"], "age": [30, 28]})
+
+        with self.client:
+            inserted_ids = self.client.insert_frame(TEST_COLLECTION_NAME, df)
+            self.assertEqual(len(inserted_ids), 2)
+            result = self.client.get_data(TEST_COLLECTION_NAME, {"name": "Jane"})
+            self.assertEqual(result[0]["age"], 28)
+
     def test_get_data(self):
         data_list = [
             {"name": "John", "age": 30},
@@ -59,6 +76,57 @@ class TestDatabaseIntegration(unittest.TestCase):
             updated_data = self.client.get_data(TEST_COLLECTION_NAME, {"_id": doc_id})
             self.assertEqual(updated_data[0]["age"], 35)
 
+    def test_upsert_frame(self):
+        df = pl.DataFrame({"thing_id": ["t1", "t2", None], "upvotes": [1, 2, 3]})
+
+        with self.client:
+            self.client.upsert_frame(COMMENTS_COLLECTION, df, "thing_id")
+            self.client.db[COMMENTS_COLLECTION].update_one({"thing_id": "t1"}, {"$set": {"sentiment": {"label": "x"}}})
+            self.client.upsert_frame(COMMENTS_COLLECTION, df.with_columns(pl.col("upvotes") * 10), "thing_id")
+
+            self.assertEqual(self.client.db[COMMENTS_COLLECTION].count_documents({"thing_id": {"$ne": None}}), 2)
+            stored = self.client.get_data(COMMENTS_COLLECTION, {"thing_id": "t1"})[0]
+            self.assertEqual(stored["upvotes"], 10)
+            self.assertEqual(stored["sentiment"], {"label": "x"})
+
+    def test_ensure_indexes(self):
+        with self.client:
+            self.client.insert_many_data(COMMENTS_COLLECTION, [{"thing_id": "t1", "text": "first"},
+                                                               {"thing_id": "t1", "text": "second"},
+                                                               {"thing_id": None}, {"thing_id": None}])
+            with self.assertRaises(RuntimeError):
+                self.client.ensure_indexes()
+            self.assertEqual(self.client.db[COMMENTS_COLLECTION].count_documents({"thing_id": "t1"}), 2)
+
+            self.assertEqual(self.client.remove_duplicates(COMMENTS_COLLECTION, "thing_id"), 1)
+            self.client.ensure_indexes()
+            self.client.ensure_indexes()
+
+            stored = self.client.get_data(COMMENTS_COLLECTION, {"thing_id": "t1"})
+            self.assertEqual([comment["text"] for comment in stored], ["first"])
+            with self.assertRaises(Exception):
+                self.client.insert_many_data(COMMENTS_COLLECTION, [{"thing_id": "t1"}])
+
+    def test_check_index_usage(self):
+        with self.client:
+            self.client.ensure_indexes()
+            usage = self.client.check_index_usage()
+            self.assertNotIn(None, usage.values(), usage)
+
+    def test_iter_data(self):
+        data_list = [{"name": f"user{i}", "age": i} for i in range(25)]
+
+        with self.client:
+            self.client.insert_many_data(TEST_COLLECTION_NAME, data_list)
+            documents = list(self.client.iter_data(TEST_COLLECTION_NAME, {"age": {"$gte": 5}},
+                                                   projection={"_id": 1, "age": 1}, batch_size=4))
+            self.assertEqual(len(documents), 20)
+            self.assertEqual(set(documents[0].keys()), {"_id", "age"})
+
+            raw = next(self.client.iter_data(TEST_COLLECTION_NAME, {"age": 7}, raw=True))
+            self.assertEqual(raw["name"], "user7")
+            self.assertIsInstance(raw.raw, bytes)
+
 
 if __name__ == "__main__":
     unittest.main()
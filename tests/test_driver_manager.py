@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from selenium.common import WebDriverException
+
+from src.driver_manager import DriverManager, ManagedDriver
+
+
+class TestDriverManager(unittest.TestCase):
+    """
+    Unit Test class for the DriverManager class.
+
+    Methods:
+        test_session_is_reused: Test that consecutive sessions share one browser.
+        test_recycle_after_page_loads: Test that a browser is recycled once the page load budget is used up.
+        test_cookies_survive_recycle: Test that cookies of a recycled browser are restored in its successor.
+        test_discard_on_webdriver_error: Test that a browser is discarded when the work fails with a WebDriverException.
+        test_managed_driver_delegates: Test that the ManagedDriver proxies attributes and counts page loads.
+    """
+    @patch("src.driver_manager.get_driver")
+    def test_session_is_reused(self, mock_get_driver):
+        manager = DriverManager(MagicMock(), max_page_loads=None, max_rss_mb=None)
+
+        with manager.session() as first:
+            first.get('https://www.reddit.com/r/a')
+        with manager.session() as second:
+            second.get('https://www.reddit.com/r/b')
+
+        self.assertIs(first, second)
+        mock_get_driver.assert_called_once()
+        self.assertEqual(manager.startups, 1)
+        self.assertEqual(manager.sessions_served, 2)
+
+        manager.close()
+        mock_get_driver.return_value.quit.assert_called_once()
+
+    @patch("src.driver_manager.get_driver")
+    def test_recycle_after_page_loads(self, mock_get_driver):
+        mock_get_driver.side_effect = lambda options: MagicMock()
+        manager = DriverManager(MagicMock(), max_page_loads=2, max_rss_mb=None)
+
+        with manager.session() as first:
+            first.get('https://www.reddit.com/r/a')
+            first.get('https://www.reddit.com/r/a/comments/1')
+        with manager.session() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(manager.recycles, 1)
+        self.assertEqual(mock_get_driver.call_count, 2)
+        first.driver.quit.assert_called_once()
+
+    @patch("src.driver_manager.get_driver")
+    def test_cookies_survive_recycle(self, mock_get_driver):
+        mock_get_driver.side_effect = lambda options: MagicMock()
+        manager = DriverManager(MagicMock(), max_page_loads=1, max_rss_mb=None)
+        cookie = {'name': 'eu_cookie', 'value': 'accepted'}
+
+        with manager.session() as first:
+            first.get('https://www.reddit.com/r/a')
+            first.cookies_accepted = True
+            first.driver.get_cookies.return_value = [cookie]
+
+        with manager.session() as second:
+            self.assertTrue(manager.restore_cookies(second))
+
+        second.driver.add_cookie.assert_called_once_with(cookie)
+        self.assertTrue(second.cookies_accepted)
+
+    @patch("src.driver_manager.get_driver")
+    def test_discard_on_webdriver_error(self, mock_get_driver):
+        mock_get_driver.side_effect = lambda options: MagicMock()
+        manager = DriverManager(MagicMock(), max_page_loads=None, max_rss_mb=None)
+
+        with self.assertRaises(WebDriverException):
+            with manager.session() as first:
+                raise WebDriverException("browser crashed")
+        with manager.session() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.driver.quit.assert_called_once()
+
+    def test_managed_driver_delegates(self):
+        driver_mock = MagicMock()
+        driver = ManagedDriver(driver_mock)
+
+        driver.get('https://www.reddit.com')
+        driver.execute_script("return 1;")
+
+        self.assertEqual(driver.page_loads, 1)
+        driver_mock.get.assert_called_once_with('https://www.reddit.com')
+        driver_mock.execute_script.assert_called_once_with("return 1;")
+
+
+if __name__ == '__main__':
+    unittest.main()
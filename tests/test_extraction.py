@@ -0,0 +1,70 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from src.extraction import COMMENT_EXTRACTION_SCRIPT, COMMENT_SCHEMA, CommentColumns, comments_frame_from_records, \
+    extract_comments_bulk, parse_score, subreddit_from_permalink
+
+
+class TestExtraction(unittest.TestCase):
+    """
+    Unit Test class for the bulk comment extraction.
+
+    Methods:
+        test_extract_comments_bulk: Test that all comments are extracted with a single script call.
+        test_comments_frame_from_records_empty: Test that no records result in an empty frame with the comment schema.
+        test_comment_columns_grow_beyond_capacity: Test that the column buffers accept more rows than preallocated.
+        test_parse_score: Test the conversion of the score attribute.
+        test_subreddit_from_permalink: Test the extraction of the subreddit from a permalink.
+    """
+    def test_extract_comments_bulk(self):
+        records = [
+            {'text': 'first', 'author': 'a1', 'thing_id': 't1_a', 'parent_id': None, 'score': '12',
+             'permalink': '/r/aww/comments/abc/title/a/'},
+            {'text': 'reply', 'author': 'a2', 'thing_id': 't1_b', 'parent_id': 't1_a', 'score': None,
+             'permalink': '/r/aww/comments/abc/title/b/'},
+        ]
+        driver_mock = MagicMock()
+        driver_mock.execute_script.return_value = json.dumps(records)
+
+        df = extract_comments_bulk(driver_mock, 'abc')
+
+        driver_mock.execute_script.assert_called_once_with(COMMENT_EXTRACTION_SCRIPT)
+        self.assertEqual(df.schema, COMMENT_SCHEMA)
+        self.assertEqual(df.to_dicts(), [
+            {'post_id': 'abc', 'text': 'first', 'subreddit': 'aww', 'author': 'a1', 'upvotes': 12,
+             'thing_id': 't1_a', 'parent_id': ''},
+            {'post_id': 'abc', 'text': 'reply', 'subreddit': 'aww', 'author': 'a2', 'upvotes': 0,
+             'thing_id': 't1_b', 'parent_id': 't1_a'},
+        ])
+
+    def test_comments_frame_from_records_empty(self):
+        df = comments_frame_from_records([], 'abc')
+        self.assertEqual(df.shape, (0, len(COMMENT_SCHEMA)))
+        self.assertEqual(df.schema, COMMENT_SCHEMA)
+
+    def test_comment_columns_grow_beyond_capacity(self):
+        columns = CommentColumns(capacity=2)
+        for i in range(3):
+            columns.append('abc', f'text {i}', 'aww', 'author', i, f't1_{i}', '')
+
+        df = columns.to_frame()
+
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(df['text'].to_list(), ['text 0', 'text 1', 'text 2'])
+        self.assertEqual(df.schema, COMMENT_SCHEMA)
+        self.assertEqual(CommentColumns(capacity=5).to_frame().height, 0)
+
+    def test_parse_score(self):
+        self.assertEqual(parse_score('42'), 42)
+        self.assertEqual(parse_score(''), 0)
+        self.assertEqual(parse_score(None), 0)
+        self.assertEqual(parse_score('n/a'), 0)
+
+    def test_subreddit_from_permalink(self):
+        self.assertEqual(subreddit_from_permalink('/r/learnpython/comments/x/y/z/'), 'learnpython')
+        self.assertEqual(subreddit_from_permalink(None), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
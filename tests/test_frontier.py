@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.frontier import DONE, FAILED, PENDING, Frontier
+from src.scraper import SubredditScraper
+
+HREFS = [f'https://www.reddit.com/r/aww/comments/p{i}/title/' for i in range(4)]
+
+
+class TestFrontier(unittest.TestCase):
+    """
+    Unit Test class for the Frontier.
+
+    Methods:
+        setUp: Create a frontier in a temporary directory.
+        tearDown: Close the frontier and remove the temporary directory.
+        test_post_states: Test the open posts after posts are done or failed.
+        test_persistence: Test that a new frontier on the same file continues with the open posts.
+        test_reset: Test that a reset forgets all posts.
+        test_concurrent_updates: Test that workers can record their progress concurrently.
+        test_scraper_resume: Test that a resumed subreddit visits only the open posts without scrolling the listing.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'frontier', 'frontier.sqlite3')
+        self.frontier = Frontier(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self.frontier.close()
+        self.tmp_dir.cleanup()
+
+    def test_post_states(self):
+        self.assertFalse(self.frontier.is_discovered('aww'))
+        self.frontier.add_posts('aww', [(href, i) for i, href in enumerate(HREFS)])
+        self.assertTrue(self.frontier.is_discovered('aww'))
+
+        self.frontier.mark_done(HREFS[0])
+        self.frontier.mark_failed(HREFS[2])
+        self.assertEqual(self.frontier.open_posts('aww'), [(HREFS[1], 1), (HREFS[2], 2), (HREFS[3], 3)])
+
+        self.frontier.mark_failed(HREFS[2])
+        self.assertEqual(self.frontier.open_posts('aww'), [(HREFS[1], 1), (HREFS[3], 3)])
+        self.assertEqual(self.frontier.counts(), {PENDING: 2, DONE: 1, FAILED: 1})
+
+        self.frontier.mark_done(HREFS[1])
+        self.frontier.mark_done(HREFS[3])
+        self.assertTrue(self.frontier.is_finished('aww'))
+        self.assertFalse(self.frontier.is_finished('python'))
+
+    def test_persistence(self):
+        self.frontier.add_posts('aww', [(href, None) for href in HREFS])
+        self.frontier.mark_done(HREFS[0])
+        self.frontier.close()
+
+        self.frontier = Frontier(self.path, max_attempts=2)
+        self.assertEqual([href for href, _ in self.frontier.open_posts('aww')], HREFS[1:])
+
+    def test_reset(self):
+        self.frontier.add_posts('aww', [(href, None) for href in HREFS])
+        self.frontier.reset()
+
+        self.assertFalse(self.frontier.is_discovered('aww'))
+        self.assertEqual(self.frontier.counts(), {PENDING: 0, DONE: 0, FAILED: 0})
+
+    def test_concurrent_updates(self):
+        hrefs = [f'https://www.reddit.com/r/aww/comments/c{i}/title/' for i in range(200)]
+        self.frontier.add_posts('aww', [(href, None) for href in hrefs])
+
+        threads = [threading.Thread(target=lambda part=hrefs[i::4]: [self.frontier.mark_done(h) for h in part])
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.frontier.counts()[DONE], 200)
+
+    @patch("src.scraper.get_driver")
+    @patch("src.scraper.handle_cookie_banner")
+    @patch("src.scraper.scroll_until")
+    @patch("src.scraper.WebDriverWait")
+    def test_scraper_resume(self, mock_wait, mock_scroll, mock_handle_cookie, mock_get_driver):
+        self.frontier.add_posts('aww', [(href, None) for href in HREFS])
+        self.frontier.mark_done(HREFS[0])
+
+        scraper = SubredditScraper(MagicMock(), MagicMock(), frontier=self.frontier)
+        scraper.process_post_with_retry = MagicMock(side_effect=[True, False, True])
+        scraper.scrape_subreddit('aww')
+
+        mock_scroll.assert_not_called()
+        self.assertEqual([call.args[1] for call in scraper.process_post_with_retry.call_args_list], HREFS[1:])
+        self.assertEqual(self.frontier.open_posts('aww'), [(HREFS[2], None)])
+
+        self.frontier.mark_done(HREFS[2])
+        mock_get_driver.reset_mock()
+        scraper.scrape_subreddit('aww')
+        mock_get_driver.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import MagicMock
+
+import polars as pl
+
+from src import config
+from src.extraction import parse_comment_count
+from src.incremental import BloomFilter, KnownItems
+
+
+def make_db_client(posts, comments):
+    """
+    Create a MagicMock database client serving the given posts and comments.
+    """
+    db_client = MagicMock()
+    db_client.__enter__.return_value = db_client
+    collections = {config.POSTS_COLLECTION: MagicMock(), config.COMMENTS_COLLECTION: MagicMock()}
+    collections[config.POSTS_COLLECTION].find.return_value = posts
+    collections[config.COMMENTS_COLLECTION].find.return_value.batch_size.return_value = comments
+    collections[config.COMMENTS_COLLECTION].estimated_document_count.return_value = len(comments)
+    db_client.db.__getitem__.side_effect = collections.__getitem__
+    return db_client, collections
+
+
+class TestKnownItems(unittest.TestCase):
+    """
+    Unit Test class for the incremental scraping state.
+
+    Methods:
+        test_unchanged_post_is_skipped: Test that only posts with an unchanged comment count are skipped.
+        test_filter_new_comments: Test that known comments are removed before writing.
+        test_filter_new_comments_bloom: Test that Bloom filter positives are confirmed against the database.
+        test_bloom_filter: Test that the Bloom filter has no false negatives.
+        test_parse_comment_count: Test the conversion of comment count labels.
+    """
+    def test_unchanged_post_is_skipped(self):
+        db_client, _ = make_db_client([{'post_id': 'p1', 'comment_count': 10}], [])
+        known_items = KnownItems().load(db_client)
+
+        self.assertTrue(known_items.is_post_unchanged('p1', 10))
+        self.assertFalse(known_items.is_post_unchanged('p1', 11))
+        self.assertFalse(known_items.is_post_unchanged('p1', None))
+        self.assertFalse(known_items.is_post_unchanged('p2', 10))
+        self.assertEqual(known_items.skipped_posts, 1)
+
+    def test_filter_new_comments(self):
+        db_client, _ = make_db_client([], [{'thing_id': 't1_a'}])
+        known_items = KnownItems().load(db_client)
+        df = pl.DataFrame({'thing_id': ['t1_a', 't1_b', None], 'text': ['old', 'new', 'no id']})
+
+        df_new = known_items.filter_new_comments(df, db_client)
+
+        self.assertEqual(df_new['text'].to_list(), ['new', 'no id'])
+        self.assertEqual(known_items.skipped_comments, 1)
+        self.assertEqual(known_items.filter_new_comments(df, db_client)['text'].to_list(), ['no id'])
+
+    def test_filter_new_comments_bloom(self):
+        db_client, collections = make_db_client([], [{'thing_id': 't1_a'}, {'thing_id': 't1_b'}])
+        known_items = KnownItems(bloom_threshold=1).load(db_client)
+        collections[config.COMMENTS_COLLECTION].find.return_value = [{'thing_id': 't1_a'}]
+        df = pl.DataFrame({'thing_id': ['t1_a', 't1_c'], 'text': ['old', 'new']})
+
+        df_new = known_items.filter_new_comments(df, db_client)
+
+        self.assertEqual(df_new['text'].to_list(), ['new'])
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        keys = [f't1_{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other_{i}' in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_parse_comment_count(self):
+        self.assertEqual(parse_comment_count('42 comments'), 42)
+        self.assertEqual(parse_comment_count('1.2k Comments'), 1200)
+        self.assertEqual(parse_comment_count('1,024 comments'), 1024)
+        self.assertEqual(parse_comment_count('Comment'), 0)
+        self.assertIsNone(parse_comment_count(None))
+        self.assertIsNone(parse_comment_count('n/a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
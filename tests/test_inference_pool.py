@@ -0,0 +1,57 @@
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from src.inference_pool import InferenceError, InferencePool, core_slices
+from tests.test_sentiment_pipeline import tiny_pipeline
+
+
+class TestInferencePool(unittest.TestCase):
+    """
+    Unit Test class for the InferencePool with a tiny model.
+
+    Methods:
+        setUpClass: Start a pool of two workers sharing a tiny pipeline.
+        tearDownClass: Stop the workers.
+        test_core_slices: Test that the cores are split into one slice per worker.
+        test_sentiments_in_order: Test that the workers return the sentiments of the pipeline in the order of the texts.
+        test_error_propagation: Test that an error in a worker is raised in the calling process.
+        test_dead_worker: Test that a dead worker breaks the pool instead of hanging.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.pipeline = tiny_pipeline()
+        cls.pool = InferencePool(cls.pipeline, workers=2, chunk_size=2, queue_size=1, cores=[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_core_slices(self):
+        self.assertEqual(core_slices(3, cores=list(range(8))), [[0, 1, 2], [3, 4, 5], [6, 7]])
+        self.assertEqual(core_slices(3, cores=[0, 1]), [[0], [1], [0]])
+
+    def test_sentiments_in_order(self):
+        texts = ['this is great', 'lol', 'this is awful this is awful', 'fine', 'great great great great', 'is']
+        self.assertEqual(self.pool.get_sentiments(texts), self.pipeline.get_sentiments(texts))
+
+    def test_error_propagation(self):
+        # longer than the 64 positions of the tiny model
+        with self.assertRaises(InferenceError) as context:
+            self.pool.get_sentiments(['this is great', 'lol ' * 100, 'lol'])
+        self.assertIn('RuntimeError', str(context.exception))
+        self.assertEqual(len(self.pool.get_sentiments(['lol', 'fine'])), 2)
+
+    def test_dead_worker(self):
+        pool = InferencePool(self.pipeline, workers=1, cores=[0])
+        try:
+            pool._processes[0].kill()
+            pool._processes[0].join()
+            with self.assertRaises(BrokenProcessPool):
+                pool.get_sentiments(['lol'])
+            self.assertTrue(pool.broken)
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+from urllib.parse import parse_qs, urlparse
+
+from src import config
+from src.json_scraper import JsonSubredditScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'reddit_json')
+
+# Maps request paths (and the listing "after" cursor) to the recorded fixture files
+ROUTES = {
+    ('/r/aww.json', None): 'listing_aww.json',
+    ('/r/aww.json', 't3_def456'): 'listing_aww_page2.json',
+    ('/r/aww/comments/abc123/a_cute_dog.json', None): 'comments_abc123.json',
+    ('/r/aww/comments/def456/a_cat.json', None): 'comments_def456.json',
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves the recorded Reddit JSON fixtures.
+    """
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        after = parse_qs(url.query).get('after', [None])[0]
+        FixtureHandler.requests.append(url.path)
+
+        fixture = ROUTES.get((url.path, after))
+        if fixture is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestJsonSubredditScraper(unittest.TestCase):
+    """
+    Unit Test class for the JsonSubredditScraper against a local stand-in server.
+
+    Methods:
+        setUpClass: Start the local HTTP server serving the fixtures.
+        tearDownClass: Stop the local HTTP server.
+        test_scrape_subreddit: Test that posts and comments are stored with the schema of the browser scraper.
+        test_max_posts: Test that the listing pagination stops at max_posts.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FixtureHandler.requests = []
+        self.db_client = MagicMock()
+        self.db_client.__enter__.return_value = self.db_client
+
+    def test_scrape_subreddit(self):
+        scraper = JsonSubredditScraper(self.db_client, base_url=self.base_url, concurrency=4)
+        scraper.scrape_subreddit('aww')
+
+        posts = [call.args[2] for call in self.db_client.upsert_data.call_args_list]
+        self.assertCountEqual([post['post_id'] for post in posts], ['abc123', 'def456'])
+        self.assertEqual(next(post for post in posts if post['post_id'] == 'abc123'), {
+            'post_id': 'abc123', 'author': 'op_user', 'subreddit': 'aww', 'title': 'a_cute_dog',
+            'permalink': f"{self.base_url}/r/aww/comments/abc123/a_cute_dog/", 'comment_count': 3})
+
+        frames = {call.args[1]['post_id'][0]: call.args[1] for call in self.db_client.upsert_frame.call_args_list
+                  if call.args[1].height}
+        self.assertEqual(frames['abc123'].to_dicts(), [
+            {'post_id': 'abc123', 'text': 'So cute!', 'subreddit': 'aww', 'author': 'alice', 'upvotes': 12,
+             'thing_id': 't1_a', 'parent_id': ''},
+            {'post_id': 'abc123', 'text': 'Agreed', 'subreddit': 'aww', 'author': 'bob', 'upvotes': 3,
+             'thing_id': 't1_b', 'parent_id': 't1_a'},
+        ])
+        for call in self.db_client.upsert_frame.call_args_list:
+            self.assertEqual(call.args[0], config.COMMENTS_COLLECTION)
+            self.assertEqual(call.args[2], 'thing_id')
+        for call in self.db_client.upsert_data.call_args_list:
+            self.assertEqual(call.args[1], {'post_id': call.args[2]['post_id']})
+
+        self.assertEqual(scraper.stats.posts, 2)
+        self.assertEqual(scraper.stats.comments, 2)
+        self.assertNotIn('/r/aww/comments/nsfw01/hidden.json', FixtureHandler.requests)
+
+    def test_max_posts(self):
+        scraper = JsonSubredditScraper(self.db_client, base_url=self.base_url)
+        scraper.scrape_subreddit('aww', max_posts=1)
+
+        self.assertEqual(FixtureHandler.requests.count('/r/aww.json'), 1)
+        self.assertEqual(scraper.stats.posts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
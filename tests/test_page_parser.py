@@ -0,0 +1,87 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.archive import LISTING_PAGE, POST_PAGE, PageArchive
+from src.page_parser import parse_archive, parse_post_page
+
+POST_HREF = 'https://www.reddit.com/r/aww/comments/abc123/a_cute_dog/'
+
+LISTING_HTML = """
+<html><body>
+<div data-testid="post-container"><a data-click-id="body" href="/r/aww/comments/abc123/a_cute_dog/">Dog</a></div>
+<div data-testid="post-container"><span>nsfw</span><a data-click-id="body" href="/r/aww/comments/n1/nsfw/">X</a></div>
+<div data-testid="post-container"><a data-click-id="body" href="/r/aww/comments/def456/a_cat/">Cat</a></div>
+</body></html>
+"""
+
+POST_HTML = """
+<html><body>
+<a class="author-name">op_user</a>
+<shreddit-comment author="alice" thingid="t1_a" score="12" permalink="/r/aww/comments/abc123/a_cute_dog/a/">
+  <div id="-post-rtjson-content"><p>So cute!</p></div>
+  <shreddit-comment author="bob" thingid="t1_b" parentid="t1_a" score="3"
+                    permalink="/r/aww/comments/abc123/a_cute_dog/b/">
+    <div id="-post-rtjson-content"><p>Agreed</p></div>
+  </shreddit-comment>
+</shreddit-comment>
+<shreddit-comment author="carol" thingid="t1_c" permalink="/r/aww/comments/abc123/a_cute_dog/c/">
+  <div>no text</div>
+</shreddit-comment>
+<shreddit-comment is-comment-deleted="" thingid="t1_d"><div id="-post-rtjson-content"><p>gone</p></div>
+</shreddit-comment>
+</body></html>
+"""
+
+
+class TestPageParser(unittest.TestCase):
+    """
+    Unit Test class for the offline page parser and the page archive.
+
+    Methods:
+        test_parse_post_page: Test the extraction of the post and its comments from a post page.
+        test_archive_round_trip: Test that archived pages can be read back through the index.
+        test_parse_archive: Test parsing an archive in a process pool and storing the records.
+    """
+    def test_parse_post_page(self):
+        post, df_comments = parse_post_page(POST_HTML, POST_HREF)
+
+        self.assertEqual(post, {'post_id': 'abc123', 'author': 'op_user', 'subreddit': 'aww', 'title': 'a_cute_dog',
+                                'permalink': POST_HREF})
+        self.assertEqual(sorted(df_comments.to_dicts(), key=lambda comment: comment['thing_id']), [
+            {'post_id': 'abc123', 'text': 'So cute!', 'subreddit': 'aww', 'author': 'alice', 'upvotes': 12,
+             'thing_id': 't1_a', 'parent_id': ''},
+            {'post_id': 'abc123', 'text': 'Agreed', 'subreddit': 'aww', 'author': 'bob', 'upvotes': 3,
+             'thing_id': 't1_b', 'parent_id': 't1_a'},
+        ])
+
+    def test_archive_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            archive = PageArchive(root)
+            archive.add_page(LISTING_PAGE, 'https://www.reddit.com/r/aww', 'aww', LISTING_HTML)
+            archive.add_page(POST_PAGE, POST_HREF, 'aww', POST_HTML, post_id='abc123')
+
+            entries = list(archive.entries(POST_PAGE))
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]['post_id'], 'abc123')
+            self.assertEqual(archive.read_page(entries[0]), POST_HTML)
+            self.assertEqual(len(list(archive.entries())), 2)
+
+    def test_parse_archive(self):
+        with tempfile.TemporaryDirectory() as root:
+            archive = PageArchive(root)
+            archive.add_page(POST_PAGE, POST_HREF, 'aww', POST_HTML, post_id='abc123')
+            archive.add_page(POST_PAGE, 'https://www.reddit.com/r/aww/comments/def456/a_cat/', 'aww',
+                             '<html><body></body></html>', post_id='def456')
+
+            db_client = MagicMock()
+            stats = parse_archive(root, db_client, processes=2)
+
+            self.assertEqual(stats.posts, 2)
+            self.assertEqual(stats.comments, 2)
+            self.assertEqual(db_client.upsert_data.call_count, 2)
+            self.assertEqual(db_client.upsert_frame.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
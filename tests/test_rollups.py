@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src.rollups import SentimentRollups, polarity, rollup_keys, rollup_stats
+
+
+class TestRollups(unittest.TestCase):
+    """
+    Unit Test class for the sentiment rollups.
+
+    Methods:
+        setUp: Create two scored comments of one post.
+        test_rollup_keys: Test the keys of a document per dimension.
+        test_increments: Test that the increments of a batch are summed up per dimension and key.
+        test_rollup_stats: Test the statistics derived from the totals.
+        test_add: Test that the increments are upserted with one bulk write per dimension.
+        test_add_upsert_race: Test that increments lost to a concurrent upsert of the same key are applied again.
+    """
+    def setUp(self):
+        self.stored = ObjectId.from_datetime(datetime(2023, 5, 1, 12, tzinfo=timezone.utc))
+        self.scored = [
+            ({'_id': self.stored, 'subreddit': 'aww', 'post_id': 'p1', 'author': 'a', 'upvotes': 3},
+             {'label': 'positive', 'score': 0.8}),
+            ({'_id': self.stored, 'subreddit': 'aww', 'post_id': 'p1', 'author': 'b', 'upvotes': 1},
+             {'label': 'negative', 'score': 0.6}),
+        ]
+        self.rollups = SentimentRollups()
+
+    def test_rollup_keys(self):
+        self.assertEqual(rollup_keys(self.scored[0][0]), {'subreddit': 'aww', 'post': 'p1', 'author': 'a',
+                                                          'day': '2023-05-01'})
+        self.assertEqual(rollup_keys({'_id': 1, 'subreddit': 'aww', 'author': ''}), {'subreddit': 'aww'})
+        self.assertEqual(polarity({'label': 'Negative', 'score': 0.5}), -0.5)
+        self.assertEqual(polarity({'label': 'neutral', 'score': 0.9}), 0)
+
+    def test_increments(self):
+        increments = self.rollups.increments('comments', self.scored)
+
+        self.assertEqual(set(increments), {('subreddit', 'aww'), ('post', 'p1'), ('author', 'a'), ('author', 'b'),
+                                           ('day', '2023-05-01')})
+        post = increments[('post', 'p1')]
+        self.assertEqual(post['comments.count'], 2)
+        self.assertEqual(post['comments.labels.positive'], 1)
+        self.assertEqual(post['comments.labels.negative'], 1)
+        self.assertAlmostEqual(post['comments.score_sum'], 1.4)
+        self.assertAlmostEqual(post['comments.weighted_polarity_sum'], 3 * 0.8 - 0.6)
+        self.assertEqual(post['comments.weight_sum'], 4)
+
+    def test_rollup_stats(self):
+        totals = {key.split('.', 1)[1]: value for key, value
+                  in self.rollups.increments('comments', self.scored)[('post', 'p1')].items()}
+        totals['labels'] = {'positive': totals.pop('labels.positive'), 'negative': totals.pop('labels.negative')}
+
+        stats = rollup_stats(totals)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['label_shares'], {'positive': 0.5, 'negative': 0.5})
+        self.assertAlmostEqual(stats['score_mean'], 0.7)
+        self.assertAlmostEqual(stats['score_variance'], 0.01)
+        self.assertAlmostEqual(stats['polarity_mean'], 0.1)
+        self.assertAlmostEqual(stats['weighted_polarity_mean'], 0.45)
+
+    def test_add(self):
+        db_client = MagicMock()
+        self.rollups.add(db_client, 'comments', self.scored, 'v1')
+
+        collections = [call.args[0] for call in db_client.db.__getitem__.call_args_list]
+        self.assertEqual(sorted(collections), ['rollups_author', 'rollups_day', 'rollups_post', 'rollups_subreddit'])
+        operations = [operation for call in db_client.db.__getitem__.return_value.bulk_write.call_args_list
+                      for operation in call.args[0]]
+        self.assertEqual(len(operations), 5)
+        self.assertTrue(all(operation._filter['version'] == 'v1' and operation._upsert for operation in operations))
+
+    def test_add_upsert_race(self):
+        col = MagicMock()
+        operations = [UpdateOne({'key': 'a'}, {'$inc': {'n': 1}}, upsert=True),
+                      UpdateOne({'key': 'b'}, {'$inc': {'n': 1}}, upsert=True)]
+        col.bulk_write.side_effect = [BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000}]}), None]
+
+        self.rollups._bulk_write(col, operations)
+        self.assertEqual(col.bulk_write.call_args.args[0], [operations[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,14 @@
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
 import polars
-from selenium.common import WebDriverException
+from selenium.common import TimeoutException, WebDriverException
 
 from src import config
+from src.extraction import LISTING_POST_XPATH
 from src.scraper import SubredditScraper
+from src.throttle import HostScheduler, RateLimited
 
 
 class TestSubredditScraper(unittest.TestCase):
@@ -23,8 +26,12 @@ class TestSubredditScraper(unittest.TestCase):
         test_extract_post_data: Test the extract_post_data method of the SubredditScraper class.
         test_process_post: Test the process_post method of the SubredditScraper class.
         test_process_post_with_exception: Test the process_post method of the SubredditScraper class when an exception is raised.
+        test_process_post_with_retry: Test that timed out and rate limited posts are retried with backoff.
         test_extract_author: Test the extract_author method of the SubredditScraper class.
         test_get_subreddit_url: Test the get_subreddit_url method of the SubredditScraper class.
+        test_extract_comments_data_fallback: Test that the per-element extraction is used if the bulk script fails.
+        test_visit_posts_after_written: Test that a post is marked as done only once its documents are stored.
+        test_visit_posts_stopped: Test that a stopped scraper leaves the remaining posts open.
     """
     @classmethod
     def setUpClass(cls):
@@ -34,7 +41,7 @@ class TestSubredditScraper(unittest.TestCase):
 
     @patch("src.scraper.get_driver")
     @patch("src.scraper.handle_cookie_banner")
-    @patch("src.scraper.scroll_to_bottom")
+    @patch("src.scraper.scroll_until")
     @patch("src.scraper.WebDriverWait")
     def test_scrape_subreddit(self, mock_wait, mock_scroll, mock_handle_cookie, mock_get_driver):
         subreddit_id = 'test_subreddit'
@@ -49,7 +56,9 @@ class TestSubredditScraper(unittest.TestCase):
         mock_get_driver.assert_called_once_with(self.driver_options)
         driver_mock.get.assert_called_once_with(self.subreddit_scraper.get_subreddit_url(subreddit_id))
         mock_handle_cookie.assert_called_once_with(driver_mock)
-        mock_scroll.assert_called_once_with(driver_mock, config.SCROLL_TIME)
+        mock_scroll.assert_called_once_with(driver_mock, LISTING_POST_XPATH, target_count=max_posts,
+                                            max_time=config.SCROLL_TIME, settle_time=config.SCROLL_SETTLE_TIME,
+                                            poll_interval=config.SCROLL_POLL_INTERVAL)
         self.subreddit_scraper.extract_post_data.assert_called_once_with(driver_mock, subreddit_id, max_posts)
 
     @patch("src.scraper.WebDriverWait")
@@ -67,10 +76,11 @@ class TestSubredditScraper(unittest.TestCase):
         self.subreddit_scraper.process_post.assert_called()
 
     @patch('src.scraper.config')
-    @patch('src.scraper.pl')
     @patch('src.scraper.WebDriverWait')
-    def test_process_post(self, mock_wait, mock_pl, mock_config):
+    def test_process_post(self, mock_wait, mock_config):
         mock_scraper = MagicMock()
+        mock_scraper.known_items = None
+        mock_scraper.writer = None
         mock_scraper.extract_author.return_value = "author"
 
         test_df = polars.DataFrame(
@@ -103,7 +113,10 @@ class TestSubredditScraper(unittest.TestCase):
         driver_mock.get.assert_called_once_with(href)
         mock_scraper.extract_author.assert_called_once_with(driver_mock)
         mock_scraper.extract_comments_data.assert_called_once_with(driver_mock, 'post_id')
-        mock_db_client.insert_many_data.assert_any_call(mock_config.COMMENTS_COLLECTION, test_df.to_dicts())
+        mock_db_client.upsert_frame.assert_called_once_with(mock_config.COMMENTS_COLLECTION, test_df, 'thing_id')
+        mock_db_client.upsert_data.assert_called_once_with(mock_config.POSTS_COLLECTION, {'post_id': 'post_id'}, {
+            'post_id': 'post_id', 'author': 'author', 'subreddit': 'test_subreddit', 'title': 'title',
+            'permalink': href})
 
     def test_process_post_with_exception(self):
         mock_scraper = MagicMock()
@@ -112,11 +125,36 @@ class TestSubredditScraper(unittest.TestCase):
 
         href = 'https://www.reddit.com/r/test_subreddit/comments/post_id/title'
 
-        SubredditScraper.process_post(mock_scraper, driver_mock, href)
+        with self.assertRaises(WebDriverException):
+            SubredditScraper.process_post(mock_scraper, driver_mock, href)
 
         driver_mock.get.assert_called_once_with(href)
         driver_mock.refresh.assert_called_once()
 
+    @patch('src.scraper.backoff_delay', return_value=0)
+    def test_process_post_with_retry(self, mock_backoff):
+        scheduler = HostScheduler(rate=1000, burst=10, initial_concurrency=4)
+        scraper = SubredditScraper(self.driver_options, self.db_client, scheduler=scheduler)
+        scraper.process_post = MagicMock(side_effect=[TimeoutException(), RateLimited(), True])
+        href = 'https://www.reddit.com/r/test_subreddit/comments/post_id/title'
+        scheduler.rate_limit_pause = 0
+
+        self.assertTrue(scraper.process_post_with_retry(MagicMock(), href))
+        self.assertEqual(scraper.process_post.call_count, 3)
+        self.assertEqual([call.args[0] for call in mock_backoff.call_args_list], [0, 1])
+        # halved twice and increased once by the successful attempt
+        self.assertEqual(scheduler.concurrency(href), 2)
+
+        # a failed page load shrinks the limit like a timeout before the post is retried
+        scraper.scheduler = HostScheduler(rate=1000, burst=10, initial_concurrency=4)
+        scraper.process_post = MagicMock(side_effect=[WebDriverException(), True])
+        self.assertTrue(scraper.process_post_with_retry(MagicMock(), href))
+        self.assertEqual(scraper.scheduler.concurrency(href), 2.5)
+
+        scraper.process_post = MagicMock(return_value=False)
+        self.assertFalse(scraper.process_post_with_retry(MagicMock(), href))
+        self.assertEqual(scraper.process_post.call_count, config.POST_RETRIES + 1)
+
     @patch("src.scraper.WebDriverWait")
     def test_extract_author(self, mock_wait):
         driver_mock = MagicMock()
@@ -131,6 +169,43 @@ class TestSubredditScraper(unittest.TestCase):
         expected_url = 'https://www.reddit.com/r/test_subreddit'
         self.assertEqual(self.subreddit_scraper.get_subreddit_url(subreddit_id), expected_url)
 
+    @patch("src.scraper.scroll_until")
+    @patch("src.scraper.WebDriverWait")
+    def test_extract_comments_data_fallback(self, mock_wait, mock_scroll):
+        driver_mock = MagicMock()
+        driver_mock.execute_script.side_effect = Exception("script error")
+        fallback_df = polars.DataFrame({'text': ['comment text']})
+
+        with patch.object(SubredditScraper, 'process_comments', return_value=fallback_df) as mock_process:
+            result = self.subreddit_scraper.extract_comments_data(driver_mock, 'post_id')
+
+        mock_process.assert_called_once_with(driver_mock.find_elements.return_value, 'post_id')
+        self.assertEqual(result.to_dicts(), fallback_df.to_dicts())
+
+    def test_visit_posts_after_written(self):
+        frontier = MagicMock()
+        writer = MagicMock()
+        scraper = SubredditScraper(self.driver_options, self.db_client, frontier=frontier, writer=writer)
+        scraper.process_post_with_retry = MagicMock(side_effect=[True, True, False])
+
+        scraper.visit_posts(MagicMock(), 'aww', [('href1', 1), ('href2', 2), ('href3', 3)])
+        frontier.mark_done.assert_not_called()
+        frontier.mark_failed.assert_called_once_with('href3')
+
+        callbacks = [call.args[0] for call in writer.when_written.call_args_list]
+        callbacks[0](True)
+        callbacks[1](False)
+        frontier.mark_done.assert_called_once_with('href1')
+        self.assertEqual([call.args[0] for call in frontier.mark_failed.call_args_list], ['href3', 'href2'])
+
+    def test_visit_posts_stopped(self):
+        stopped = threading.Event()
+        scraper = SubredditScraper(self.driver_options, self.db_client, stopped=stopped)
+        scraper.process_post_with_retry = MagicMock(side_effect=lambda *args, **kwargs: stopped.set())
+
+        scraper.visit_posts(MagicMock(), 'aww', [('href1', 1), ('href2', 2), ('href3', 3)])
+        scraper.process_post_with_retry.assert_called_once()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from src.sentiment_cache import SentimentCache, cache_key
+
+VERSION = 'tiny/xlm-roberta@test/preprocessing-1/torch'
+
+
+class TestSentimentCache(unittest.TestCase):
+    """
+    Unit Test class for the content-addressed SentimentCache.
+
+    Methods:
+        test_cache_key: Test that the key depends on the text and the version.
+        test_lru_eviction: Test that the least recently used sentiments are evicted from memory.
+        test_persistence: Test that sentiments are found on disk by another cache instance.
+        test_hit_rate: Test the hit counters and the summary.
+    """
+    def test_cache_key(self):
+        self.assertEqual(cache_key('this', VERSION), cache_key('this', VERSION))
+        self.assertNotEqual(cache_key('this', VERSION), cache_key('This', VERSION))
+        self.assertNotEqual(cache_key('this', VERSION), cache_key('this', 'tiny/xlm-roberta@other/preprocessing-1'))
+
+    def test_lru_eviction(self):
+        cache = SentimentCache(path=None, max_entries=2)
+        cache.put_many({b'a': {'label': 'positive', 'score': 0.9}, b'b': {'label': 'neutral', 'score': 0.5}})
+        cache.get_many([b'a'])
+        cache.put_many({b'c': {'label': 'negative', 'score': 0.7}})
+
+        self.assertEqual(set(cache.get_many([b'a', b'b', b'c'])), {b'a', b'c'})
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache', 'sentiments.sqlite3')
+            cache = SentimentCache(path=path, max_entries=10)
+            cache.put_many({b'a': {'label': 'positive', 'score': 0.9}})
+            cache.close()
+
+            cache = SentimentCache(path=path, max_entries=10)
+            self.assertEqual(cache.get_many([b'a', b'b']), {b'a': {'label': 'positive', 'score': 0.9}})
+            self.assertEqual(cache.get_many([b'a']), {b'a': {'label': 'positive', 'score': 0.9}})
+            self.assertEqual((cache.memory_hits, cache.disk_hits, cache.misses), (1, 1, 1))
+            cache.close()
+
+    def test_hit_rate(self):
+        cache = SentimentCache(path=None, max_entries=10)
+        self.assertIsNone(cache.hit_rate)
+        self.assertEqual(cache.summary(), "no lookups")
+
+        # the repeated miss is scored once, its second occurrence is a hit
+        cache.get_many([b'a', b'a', b'b'])
+        cache.put_many({b'a': {'label': 'positive', 'score': 0.9}, b'b': {'label': 'neutral', 'score': 0.5}})
+        cache.get_many([b'a'])
+
+        self.assertEqual(cache.hit_rate, 0.5)
+        self.assertEqual(cache.summary(), "50.0% hits (2 in memory, 0 on disk, 2 misses)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from src.sentiment_controller import SentimentController
+
+
+class TestSentimentController(unittest.TestCase):
+    """
+    Unit Test class for the SentimentController with a mocked pipeline and database.
+
+    Methods:
+        setUp: Create a controller with a mocked sentiment pipeline and database client.
+        test_bulk_write_batches: Test that streamed documents are analyzed and written back in chunks of the batch size.
+        test_version_watermark: Test that only documents of another version are selected and skipped ones are counted.
+        test_batch_failure: Test that documents without text are left out and failed batches are bisected.
+        test_concurrent_scoring: Test that only the documents modified by this batch are counted and rolled up.
+        test_transient_error_retry: Test that a batch is retried after a transient error.
+        test_permanent_error: Test that a non-transient error is raised without a retry.
+    """
+    def setUp(self):
+        with patch('src.sentiment_controller.SentimentPipeline') as pipeline:
+            pipeline.return_value.get_sentiments.side_effect = \
+                lambda texts, collection: [{'label': 'positive', 'score': len(text)} for text in texts]
+            pipeline.return_value.version_info = {'model': 'model', 'model_revision': 'abc',
+                                                  'preprocessing_version': 1, 'version': 'model@abc/preprocessing-1'}
+            pipeline.return_value.version = 'model@abc/preprocessing-1'
+            self.db_client = MagicMock()
+            self.db_client.__enter__.return_value = self.db_client
+            self.controller = SentimentController(self.db_client, batch_size=2, max_retries=2, rollups=False)
+
+        self.col = self.db_client.db.__getitem__.return_value
+        self.db_client.iter_data.return_value = iter([{'_id': i, 'text': 'x' * i} for i in range(5)])
+        self.col.bulk_write.side_effect = lambda operations, ordered: MagicMock(modified_count=len(operations))
+        self.col.count_documents.return_value = 7
+
+    def test_bulk_write_batches(self):
+        self.assertEqual(self.controller.write_sentiments_to_documents('comments', 'text'), 5)
+
+        batches = [call.args[0] for call in self.col.bulk_write.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        version = 'model@abc/preprocessing-1'
+        write_id = batches[0][1]._doc['$set']['sentiment']['write_id']
+        sentiment = {'label': 'positive', 'score': 1, 'model': 'model', 'model_revision': 'abc',
+                     'preprocessing_version': 1, 'version': version, 'write_id': write_id}
+        self.assertEqual(batches[0][1], UpdateOne({'_id': 1, 'sentiment.version': {'$ne': version}},
+                                                  {'$set': {'sentiment': sentiment}}))
+        self.assertNotEqual(batches[1][0]._doc['$set']['sentiment']['write_id'], write_id)
+        self.col.find.assert_not_called()
+        self.assertTrue(all(call.kwargs == {'ordered': False} for call in self.col.bulk_write.call_args_list))
+        self.assertEqual(self.db_client.iter_data.call_args.kwargs['projection'], {'_id': 1, 'text': 1})
+
+    def test_version_watermark(self):
+        self.controller.write_sentiments_to_documents('comments', 'text')
+
+        self.assertEqual(self.db_client.iter_data.call_args.args,
+                         ('comments', {'sentiment.version': {'$ne': 'model@abc/preprocessing-1'}}))
+        self.col.count_documents.assert_called_once_with({'sentiment.version': 'model@abc/preprocessing-1'})
+        self.assertEqual(self.controller.counts['comments'], {'scored': 5, 'failed': 0, 'skipped': 7})
+        self.assertEqual(self.controller.summary(), "comments: 5 scored, 0 failed, 7 skipped")
+
+    def test_batch_failure(self):
+        pipeline = self.controller.sentiment_pipeline
+        batches = []
+
+        def get_sentiments(texts, collection):
+            batches.append(texts)
+            if 'bad' in texts:
+                raise RuntimeError('inference failed')
+            return [{'label': 'positive', 'score': len(text)} for text in texts]
+
+        pipeline.get_sentiments.side_effect = get_sentiments
+        documents = [{'_id': 1, 'text': 'x'}, {'_id': 2, 'text': None}, {'_id': 3, 'text': 'xyz'},
+                     {'_id': 4, 'text': 'bad'}, {'_id': 5}, {'_id': 6, 'text': 'ab'}]
+
+        scored = self.controller.analyze('comments', 'text', documents)
+        self.assertEqual([(document['_id'], sentiment['score']) for document, sentiment in scored],
+                         [(1, 1), (3, 3), (6, 2)])
+        self.assertEqual(batches, [['x', 'xyz', 'bad', 'ab'], ['x', 'xyz'], ['bad', 'ab'], ['bad'], ['ab']])
+
+    def test_concurrent_scoring(self):
+        # the document 2 was scored by another run in the meantime
+        self.col.bulk_write.side_effect = lambda operations, ordered: MagicMock(modified_count=2)
+        self.col.find.side_effect = lambda query, projection: [{'_id': 1}, {'_id': 3}]
+        self.controller.rollups = MagicMock()
+        documents = [{'_id': i, 'text': 'x' * i} for i in (1, 2, 3)]
+
+        self.assertEqual(self.controller.score_documents(self.db_client, 'comments', 'text', documents), 2)
+
+        query = self.col.find.call_args.args[0]
+        self.assertEqual(query['_id'], {'$in': [1, 2, 3]})
+        self.assertEqual(query['sentiment.write_id'],
+                         self.col.bulk_write.call_args.args[0][0]._doc['$set']['sentiment']['write_id'])
+        scored = self.controller.rollups.add.call_args.args[2]
+        self.assertEqual([document['_id'] for document, _ in scored], [1, 3])
+
+    @patch('src.sentiment_controller.backoff_delay', return_value=0)
+    def test_transient_error_retry(self, mock_backoff):
+        results = [AutoReconnect('primary stepped down'), MagicMock(modified_count=2)]
+
+        def bulk_write(operations, ordered):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.col.bulk_write.side_effect = bulk_write
+        operations = [UpdateOne({'_id': 1}, {'$set': {}}), UpdateOne({'_id': 2}, {'$set': {}})]
+
+        self.assertEqual(self.controller.write_batch(self.db_client, 'comments', operations), 2)
+        self.assertEqual(self.col.bulk_write.call_count, 2)
+
+    def test_permanent_error(self):
+        self.col.bulk_write.side_effect = OperationFailure('not authorized', code=13)
+
+        with self.assertRaises(OperationFailure):
+            self.controller.write_batch(self.db_client, 'comments', [UpdateOne({'_id': 1}, {'$set': {}})])
+        self.assertEqual(self.col.bulk_write.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from src.sentiment_daemon import SentimentDaemon
+
+
+class TestSentimentDaemon(unittest.TestCase):
+    """
+    Unit Test class for the SentimentDaemon with a mocked controller and database.
+
+    Methods:
+        setUp: Create a daemon with a mocked controller and database client.
+        test_watch_micro_batches: Test that inserts from a change stream are scored in batches with their resume token.
+        test_poll_watermark: Test that polled documents are scored and the poll continues after the stored watermark.
+        test_fallback_to_poll: Test that the daemon polls if the server does not support change streams.
+        test_error_stops_daemon: Test that an error in a tailing thread stops the daemon and is raised.
+    """
+    def setUp(self):
+        self.controller = MagicMock()
+        self.controller.score_documents.side_effect = lambda db_client, collection, field, documents: len(documents)
+        self.db_client = MagicMock()
+        self.controller.db_client.__enter__.return_value = self.db_client
+        self.daemon = SentimentDaemon(self.controller, features=[('comments', 'text')], batch_size=2, max_wait=60,
+                                      poll_interval=0, watermarks='watermarks')
+
+        self.collections = {'comments': MagicMock(), 'watermarks': MagicMock()}
+        self.db_client.db.__getitem__.side_effect = lambda name: self.collections[name]
+        self.collections['watermarks'].find_one.return_value = None
+
+    def saved_watermarks(self):
+        return [call.args[1]['$set'] for call in self.collections['watermarks'].update_one.call_args_list]
+
+    def test_watch_micro_batches(self):
+        changes = [{'fullDocument': {'_id': i, 'text': f'comment {i}'}} for i in range(3)]
+
+        def try_next():
+            if changes:
+                return changes.pop(0)
+            self.daemon.stop()
+
+        stream = self.collections['comments'].watch.return_value
+        stream.__enter__.return_value = stream
+        stream.try_next.side_effect = try_next
+        stream.resume_token = {'_data': 'token'}
+
+        self.assertEqual(self.daemon.run(), {'comments': 3})
+        batches = [call.args[3] for call in self.controller.score_documents.call_args_list]
+        self.assertEqual([[document['_id'] for document in batch] for batch in batches], [[0, 1], [2]])
+        self.assertEqual(self.saved_watermarks()[-1]['resume_token'], {'_data': 'token'})
+
+    def test_poll_watermark(self):
+        last_id = ObjectId()
+        self.collections['watermarks'].find_one.return_value = {'_id': 'comments', 'last_id': last_id}
+        self.collections['comments'].watch.side_effect = OperationFailure('replica sets only', code=40573)
+        new_ids = [ObjectId() for _ in range(3)]
+        polls = [[{'_id': new_ids[0], 'text': 'a'}, {'_id': new_ids[1], 'text': 'b'}],
+                 [{'_id': new_ids[2], 'text': 'c'}]]
+
+        def find(query, projection):
+            if len(polls) == 1:
+                self.daemon.stop()
+            cursor = MagicMock()
+            cursor.sort.return_value.limit.return_value = polls.pop(0)
+            return cursor
+
+        self.collections['comments'].find.side_effect = find
+
+        self.assertEqual(self.daemon.run(), {'comments': 3})
+        queries = [call.args[0] for call in self.collections['comments'].find.call_args_list]
+        self.assertEqual(queries[0]['_id']['$gt'], last_id)
+        self.assertEqual(queries[1]['_id']['$gt'], new_ids[1])
+        self.assertEqual([watermark['last_id'] for watermark in self.saved_watermarks()], [new_ids[1], new_ids[2]])
+
+    def test_fallback_to_poll(self):
+        self.collections['comments'].watch.side_effect = OperationFailure('replica sets only', code=40573)
+        with patch.object(self.daemon, 'poll') as poll:
+            self.daemon.tail(self.db_client, 'comments', 'text')
+        poll.assert_called_once_with(self.db_client, 'comments', 'text')
+
+    def test_error_stops_daemon(self):
+        self.collections['comments'].watch.side_effect = OperationFailure('not authorized', code=13)
+        with self.assertRaises(OperationFailure):
+            self.daemon.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
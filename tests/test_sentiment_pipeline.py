@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import torch
+from huggingface_hub.utils import LocalEntryNotFoundError
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from tokenizers.processors import TemplateProcessing
+from transformers import PreTrainedTokenizerFast, XLMRobertaConfig, XLMRobertaForSequenceClassification
+
+from src.sentiment_cache import SentimentCache
+from src.sentiment_pipeline import SentimentPipeline, length_buckets, resolve_model
+
+WORDS = ['this', 'is', 'great', 'awful', 'fine', 'user', 'subreddit', 'link', 'lol']
+
+
+def tiny_pipeline(backend='torch', onnx_dir=None):
+    """
+    Create a SentimentPipeline with a tiny randomly initialized XLM-R model and a word level fast tokenizer, so the
+    batching and the backends can be tested without downloading the model.
+    """
+    vocab = {'<s>': 0, '<pad>': 1, '</s>': 2, '<unk>': 3, **{word: i + 4 for i, word in enumerate(WORDS)}}
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token='<unk>'))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.post_processor = TemplateProcessing(single='<s> $A </s>', special_tokens=[('<s>', 0), ('</s>', 2)])
+
+    config = XLMRobertaConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+                              intermediate_size=32, max_position_embeddings=64,
+                              id2label={0: 'negative', 1: 'neutral', 2: 'positive'},
+                              label2id={'negative': 0, 'neutral': 1, 'positive': 2})
+    torch.manual_seed(0)
+
+    pipeline = SentimentPipeline.__new__(SentimentPipeline)
+    pipeline.model_path = 'tiny/xlm-roberta'
+    pipeline.revision = 'test'
+    pipeline.onnx_dir = onnx_dir
+    pipeline.tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token='<s>', eos_token='</s>',
+                                                 pad_token='<pad>', unk_token='<unk>')
+    pipeline.config = config
+    pipeline.model = XLMRobertaForSequenceClassification(config).eval()
+    pipeline.use_backend(backend)
+    pipeline.cache = None
+    return pipeline
+
+
+class TestSentimentPipeline(unittest.TestCase):
+    """
+    Unit Test class for the batched inference of the SentimentPipeline with a tiny model.
+
+    Methods:
+        test_length_buckets: Test that inputs are grouped by length within the token budget and batch size.
+        test_batched_sentiments: Test that batched and padded inference gives the sentiments of single inference.
+        test_preprocess: Test that user names, subreddits and links are anonymized.
+        test_int8_backend: Test that the quantized backend scores close to fp32.
+        test_onnx_backend: Test that the ONNX backend gives the fp32 sentiments and exports the graph only once.
+        test_unknown_backend: Test that an unknown backend is rejected.
+        test_cached_sentiments: Test that cached and repeated texts are not scored again.
+        test_resolve_model: Test that a cached model is resolved without the hub and only a missing one is downloaded.
+    """
+    def test_length_buckets(self):
+        lengths = [3, 10, 4, 10, 3, 30]
+
+        batches = length_buckets(lengths, max_tokens=20, max_batch_size=3)
+        self.assertEqual(batches, [[5], [1, 3], [2, 0, 4]])
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(len(lengths))))
+        self.assertEqual(length_buckets([], max_tokens=20, max_batch_size=3), [])
+
+    def test_batched_sentiments(self):
+        pipeline = tiny_pipeline()
+        texts = ['this is great', 'lol', 'this is awful this is awful u/someone', 'fine', 'great great great great']
+
+        expected = []
+        for text in texts:
+            with torch.no_grad():
+                logits = pipeline.model(**pipeline.tokenizer(pipeline.preprocess(text, type='comments'),
+                                                             return_tensors='pt')).logits[0]
+            probabilities = torch.softmax(logits, dim=-1)
+            expected.append((pipeline.config.id2label[int(probabilities.argmax())], float(probabilities.max())))
+
+        sentiments = pipeline.get_sentiments(texts, max_tokens=16, max_batch_size=4)
+        self.assertEqual([sentiment['label'] for sentiment in sentiments], [label for label, _ in expected])
+        for sentiment, (_, score) in zip(sentiments, expected):
+            self.assertAlmostEqual(sentiment['score'], score, places=3)
+        self.assertEqual(pipeline.get_tokenized_sentiment('lol'), sentiments[1])
+
+    def test_preprocess(self):
+        pipeline = tiny_pipeline()
+        self.assertEqual(pipeline.preprocess('u/someone in r/aww posted https://i.redd.it/x.png', type='comments'),
+                         'user in subreddit posted link')
+
+    def test_int8_backend(self):
+        texts = ['this is great', 'lol', 'fine fine is']
+        expected = tiny_pipeline().get_sentiments(texts)
+        pipeline = tiny_pipeline('torch-int8')
+        sentiments = pipeline.get_sentiments(texts)
+
+        self.assertIsInstance(pipeline.model.classifier.dense, torch.nn.quantized.dynamic.Linear)
+        for sentiment, fp32 in zip(sentiments, expected):
+            self.assertIn(sentiment['label'], ['negative', 'neutral', 'positive'])
+            self.assertAlmostEqual(sentiment['score'], fp32['score'], delta=0.05)
+
+    def test_onnx_backend(self):
+        texts = ['this is great', 'lol', 'this is awful this is awful', 'fine']
+        expected = tiny_pipeline().get_sentiments(texts)
+        with tempfile.TemporaryDirectory() as onnx_dir:
+            pipeline = tiny_pipeline('onnx', onnx_dir)
+            self.assertTrue(os.path.exists(os.path.join(onnx_dir, 'tiny--xlm-roberta@test.onnx')))
+            self.assertIsNone(pipeline.model)
+            sentiments = pipeline.get_sentiments(texts, max_tokens=16)
+
+            with patch('src.sentiment_pipeline.export_onnx') as export:
+                tiny_pipeline('onnx', onnx_dir)
+            export.assert_not_called()
+
+        self.assertEqual([sentiment['label'] for sentiment in sentiments], [fp32['label'] for fp32 in expected])
+        for sentiment, fp32 in zip(sentiments, expected):
+            self.assertAlmostEqual(sentiment['score'], fp32['score'], places=3)
+        self.assertEqual(pipeline.version_info['backend'], 'onnx')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            tiny_pipeline('tensorrt')
+
+    def test_cached_sentiments(self):
+        pipeline = tiny_pipeline()
+        expected = pipeline.get_sentiments(['this is great', 'lol', 'fine'])
+        pipeline.cache = SentimentCache(path=None, max_entries=10)
+
+        with patch.object(pipeline, 'infer', wraps=pipeline.infer) as infer:
+            self.assertEqual(pipeline.get_sentiments(['this is great', 'lol', 'this is great']),
+                             [expected[0], expected[1], expected[0]])
+            sentiments = pipeline.get_sentiments(['lol', 'fine'])
+        self.assertEqual(sentiments, expected[1:])
+        self.assertEqual([call.args[0] for call in infer.call_args_list], [['this is great', 'lol'], ['fine']])
+        self.assertEqual((pipeline.cache.memory_hits, pipeline.cache.misses), (2, 3))
+
+        # a returned sentiment is a copy of the cached one
+        sentiments[0]['version'] = 'test'
+        self.assertNotIn('version', pipeline.get_sentiments(['lol'])[0])
+
+        # another backend does not reuse the sentiments of the fp32 model
+        pipeline.backend = 'torch-int8'
+        with patch.object(pipeline, 'infer', wraps=pipeline.infer) as infer:
+            pipeline.get_sentiments(['lol'])
+        self.assertEqual(infer.call_args.args[0], ['lol'])
+
+    def test_resolve_model(self):
+        snapshot = os.path.join('hub', 'models--tiny--xlm-roberta', 'snapshots', 'abc123')
+        with patch('src.sentiment_pipeline.snapshot_download', return_value=snapshot) as download:
+            self.assertEqual(resolve_model('tiny/xlm-roberta'), (snapshot, 'abc123'))
+        download.assert_called_once_with('tiny/xlm-roberta', revision=None, local_files_only=True)
+
+        with patch('src.sentiment_pipeline.snapshot_download',
+                   side_effect=[LocalEntryNotFoundError('not cached'), snapshot]) as download:
+            self.assertEqual(resolve_model('tiny/xlm-roberta', revision='abc123'), (snapshot, 'abc123'))
+        self.assertFalse(download.call_args.kwargs.get('local_files_only', False))
+
+        with tempfile.TemporaryDirectory() as directory, patch('src.sentiment_pipeline.snapshot_download') as download:
+            self.assertEqual(resolve_model(directory), (directory, None))
+        download.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
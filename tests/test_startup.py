@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.metrics import StartupTimings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Unit Test class for the startup of main.py.
+
+    Methods:
+        test_lazy_imports: Test that importing main.py loads none of the modules of the scraping and sentiment stages.
+        test_startup_timings: Test the recorded phases and their summary.
+    """
+    def test_lazy_imports(self):
+        heavy = ['torch', 'transformers', 'onnxruntime', 'selenium', 'aiohttp', 'polars', 'lxml']
+        # a fresh interpreter, the main.py log file is written to a temporary directory
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run([sys.executable, '-c', f"import sys, main; "
+                                                           f"print([m for m in {heavy!r} if m in sys.modules])"],
+                                    cwd=directory, env={**os.environ, 'PYTHONPATH': ROOT}, capture_output=True,
+                                    text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_startup_timings(self):
+        timings = StartupTimings()
+        self.assertEqual(timings.summary(), "no startup phases recorded")
+
+        timings.record('main imports', 0.25)
+        with timings.measure('sentiment imports'):
+            pass
+        timings.record('main imports', 0.25)
+
+        phases = timings.phases()
+        self.assertEqual(list(phases), ['main imports', 'sentiment imports'])
+        self.assertEqual(phases['main imports'], 0.5)
+        self.assertTrue(timings.summary().startswith("main imports: 0.50s, sentiment imports: 0.00s (total 0.50s)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
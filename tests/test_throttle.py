@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from selenium.common import TimeoutException, WebDriverException
+
+from src.throttle import AdaptiveConcurrency, HostScheduler, RateLimited, TokenBucket, backoff_delay
+
+
+class TestThrottle(unittest.TestCase):
+    """
+    Unit Test class for the throttling primitives.
+
+    Methods:
+        test_token_bucket_burst: Test that the bucket allows a burst and then paces the requests.
+        test_adaptive_concurrency: Test the additive increase and the multiplicative decrease of the limit.
+        test_adaptive_concurrency_blocks: Test that acquire blocks while the limit is reached.
+        test_scheduler_rate_limited: Test that rate limits and failed loads shrink the limit and pause on rate limits.
+        test_scheduler_hosts: Test that every host gets its own limits.
+        test_backoff_delay: Test the bounds of the jittered backoff.
+    """
+    def test_token_bucket_burst(self):
+        bucket = TokenBucket(rate=50, capacity=3)
+        for _ in range(3):
+            self.assertLess(bucket.acquire(), 0.01)
+
+        waited = bucket.acquire()
+        self.assertGreater(waited, 0.01)
+
+    def test_adaptive_concurrency(self):
+        concurrency = AdaptiveConcurrency(initial=4, maximum=8, target_latency=1.0)
+        for _ in range(4):
+            concurrency.on_success(0.1)
+        self.assertGreaterEqual(concurrency.limit, 4.9)
+
+        concurrency.on_congestion()
+        self.assertAlmostEqual(concurrency.limit, 2.5, places=1)
+
+        concurrency.on_success(2.0)
+        self.assertAlmostEqual(concurrency.limit, 1.25, places=1)
+
+        for _ in range(10):
+            concurrency.on_congestion()
+        self.assertEqual(concurrency.limit, 1)
+
+        for _ in range(1000):
+            concurrency.on_success(0.1)
+        self.assertEqual(concurrency.limit, 8)
+
+    def test_adaptive_concurrency_blocks(self):
+        concurrency = AdaptiveConcurrency(initial=1)
+        concurrency.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            concurrency.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+
+        concurrency.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_scheduler_rate_limited(self):
+        scheduler = HostScheduler(rate=1000, burst=10, initial_concurrency=4, rate_limit_pause=0.2)
+        url = 'https://www.reddit.com/r/aww'
+
+        with self.assertRaises(RateLimited):
+            with scheduler.slot(url):
+                raise RateLimited(url)
+        self.assertEqual(scheduler.concurrency(url), 2)
+
+        start = time.monotonic()
+        with scheduler.slot(url):
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        self.assertEqual(scheduler.concurrency(url), 2.5)
+
+        with self.assertRaises(TimeoutException):
+            with scheduler.slot(url):
+                raise TimeoutException()
+        self.assertEqual(scheduler.concurrency(url), 1.25)
+
+        with self.assertRaises(WebDriverException):
+            with scheduler.slot(url):
+                raise WebDriverException("page load failed")
+        self.assertEqual(scheduler.concurrency(url), 1)
+
+    def test_scheduler_hosts(self):
+        scheduler = HostScheduler(rate=1000, burst=10, initial_concurrency=4, rate_limit_pause=0)
+        with self.assertRaises(RateLimited):
+            with scheduler.slot('https://www.reddit.com/r/aww'):
+                raise RateLimited()
+
+        self.assertEqual(scheduler.concurrency('https://www.reddit.com/r/python'), 2)
+        self.assertEqual(scheduler.concurrency('https://old.reddit.com/r/aww'), 4)
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base_delay=1.0, max_delay=5.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5.0, 2 ** attempt))
+
+
+if __name__ == '__main__':
+    unittest.main()
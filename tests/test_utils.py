@@ -1,9 +1,13 @@
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
-from src.utils import get_driver, handle_cookie_banner, scroll_to_bottom, handle_google_credential
+from src.utils import get_driver, handle_cookie_banner, scroll_to_bottom, handle_google_credential, \
+    resolve_geckodriver_path, scroll_until
 
 
 class TestUtils(unittest.TestCase):
@@ -14,7 +18,11 @@ class TestUtils(unittest.TestCase):
         test_get_driver: Test the get_driver function.
         test_handle_cookie_banner: Test the handle_cookie_banner function.
         test_scroll_to_bottom: Test the scroll_to_bottom function.
+        test_scroll_until_target_count: Test that scroll_until stops once the target count is reached.
+        test_scroll_until_settled: Test that scroll_until stops once the page stops growing.
+        test_scroll_until_time_budget: Test that scroll_until stops once the time budget is used up.
         test_handle_google_credential: Test the handle_google_credential function.
+        test_resolve_geckodriver_path_cached: Test that the geckodriver path is resolved once and cached on disk.
     """
     def test_get_driver(self):
         with patch('src.utils.webdriver.Firefox') as mock_firefox:
@@ -40,6 +48,31 @@ class TestUtils(unittest.TestCase):
                 scroll_to_bottom(mock_driver, scroll_time)
                 mock_driver.execute_script.assert_called()
 
+    def test_scroll_until_target_count(self):
+        mock_driver = MagicMock(spec=WebDriver)
+        mock_driver.execute_script.side_effect = [[1000, 5], [2000, 12], [3000, 20]]
+        with patch('src.utils.time.sleep'):
+            count = scroll_until(mock_driver, "//div", target_count=10, max_time=60)
+        self.assertEqual(count, 12)
+        self.assertEqual(mock_driver.execute_script.call_count, 2)
+
+    def test_scroll_until_settled(self):
+        mock_driver = MagicMock(spec=WebDriver)
+        mock_driver.execute_script.side_effect = [[1000, 5], [1000, 5], [1000, 5], [1000, 5]]
+        with patch('src.utils.time.sleep'), patch('src.utils.time.monotonic') as mock_time:
+            mock_time.side_effect = [0, 0, 0.3, 0.6, 1.2]
+            count = scroll_until(mock_driver, "//div", max_time=60, settle_time=1.0)
+        self.assertEqual(count, 5)
+        self.assertEqual(mock_driver.execute_script.call_count, 4)
+
+    def test_scroll_until_time_budget(self):
+        mock_driver = MagicMock(spec=WebDriver)
+        mock_driver.execute_script.side_effect = [[1000 * i, i] for i in range(1, 10)]
+        with patch('src.utils.time.sleep'), patch('src.utils.time.monotonic') as mock_time:
+            mock_time.side_effect = [0, 1, 2, 3]
+            count = scroll_until(mock_driver, "//div", max_time=3)
+        self.assertEqual(count, 3)
+
     def test_handle_google_credential(self):
         with patch('src.utils.webdriver.Firefox') as mock_firefox:
             mock_driver = MagicMock(spec=WebDriver)
@@ -47,6 +80,25 @@ class TestUtils(unittest.TestCase):
             handle_google_credential(mock_driver)
             mock_driver.find_element.assert_called()
 
+    def test_resolve_geckodriver_path_cached(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            binary = os.path.join(tmp_dir, 'geckodriver')
+            open(binary, 'w').close()
+            cache_file = os.path.join(tmp_dir, 'cache', 'geckodriver.json')
+
+            with patch('src.utils.GeckoDriverManager') as mock_manager, patch.dict(os.environ, clear=False) as env:
+                env.pop('GECKODRIVER_PATH', None)
+                mock_manager.return_value.install.return_value = binary
+
+                self.assertEqual(resolve_geckodriver_path(cache_file), binary)
+                resolve_geckodriver_path.cache_clear()
+                self.assertEqual(resolve_geckodriver_path(cache_file), binary)
+
+                mock_manager.return_value.install.assert_called_once()
+                with open(cache_file) as file:
+                    self.assertEqual(json.load(file), {'path': binary})
+            resolve_geckodriver_path.cache_clear()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.work_queue import POST, SUBREDDIT, QueueWorker
+
+
+class TestQueueWorker(unittest.TestCase):
+    """
+    Unit Test class for the QueueWorker with a mocked work queue.
+
+    Methods:
+        setUp: Create a worker with a mocked queue and handler.
+        test_subreddit_item: Test that the posts of a subreddit item are enqueued and the item is completed.
+        test_failed_post_item: Test that a post that could not be scraped is released for a retry.
+        test_exit_when_empty: Test that the worker waits for leased items and stops once the queue is drained.
+    """
+    def setUp(self):
+        self.queue = MagicMock()
+        self.handler = MagicMock()
+        self.worker = QueueWorker(self.queue, self.handler, worker_id='w1', max_posts=5, heartbeat_interval=60,
+                                  poll_interval=0)
+
+    def test_subreddit_item(self):
+        item = {'_id': 'subreddit:aww', 'kind': SUBREDDIT, 'key': 'aww', 'attempts': 1}
+        posts = [('https://www.reddit.com/r/aww/comments/p1/title/', 3)]
+        self.queue.claim.side_effect = [item, None]
+        self.queue.is_drained.return_value = True
+        self.handler.discover_posts.return_value = posts
+
+        self.assertEqual(self.worker.run(exit_when_empty=True), 1)
+
+        self.handler.discover_posts.assert_called_once_with('aww', max_posts=5)
+        self.queue.enqueue_posts.assert_called_once_with('aww', posts)
+        self.queue.complete.assert_called_once_with(item, 'w1')
+        self.queue.leased.assert_called_once_with(item, 'w1', heartbeat_interval=60)
+
+    def test_failed_post_item(self):
+        href = 'https://www.reddit.com/r/aww/comments/p1/title/'
+        item = {'_id': f'post:{href}', 'kind': POST, 'key': href, 'comment_count': 3, 'attempts': 1}
+        self.queue.claim.side_effect = [item, None]
+        self.queue.is_drained.return_value = True
+        self.handler.scrape_post.return_value = False
+
+        self.assertEqual(self.worker.run(exit_when_empty=True), 0)
+
+        self.handler.scrape_post.assert_called_once_with(href, comment_count=3)
+        self.queue.release.assert_called_once()
+        self.queue.complete.assert_not_called()
+        self.assertEqual(self.worker.failed, 1)
+
+    def test_exit_when_empty(self):
+        self.queue.claim.return_value = None
+        self.queue.is_drained.side_effect = [False, False, True]
+
+        self.assertEqual(self.worker.run(exit_when_empty=True), 0)
+        self.assertEqual(self.queue.claim.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
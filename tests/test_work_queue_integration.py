@@ -0,0 +1,102 @@
+import multiprocessing
+import time
+import unittest
+
+from src.database import MongoDBClient
+from src.work_queue import DONE, FAILED, QueueWorker, WorkQueue
+from tests.test_constants import TEST_DATABASE_NAME
+
+QUEUE_COLLECTION = "test_work_queue"
+SUBREDDITS = ['aww', 'python', 'learnpython']
+POSTS_PER_SUBREDDIT = 5
+
+
+class FakeScraper:
+    """
+    Stands in for the SubredditScraper, every subreddit has a few posts and one post always fails.
+    """
+    def discover_posts(self, subreddit, max_posts=None):
+        return [(f"https://www.reddit.com/r/{subreddit}/comments/p{i}/title/", i) for i in range(POSTS_PER_SUBREDDIT)]
+
+    def scrape_post(self, href, comment_count=None):
+        time.sleep(0.01)
+        return not href.endswith('/r/aww/comments/p0/title/')
+
+
+def run_worker(worker_id):
+    with MongoDBClient(database_name=TEST_DATABASE_NAME) as db_client:
+        queue = WorkQueue(db_client, collection=QUEUE_COLLECTION, max_attempts=2)
+        worker = QueueWorker(queue, FakeScraper(), worker_id=worker_id, heartbeat_interval=1, poll_interval=0.1)
+        worker.run(exit_when_empty=True)
+
+
+class TestWorkQueueIntegration(unittest.TestCase):
+    """
+    Integration Test class for the WorkQueue against a local MongoDB.
+
+    Methods:
+        setUp: Create an empty work queue.
+        tearDown: Drop the test database.
+        test_leases: Test that a leased item is not handed out twice until its lease expires.
+        test_release: Test that a released item is retried and given up after the maximum attempts.
+        test_worker_processes: Test that several worker processes drain the queue and process every item once.
+    """
+    def setUp(self):
+        self.client = MongoDBClient(database_name=TEST_DATABASE_NAME).__enter__()
+        self.queue = WorkQueue(self.client, collection=QUEUE_COLLECTION, lease_seconds=1, max_attempts=2)
+        self.queue.reset()
+        self.queue.create_indexes()
+
+    def tearDown(self):
+        self.client.drop_database(TEST_DATABASE_NAME)
+        self.client.close_db_connection()
+
+    def test_leases(self):
+        self.assertEqual(self.queue.enqueue_subreddits(['aww']), 1)
+        self.assertEqual(self.queue.enqueue_subreddits(['aww']), 0)
+
+        item = self.queue.claim('w1')
+        self.assertEqual(item['key'], 'aww')
+        self.assertIsNone(self.queue.claim('w2'))
+        self.assertTrue(self.queue.heartbeat(item, 'w1'))
+
+        time.sleep(1.1)
+        stolen = self.queue.claim('w2')
+        self.assertEqual(stolen['_id'], item['_id'])
+        self.assertFalse(self.queue.heartbeat(item, 'w1'))
+        self.assertFalse(self.queue.complete(item, 'w1'))
+        self.assertTrue(self.queue.complete(stolen, 'w2'))
+        self.assertTrue(self.queue.is_drained())
+
+    def test_release(self):
+        self.queue.enqueue_posts('aww', [('https://www.reddit.com/r/aww/comments/p1/title/', 3)])
+
+        item = self.queue.claim('w1')
+        self.assertEqual(item['comment_count'], 3)
+        self.assertTrue(self.queue.release(item, 'w1', error='timeout'))
+
+        item = None
+        while item is None:
+            item = self.queue.claim('w1')
+        self.assertEqual(item['attempts'], 2)
+        self.assertTrue(self.queue.release(item, 'w1', error='timeout'))
+        self.assertEqual(self.queue.counts()[FAILED], 1)
+
+    def test_worker_processes(self):
+        self.queue.enqueue_subreddits(SUBREDDITS)
+
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=run_worker, args=(f"worker-{i}",)) for i in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=120)
+            self.assertEqual(process.exitcode, 0)
+
+        counts = self.queue.counts()
+        self.assertEqual(counts[DONE], len(SUBREDDITS) * (POSTS_PER_SUBREDDIT + 1) - 1)
+        self.assertEqual(counts[FAILED], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.worker_pool import ScraperPool
+
+
+class TestScraperPool(unittest.TestCase):
+    """
+    Unit Test class for the ScraperPool class.
+
+    Methods:
+        test_scrape_distributes_subreddits: Test that every subreddit is scraped exactly once by the pool.
+        test_scraper_per_thread: Test that each worker thread gets its own scraper and database client.
+        test_invalid_worker_count: Test that a worker count below one is rejected.
+        test_interrupt_stops_workers: Test that an interrupted scrape stops the workers and cancels queued subreddits.
+    """
+    @patch("src.worker_pool.MongoDBClient")
+    @patch("src.worker_pool.SubredditScraper")
+    def test_scrape_distributes_subreddits(self, mock_scraper_cls, mock_db_cls):
+        scraped = []
+        lock = threading.Lock()
+
+        def scrape_subreddit(subreddit_id, max_posts=None):
+            with lock:
+                scraped.append((subreddit_id, max_posts))
+
+        mock_scraper_cls.return_value.scrape_subreddit.side_effect = scrape_subreddit
+
+        pool = ScraperPool(MagicMock(), workers=3)
+        stats = pool.scrape(['a', 'b', 'c', 'd', 'e'], max_posts=2)
+
+        self.assertCountEqual(scraped, [('a', 2), ('b', 2), ('c', 2), ('d', 2), ('e', 2)])
+        self.assertIs(stats, pool.stats)
+
+    @patch("src.worker_pool.MongoDBClient")
+    @patch("src.worker_pool.SubredditScraper")
+    def test_scraper_per_thread(self, mock_scraper_cls, mock_db_cls):
+        barrier = threading.Barrier(2, timeout=5)
+        mock_scraper_cls.side_effect = lambda *args, **kwargs: MagicMock(
+            scrape_subreddit=MagicMock(side_effect=lambda *a, **k: barrier.wait()))
+
+        pool = ScraperPool(MagicMock(), workers=2)
+        pool.scrape(['a', 'b'])
+
+        self.assertEqual(mock_scraper_cls.call_count, 2)
+        self.assertEqual(mock_db_cls.call_count, 2)
+        for call in mock_scraper_cls.call_args_list:
+            self.assertIs(call.kwargs['stats'], pool.stats)
+
+    def test_invalid_worker_count(self):
+        with self.assertRaises(ValueError):
+            ScraperPool(MagicMock(), workers=0)
+
+    @patch("src.worker_pool.as_completed")
+    @patch("src.worker_pool.MongoDBClient")
+    @patch("src.worker_pool.SubredditScraper")
+    def test_interrupt_stops_workers(self, mock_scraper_cls, mock_db_cls, mock_as_completed):
+        started = threading.Event()
+        scraped = []
+
+        def scrape_subreddit(subreddit_id, max_posts=None):
+            scraped.append(subreddit_id)
+            started.set()
+            mock_scraper_cls.call_args.kwargs['stopped'].wait(5)
+
+        def interrupt(futures):
+            started.wait(5)
+            raise KeyboardInterrupt
+
+        mock_scraper_cls.return_value.scrape_subreddit.side_effect = scrape_subreddit
+        mock_as_completed.side_effect = interrupt
+
+        pool = ScraperPool(MagicMock(), workers=1)
+        with self.assertRaises(KeyboardInterrupt):
+            pool.scrape(['a', 'b', 'c'])
+
+        self.assertEqual(scraped, ['a'])
+        self.assertTrue(mock_scraper_cls.call_args.kwargs['stopped'].is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()